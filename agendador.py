@@ -0,0 +1,300 @@
+'''
+Arquivo que contém o agendador das consultas à origem. Em vez de consultar
+todas as estações no mesmo intervalo fixo, cada estação é consultada logo
+depois da próxima medição esperada, a partir da cadência aprendida dos
+próprios instantes e do atraso de publicação observado:
+
+    - estação atrasada (a medição esperada não chegou): novas tentativas com
+      espera dobrada a cada consulta vazia, até INTERVALO_MAXIMO_S;
+    - estação inativa (sem medições há mais de 12 h) ou com falhas na origem:
+      espera dobrada até INTERVALO_MAXIMO_INATIVA_S;
+    - estação em alerta ou perto da cota de alerta (MARGEM_ALERTA): consultada
+      ao menos a cada INTERVALO_PRIORITARIO_S e antes das demais.
+
+No máximo MAX_CONSULTAS_ORIGEM consultas ficam em andamento ao mesmo tempo
+(ver cache_estacoes.py). O agendador conduz o atualizador (atualizador.py)
+e, com TIDESAT_AGENDADOR=1, também o cache da própria dashboard: as sessões
+passam a ler apenas o que o agendador já baixou.
+
+'''
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import streamlit as st
+
+from cache_estacoes import obter_cache, ErroDadosEstacao, MAX_CONSULTAS_ORIGEM
+from alinhamento import vetores_estacao, CADENCIA_NOMINAL
+from estatisticas import cota_numerica
+from inquilinos import INQUILINOS
+from api_dados import CATALOGO
+from rastreamento import registrar_falha
+
+# Espera mínima entre duas consultas da mesma estação (s)
+INTERVALO_MINIMO_S = 30
+
+# Espera máxima das estações em alerta ou perto da cota de alerta (s)
+INTERVALO_PRIORITARIO_S = 60
+
+# Espera máxima de uma estação ativa atrasada e de uma inativa ou com falhas (s)
+INTERVALO_MAXIMO_S = 30 * 60
+INTERVALO_MAXIMO_INATIVA_S = 6 * 3600
+
+# Sem medições há mais deste tempo (s), a estação é considerada inativa (como na dashboard)
+LIMITE_INATIVIDADE_S = 12 * 3600
+
+# Distância (m) abaixo da cota de alerta a partir da qual a estação é prioritária
+MARGEM_ALERTA = 0.5
+
+# Tempo máximo (s) que as estações consultadas esperam pelo fim do ciclo antes de `ao_ciclo`
+CICLO_MAXIMO_S = INTERVALO_MINIMO_S
+
+# Atraso de publicação assumido até ser observado (s) e observações guardadas
+ATRASO_PADRAO_S = 60
+OBSERVACOES_ATRASO = 20
+
+# Intervalos entre medições usados no aprendizado da cadência (um dia na cadência nominal)
+AMOSTRAS_CADENCIA = 144
+
+ATIVO = os.environ.get("TIDESAT_AGENDADOR", "0") not in ("", "0")
+
+
+# URLs de todas as estações de todas as dashboards, sem repetição
+def urls_cadastradas():
+
+    urls = []
+
+    for inquilino in INQUILINOS.values():
+        for estacao in inquilino["estacoes"].values():
+            if estacao["url"] not in urls:
+                urls.append(estacao["url"])
+
+    return urls
+
+
+# Cota de alerta de cada URL, vinda do catálogo que já combina as cotas numéricas de todas as dashboards
+def cotas_alerta():
+
+    cotas = {}
+
+    for entrada in CATALOGO.values():
+        url = entrada["info"]["url"]
+
+        if cotas.get(url) is None:
+            cotas[url] = cota_numerica(entrada["info"].get("cota_alerta"))
+
+    return cotas
+
+
+# Cadência (s) da estação: mediana dos intervalos entre as últimas medições
+def cadencia_estacao(tempos):
+
+    passos = np.diff(tempos[-(AMOSTRAS_CADENCIA + 1):])
+    passos = passos[passos > 0]
+
+    return float(np.median(passos)) / 1e9 if len(passos) else CADENCIA_NOMINAL / 1e9
+
+
+# O que o agendador sabe de cada estação
+class EstadoConsulta:
+
+    def __init__(self, url, cota_alerta=None):
+        self.url = url
+        self.cota_alerta = cota_alerta
+        self.cadencia_s = CADENCIA_NOMINAL / 1e9
+        self.atrasos = deque(maxlen=OBSERVACOES_ATRASO)
+        self.ultimo = None
+        self.nivel = None
+        self.vazias = 0
+        self.falhas = 0
+        self.consultas = 0
+        self.prioritaria = False
+        self.proxima = 0.0
+
+    # Atraso de publicação: o menor observado entre a medição e a consulta que a encontrou
+    @property
+    def atraso_s(self):
+        return max(min(self.atrasos), 0.0) if self.atrasos else ATRASO_PADRAO_S
+
+
+class Agendador:
+
+    # `consultar(url)` baixa a estação e retorna o DataFrame (ErroDadosEstacao em caso de falha)
+    def __init__(self, urls, consultar, cotas=None, max_consultas=MAX_CONSULTAS_ORIGEM, relogio=time.time):
+        cotas = cotas or {}
+        self.estados = {url: EstadoConsulta(url, cotas.get(url)) for url in urls}
+        self.consultar = consultar
+        self.max_consultas = max_consultas
+        self.relogio = relogio
+        self._parar = threading.Event()
+
+    # Espera (s) até a próxima consulta de uma estação recém-consultada
+    def espera(self, estado, agora):
+
+        if estado.falhas:
+            espera = min(INTERVALO_MINIMO_S * 2 ** estado.falhas, INTERVALO_MAXIMO_INATIVA_S)
+
+        elif estado.ultimo is None or agora - estado.ultimo > LIMITE_INATIVIDADE_S:
+            espera = min(estado.cadencia_s * 2 ** estado.vazias, INTERVALO_MAXIMO_INATIVA_S)
+
+        else:
+            esperado = estado.ultimo + estado.cadencia_s + estado.atraso_s
+
+            if esperado > agora:
+                espera = esperado - agora
+            else:
+                espera = min(INTERVALO_MINIMO_S * 2 ** estado.vazias, INTERVALO_MAXIMO_S)
+
+        if estado.prioritaria:
+            espera = min(espera, INTERVALO_PRIORITARIO_S)
+
+        return max(espera, INTERVALO_MINIMO_S)
+
+    # Atualiza o que se sabe da estação após uma consulta (df None quando a consulta falhou)
+    def registrar(self, estado, df, agora):
+
+        estado.consultas += 1
+
+        if df is None:
+            estado.falhas += 1
+            estado.proxima = agora + self.espera(estado, agora)
+            return
+
+        estado.falhas = 0
+        tempos, niveis = vetores_estacao(df)
+
+        if not len(tempos):
+            estado.vazias += 1
+        else:
+            ultimo = tempos[-1] / 1e9
+
+            if estado.ultimo is None or ultimo > estado.ultimo:
+                if estado.ultimo is not None:
+                    estado.atrasos.append(agora - ultimo)
+                estado.vazias = 0
+                estado.cadencia_s = cadencia_estacao(tempos)
+                validos = niveis[~np.isnan(niveis)]
+                estado.nivel = float(validos[-1]) if len(validos) else None
+            else:
+                estado.vazias += 1
+
+            estado.ultimo = ultimo
+
+        estado.prioritaria = estado.cota_alerta is not None and estado.nivel is not None and \
+            estado.nivel >= estado.cota_alerta - MARGEM_ALERTA
+        estado.proxima = agora + self.espera(estado, agora)
+
+    # Estações vencidas, as prioritárias primeiro
+    def vencidas(self, agora, em_andamento):
+        return sorted((e for e in self.estados.values() if e.proxima <= agora and e.url not in em_andamento),
+                      key=lambda e: (not e.prioritaria, e.proxima))
+
+    # Laço principal. `ao_consultar(url, df)` é chamada nesta thread após cada consulta bem-sucedida e
+    # `ao_ciclo(dfs)` uma vez por ciclo, com {url: df} das estações consultadas com sucesso no ciclo: um
+    # ciclo termina quando não há consultas em andamento ou após CICLO_MAXIMO_S desde a primeira do ciclo.
+    # Com `uma_vez`, cada estação é consultada uma única vez.
+    def executar(self, ao_consultar=None, uma_vez=False, ao_ciclo=None):
+
+        em_andamento = {}
+        ciclo, inicio_ciclo = {}, None
+
+        with ThreadPoolExecutor(self.max_consultas, thread_name_prefix="consulta") as executor:
+
+            while not self._parar.is_set():
+
+                agora = self.relogio()
+
+                if ciclo and (not em_andamento or agora - inicio_ciclo >= CICLO_MAXIMO_S):
+                    self._concluir_ciclo(ao_ciclo, ciclo)
+                    ciclo, inicio_ciclo = {}, None
+
+                ocupadas = {estado.url for estado in em_andamento.values()}
+
+                for estado in self.vencidas(agora, ocupadas)[:self.max_consultas - len(em_andamento)]:
+                    if not (uma_vez and estado.consultas):
+                        em_andamento[executor.submit(self.consultar, estado.url)] = estado
+
+                if uma_vez and not em_andamento:
+                    return
+
+                # Com todas as vagas ocupadas, espera uma consulta terminar; senão, até a próxima vencer
+                livres = [e.proxima for e in self.estados.values() if e not in em_andamento.values()]
+                espera = None if len(em_andamento) >= self.max_consultas or not livres else max(min(livres) - agora, 0)
+
+                if not em_andamento:
+                    self._parar.wait(espera)
+                    continue
+
+                # Sem passar do fim do ciclo em curso
+                if ciclo:
+                    fim_ciclo = max(inicio_ciclo + CICLO_MAXIMO_S - agora, 0)
+                    espera = fim_ciclo if espera is None else min(espera, fim_ciclo)
+
+                concluidas, _ = wait(em_andamento, timeout=espera, return_when=FIRST_COMPLETED)
+
+                for futuro in concluidas:
+                    estado = em_andamento.pop(futuro)
+
+                    # Qualquer erro de uma consulta conta como falha da estação: o laço não pode parar,
+                    # pois com o agendador ativo o cache deixa de expirar as estações
+                    try:
+                        df = futuro.result()
+                    except ErroDadosEstacao as e:
+                        registrar_falha("agendador", e, url=estado.url)
+                        df = None
+                    except Exception as e:
+                        registrar_falha("agendador", f"erro inesperado: {e!r}", url=estado.url)
+                        df = None
+
+                    self.registrar(estado, df, self.relogio())
+
+                    if df is None:
+                        continue
+
+                    if ao_consultar is not None:
+                        try:
+                            ao_consultar(estado.url, df)
+                        except Exception as e:
+                            registrar_falha("agendador", f"erro ao processar a consulta: {e!r}", url=estado.url)
+
+                    if ao_ciclo is not None:
+                        inicio_ciclo = self.relogio() if inicio_ciclo is None else inicio_ciclo
+                        ciclo[estado.url] = df
+
+    # Entrega as estações consultadas no ciclo
+    def _concluir_ciclo(self, ao_ciclo, ciclo):
+        try:
+            ao_ciclo(ciclo)
+        except Exception as e:
+            registrar_falha("agendador", f"erro ao processar o ciclo: {e!r}", estacoes=len(ciclo))
+
+    def parar(self):
+        self._parar.set()
+
+    # Situação de cada estação (para depuração e registros)
+    def resumo(self):
+        agora = self.relogio()
+        return {url: {"proxima_s": round(e.proxima - agora, 1), "cadencia_s": e.cadencia_s, "atraso_s": e.atraso_s,
+                      "vazias": e.vazias, "falhas": e.falhas, "prioritaria": e.prioritaria}
+                for url, e in self.estados.items()}
+
+
+# Inicia (uma única vez por processo, com TIDESAT_AGENDADOR=1) o agendador sobre o cache da dashboard.
+# Com o armazenamento compartilhado, quem consulta a origem é o atualizador.
+@st.cache_resource(show_spinner=False)
+def iniciar_agendador():
+
+    cache = obter_cache()
+
+    if not ATIVO or cache.loja is not None:
+        return None
+
+    cache.agendado = True
+    agendador = Agendador(urls_cadastradas(), lambda url: cache.obter(url, forcar=True), cotas_alerta())
+    threading.Thread(target=agendador.executar, daemon=True, name="agendador").start()
+
+    return agendador
@@ -0,0 +1,284 @@
+'''
+Arquivo que contém o arquivo de agregados (rollups) por estação: para cada
+hora e cada dia são mantidos mínimo, média, máximo, contagem e último valor.
+Os agregados são atualizados incrementalmente (apenas a partir do último
+intervalo, que pode estar incompleto) e gravados em disco ao lado dos dados
+brutos, de modo que visões longas e estatísticas custem proporcionalmente ao
+número de horas/dias e não ao número de medições.
+
+'''
+
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pytz
+import streamlit as st
+
+from main_config import TIMEZONE_PADRAO
+from cache_estacoes import obter_cache
+from alinhamento import vetores_estacao
+from rastreamento import registrar_falha
+
+# Diretório onde os agregados são persistidos
+DIRETORIO_DADOS = os.environ.get("TIDESAT_DADOS", ".dados_tidesat")
+
+HORA = 3600 * 10**9
+DIA = 24 * HORA
+
+# Os dias são contados no fuso padrão das dashboards (sem horário de verão desde 2019)
+DESLOCAMENTO_DIA = int(pytz.timezone(TIMEZONE_PADRAO).utcoffset(pd.Timestamp.utcnow().to_pydatetime().replace(tzinfo=None)).total_seconds()) * 10**9
+
+CAMPOS = ("minimo", "maximo", "soma", "contagem", "ultimo", "t_minimo", "t_maximo")
+
+
+# Um nível de agregação (horário ou diário) com vetores densos a partir do primeiro intervalo
+class Agregado:
+
+    def __init__(self, passo, deslocamento=0):
+        self.passo = passo
+        self.deslocamento = deslocamento
+        self.primeiro = None
+        self.minimo = np.empty(0)
+        self.maximo = np.empty(0)
+        self.soma = np.empty(0)
+        self.contagem = np.empty(0, dtype='int64')
+        self.ultimo = np.empty(0)
+        self.t_minimo = np.empty(0, dtype='int64')
+        self.t_maximo = np.empty(0, dtype='int64')
+
+    def __len__(self):
+        return len(self.contagem)
+
+    # Índice absoluto do intervalo de cada instante (ns, UTC)
+    def intervalo(self, tempos):
+        return (np.asarray(tempos, dtype='int64') + self.deslocamento) // self.passo
+
+    # Início (ns, UTC) de cada intervalo armazenado
+    @property
+    def inicios(self):
+        return (self.primeiro + np.arange(len(self), dtype='int64')) * self.passo - self.deslocamento
+
+    @property
+    def media(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.soma / self.contagem
+
+    # Recalcula os intervalos a partir do último armazenado (que pode estar incompleto)
+    def atualizar(self, tempos, niveis):
+
+        validos = ~np.isnan(niveis)
+        tempos = tempos[validos]
+        niveis = niveis[validos]
+
+        if len(tempos) == 0:
+            return
+
+        intervalos = self.intervalo(tempos)
+
+        # Histórico anterior ao armazenado: refaz o agregado desde o início
+        if self.primeiro is None or intervalos[0] < self.primeiro:
+            self.__init__(self.passo, self.deslocamento)
+            self.primeiro = int(intervalos[0])
+
+        manter = max(len(self) - 1, 0)
+        corte = np.searchsorted(intervalos, self.primeiro + manter, side='left')
+
+        indices = intervalos[corte:] - self.primeiro - manter
+        v = niveis[corte:]
+
+        if len(indices) == 0:
+            return
+
+        comprimento = int(indices[-1]) + 1
+        inicios_grupo = np.flatnonzero(np.r_[True, np.diff(indices) != 0])
+        grupos = indices[inicios_grupo]
+        finais_grupo = np.r_[inicios_grupo[1:], len(indices)] - 1
+
+        minimo = np.full(comprimento, np.nan)
+        maximo = np.full(comprimento, np.nan)
+        ultimo = np.full(comprimento, np.nan)
+
+        t_minimo = np.zeros(comprimento, dtype='int64')
+        t_maximo = np.zeros(comprimento, dtype='int64')
+
+        minimo[grupos] = np.minimum.reduceat(v, inicios_grupo)
+        maximo[grupos] = np.maximum.reduceat(v, inicios_grupo)
+        ultimo[grupos] = v[finais_grupo]
+
+        # Instante do mínimo/máximo: primeira posição de cada grupo após ordenar por (grupo, valor)
+        t = tempos[corte:]
+        t_minimo[grupos] = t[np.lexsort((v, indices))[inicios_grupo]]
+        t_maximo[grupos] = t[np.lexsort((-v, indices))[inicios_grupo]]
+        soma = np.bincount(indices, weights=v, minlength=comprimento)
+        contagem = np.bincount(indices, minlength=comprimento)
+
+        self.minimo = np.concatenate([self.minimo[:manter], minimo])
+        self.maximo = np.concatenate([self.maximo[:manter], maximo])
+        self.ultimo = np.concatenate([self.ultimo[:manter], ultimo])
+        self.soma = np.concatenate([self.soma[:manter], soma])
+        self.contagem = np.concatenate([self.contagem[:manter], contagem])
+        self.t_minimo = np.concatenate([self.t_minimo[:manter], t_minimo])
+        self.t_maximo = np.concatenate([self.t_maximo[:manter], t_maximo])
+
+    # Posições [i0, i1) dos intervalos contidos em [inicio, fim) (ns, UTC)
+    def fatia(self, inicio, fim):
+
+        if self.primeiro is None:
+            return 0, 0
+
+        i0 = int(np.clip(self.intervalo(inicio) - self.primeiro, 0, len(self)))
+        i1 = int(np.clip(-(-(int(fim) + self.deslocamento) // self.passo) - self.primeiro, 0, len(self)))
+
+        return i0, max(i0, i1)
+
+    # Tabela com os intervalos não vazios de [inicio, fim)
+    def tabela(self, inicio=None, fim=None):
+
+        i0, i1 = (0, len(self)) if inicio is None else self.fatia(inicio, fim)
+        cheios = self.contagem[i0:i1] > 0
+
+        return pd.DataFrame({
+            'datetime_utc': pd.DatetimeIndex(self.inicios[i0:i1][cheios], tz='UTC'),
+            'minimo': self.minimo[i0:i1][cheios],
+            'media': self.media[i0:i1][cheios],
+            'maximo': self.maximo[i0:i1][cheios],
+            'contagem': self.contagem[i0:i1][cheios],
+            'ultimo': self.ultimo[i0:i1][cheios],
+        })
+
+    def para_dicionario(self, prefixo):
+        dados = {f"{prefixo}_{campo}": getattr(self, campo) for campo in CAMPOS}
+        dados[f"{prefixo}_primeiro"] = np.array([-1 if self.primeiro is None else self.primeiro])
+        return dados
+
+    def carregar_dicionario(self, dados, prefixo):
+        primeiro = int(dados[f"{prefixo}_primeiro"][0])
+        self.primeiro = None if primeiro < 0 else primeiro
+        for campo in CAMPOS:
+            setattr(self, campo, dados[f"{prefixo}_{campo}"])
+
+
+# Agregados horários e diários de uma estação
+class AgregadosEstacao:
+
+    def __init__(self):
+        self.hora = Agregado(HORA)
+        self.dia = Agregado(DIA, DESLOCAMENTO_DIA)
+        self.versao = None
+        self.trava = threading.Lock()
+
+    def atualizar(self, tempos, niveis, versao):
+
+        if versao == self.versao:
+            return False
+
+        self.hora.atualizar(tempos, niveis)
+        self.dia.atualizar(tempos, niveis)
+        self.versao = versao
+
+        return True
+
+    # Mínimo e máximo de todo o histórico, a partir dos agregados diários
+    def extremos(self):
+
+        if len(self.dia) == 0:
+            return None, None
+
+        return float(np.nanmin(self.dia.minimo)), float(np.nanmax(self.dia.maximo))
+
+
+# Nome do arquivo de persistência a partir da URL da estação
+def caminho_agregados(url, diretorio=DIRETORIO_DADOS):
+
+    nome = re.sub(r'[^A-Za-z0-9_.-]', '_', url.rstrip('/').split('/')[-1])
+    return os.path.join(diretorio, f"{nome}.agregados.npz")
+
+
+def salvar_agregados(agregados, caminho):
+
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = caminho + ".tmp"
+
+    with open(temporario, "wb") as arquivo:
+        np.savez(arquivo, **agregados.hora.para_dicionario("hora"), **agregados.dia.para_dicionario("dia"))
+
+    os.replace(temporario, caminho)
+
+
+def ler_agregados(caminho):
+
+    agregados = AgregadosEstacao()
+
+    try:
+        with np.load(caminho) as dados:
+            agregados.hora.carregar_dicionario(dados, "hora")
+            agregados.dia.carregar_dicionario(dados, "dia")
+
+    except (OSError, KeyError, ValueError):
+        return AgregadosEstacao()
+
+    return agregados
+
+
+# Conjunto dos agregados de todas as estações do processo
+class ArquivoAgregados:
+
+    def __init__(self, diretorio=DIRETORIO_DADOS):
+        self.diretorio = diretorio
+        self._estacoes = {}
+        self._trava = threading.Lock()
+
+    def _estacao(self, url):
+        with self._trava:
+            if url not in self._estacoes:
+                caminho = caminho_agregados(url, self.diretorio)
+                pacote = obter_cache().pacote
+
+                # Instância nova: parte dos agregados do pacote inicial (ver pacote_inicial.py)
+                if not os.path.exists(caminho) and pacote is not None and url in pacote:
+                    caminho = pacote.caminho_agregados(url)
+
+                self._estacoes[url] = ler_agregados(caminho)
+            return self._estacoes[url]
+
+    # Agregados da estação, sincronizados com a versão atual do cache de dados brutos
+    def obter(self, url):
+
+        cache = obter_cache()
+        df = cache.obter(url)
+        agregados = self._estacao(url)
+
+        with agregados.trava:
+            if agregados.atualizar(*vetores_estacao(df), cache.versao(url)):
+                try:
+                    salvar_agregados(agregados, caminho_agregados(url, self.diretorio))
+                except OSError as e:
+                    registrar_falha("agregados", f"erro ao salvar: {e}", url=url)
+
+        return agregados
+
+
+# Instância única do arquivo de agregados, compartilhada por todas as sessões do processo
+@st.cache_resource(show_spinner=False)
+def obter_arquivo_agregados():
+    return ArquivoAgregados()
+
+
+# Níveis diários (média) organizados por ano, para comparação ano a ano
+def comparacao_anual(agregados, fuso=TIMEZONE_PADRAO):
+
+    diario = agregados.dia.tabela()
+
+    if diario.empty:
+        return pd.DataFrame()
+
+    datas = diario['datetime_utc'].dt.tz_convert(fuso)
+
+    return pd.DataFrame({
+        'ano': datas.dt.year.to_numpy(),
+        'dia_do_ano': datas.dt.dayofyear.to_numpy(),
+        'media': diario['media'].to_numpy(),
+    }).pivot(index='dia_do_ano', columns='ano', values='media')
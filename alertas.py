@@ -0,0 +1,300 @@
+'''
+Arquivo que contém o motor de alertas das estações. A cada ciclo de coleta,
+todas as estações são avaliadas de uma só vez (uma regressão linear por
+estação, calculada com somas agrupadas sobre as últimas 6 h de dados de
+todas elas) contra a cota de alerta, a cota de inundação e o limite de
+velocidade de subida. Os alertas são enviados aos destinos configurados
+(ver destinos_alertas.py) apenas nas mudanças de estado:
+
+    - histerese: um estado só é encerrado quando o nível fica HISTERESE_NIVEL
+      abaixo da cota (ou a velocidade abaixo de FRACAO_SUBIDA do limite);
+    - repetição: o mesmo alerta não é reenviado antes de REPETICAO_S
+      segundos, mesmo que o estado oscile. Os envios são comparados com o
+      último estado comunicado aos destinos: uma mudança suprimida fica
+      pendente e é enviada quando o intervalo termina, se o estado ainda
+      for diferente do comunicado.
+
+O estado é gravado em DIRETORIO_DADOS/alertas_estado.json, de modo que
+reinícios do processo não repetem alertas. O motor roda no atualizador
+(python atualizador.py --alertas) ou separado, sem depender de sessões
+abertas na dashboard:
+
+    TIDESAT_ALERTAS=log:alertas.log,smtp://localhost:8025/defesacivil@exemplo.gov.br python alertas.py --intervalo 120
+
+'''
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from agregados import DIRETORIO_DADOS
+from cache_estacoes import obter_cache, ErroDadosEstacao, VALIDADE_CACHE
+from alinhamento import vetores_estacao
+from estatisticas import cota_numerica
+from api_dados import CATALOGO, JANELA_RECENTE, LIMITE_INATIVIDADE, instante_iso
+from destinos_alertas import destinos_do_ambiente
+from rastreamento import registrar_falha
+
+# Quanto o nível deve baixar da cota (m) para encerrar o estado de alerta ou inundação
+HISTERESE_NIVEL = float(os.environ.get("TIDESAT_HISTERESE", 0.10))
+
+# Velocidade de subida (m/h) que gera alerta, quando a estação não define "limite_subida"
+LIMITE_SUBIDA_PADRAO = float(os.environ.get("TIDESAT_LIMITE_SUBIDA", 0.15))
+
+# A subida rápida termina quando a velocidade fica abaixo desta fração do limite
+FRACAO_SUBIDA = 0.5
+
+# Intervalo mínimo (s) entre dois envios do mesmo alerta da mesma estação
+REPETICAO_S = 1800
+
+ARQUIVO_ESTADO = os.path.join(DIRETORIO_DADOS, "alertas_estado.json")
+
+ESTADOS_NIVEL = ("normal", "alerta", "inundacao")
+
+MENSAGENS = {
+    ("nivel", "alerta"): "{estacao} ({descricao}): nível {nivel_m:.2f} m atingiu a cota de alerta ({cota_alerta:.2f} m)",
+    ("nivel", "inundacao"): "{estacao} ({descricao}): nível {nivel_m:.2f} m atingiu a cota de inundação ({cota_inundacao:.2f} m)",
+    ("nivel", "normal"): "{estacao} ({descricao}): nível {nivel_m:.2f} m voltou abaixo da cota de alerta",
+    ("subida", "rapida"): "{estacao} ({descricao}): subida rápida de {velocidade_m_h:.2f} m/h (limite {limite_subida_m_h:.2f} m/h)",
+    ("subida", "normal"): "{estacao} ({descricao}): subida rápida encerrada ({velocidade_m_h:.2f} m/h)",
+}
+
+
+# Nível na última medição e velocidade (m/h) de cada série, pela reta das últimas 6 h de dados.
+# Uma única passagem vetorizada: as janelas de todas as estações são concatenadas e as somas
+# da regressão são agrupadas por estação com np.bincount.
+def ajuste_estacoes(series, janela=JANELA_RECENTE.value):
+
+    n_series = len(series)
+    grupos, xs, ys = [], [], []
+
+    for k, (tempos, niveis) in enumerate(series):
+
+        if not len(tempos):
+            continue
+
+        i0 = int(np.searchsorted(tempos, tempos[-1] - janela))
+        grupos.append(np.full(len(tempos) - i0, k))
+        xs.append((tempos[i0:] - tempos[-1]) / 3.6e12)
+        ys.append(niveis[i0:])
+
+    if not grupos:
+        return np.full(n_series, np.nan), np.full(n_series, np.nan)
+
+    g, x, y = np.concatenate(grupos), np.concatenate(xs), np.concatenate(ys)
+    validos = ~np.isnan(y)
+    g, x, y = g[validos], x[validos], y[validos]
+
+    n = np.bincount(g, minlength=n_series).astype(float)
+    sx = np.bincount(g, x, minlength=n_series)
+    sy = np.bincount(g, y, minlength=n_series)
+    sxx = np.bincount(g, x * x, minlength=n_series)
+    sxy = np.bincount(g, x * y, minlength=n_series)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominador = n * sxx - sx * sx
+        inclinacao = np.where((n >= 2) & (denominador > 0), (n * sxy - sx * sy) / denominador, np.nan)
+        # x = 0 na última medição: o intercepto é o nível ajustado nesse instante
+        nivel = (sy - inclinacao * sx) / n
+
+    return nivel, inclinacao
+
+
+# Novo estado de nível (0 normal, 1 alerta, 2 inundação) com histerese na descida
+def estados_nivel(nivel, atual, cota_alerta, cota_inundacao, histerese=HISTERESE_NIVEL):
+
+    # Comparações com NaN (cota ausente) são falsas: a estação fica normal
+    with np.errstate(invalid='ignore'):
+        alvo = np.where(nivel >= cota_inundacao, 2, np.where(nivel >= cota_alerta, 1, 0))
+        alvo_descida = np.where(nivel >= cota_inundacao - histerese, 2, np.where(nivel >= cota_alerta - histerese, 1, 0))
+
+    # Sobe imediatamente; desce apenas até onde a histerese permite
+    return np.where(alvo >= atual, alvo, np.minimum(atual, alvo_descida))
+
+
+# Novo estado de subida rápida, com histerese pela fração do limite
+def estados_subida(velocidade, atual, limite, fracao=FRACAO_SUBIDA):
+    with np.errstate(invalid='ignore'):
+        return np.where(atual, velocidade >= limite * fracao, velocidade >= limite)
+
+
+class MotorAlertas:
+
+    def __init__(self, destinos=None, arquivo_estado=ARQUIVO_ESTADO, catalogo=CATALOGO):
+
+        self.destinos = destinos_do_ambiente() if destinos is None else destinos
+        self.arquivo_estado = arquivo_estado
+        self.estado = self._carregar_estado()
+
+        # Vetores de configuração na ordem das estações do catálogo
+        self.entradas = list(catalogo.values())
+        self.indice_url = {entrada["info"]["url"]: k for k, entrada in enumerate(self.entradas)}
+        self.cota_alerta = np.array([cota_numerica(e["info"].get("cota_alerta")) for e in self.entradas], dtype=float)
+        self.cota_inundacao = np.array([cota_numerica(e["info"].get("cota_inundacao")) for e in self.entradas], dtype=float)
+        self.limite_subida = np.array([e["info"].get("limite_subida", LIMITE_SUBIDA_PADRAO) for e in self.entradas], dtype=float)
+
+        # Marca (quantidade, último instante) de cada estação na última avaliação
+        self.marcas = {}
+
+    def _carregar_estado(self):
+
+        if self.arquivo_estado and os.path.exists(self.arquivo_estado):
+            with open(self.arquivo_estado, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+
+        return {}
+
+    def _gravar_estado(self):
+
+        if not self.arquivo_estado:
+            return
+
+        os.makedirs(os.path.dirname(self.arquivo_estado) or ".", exist_ok=True)
+        temporario = self.arquivo_estado + ".tmp"
+
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(self.estado, arquivo)
+
+        os.replace(temporario, self.arquivo_estado)
+
+    # Avalia as séries do ciclo ({url: DataFrame}) e envia os alertas; retorna os alertas gerados
+    def avaliar(self, dfs, agora=None):
+
+        agora = pd.Timestamp.utcnow().value if agora is None else agora
+        vetores = {url: vetores_estacao(df) for url, df in dfs.items() if url in self.indice_url}
+
+        marcas = {url: (len(t), int(t[-1]) if len(t) else None) for url, (t, _) in vetores.items()}
+
+        if all(self.marcas.get(url) == marca for url, marca in marcas.items()) and not self._pendentes():
+            return []
+
+        self.marcas.update(marcas)
+
+        vazio = (np.empty(0, dtype='int64'), np.empty(0))
+        series = [vetores.get(entrada["info"]["url"], vazio) for entrada in self.entradas]
+        nivel, velocidade = ajuste_estacoes(series)
+
+        # Estações sem dados recentes (ou fora deste ciclo) mantêm o estado anterior
+        ultimos = np.array([t[-1] if len(t) else 0 for t, _ in series], dtype='int64')
+        avaliadas = ~np.isnan(nivel) & (ultimos > agora - LIMITE_INATIVIDADE.value)
+
+        estados = [self.estado.get(entrada["codigo"], {}) for entrada in self.entradas]
+        nivel_atual = np.array([ESTADOS_NIVEL.index(e.get("nivel", "normal")) for e in estados])
+        subida_atual = np.array([e.get("subida", False) for e in estados], dtype=bool)
+
+        novo_nivel = np.where(avaliadas, estados_nivel(nivel, nivel_atual, self.cota_alerta, self.cota_inundacao), nivel_atual)
+        nova_subida = np.where(avaliadas, estados_subida(velocidade, subida_atual, self.limite_subida), subida_atual)
+
+        # Estações com mudança agora ou com mudança ainda não comunicada (suprimida pela repetição)
+        comunicados = [self._comunicado(e) for e in estados]
+        nivel_comunicado = np.array([ESTADOS_NIVEL.index(c["nivel"]) for c in comunicados])
+        subida_comunicada = np.array([c["subida"] == "rapida" for c in comunicados], dtype=bool)
+        revisar = (novo_nivel != nivel_atual) | (nova_subida != subida_atual) | \
+            (novo_nivel != nivel_comunicado) | (nova_subida != subida_comunicada)
+
+        alertas = []
+
+        for k in np.flatnonzero(revisar):
+            alertas.extend(self._transicoes(k, novo_nivel[k], nova_subida[k], nivel[k], velocidade[k], ultimos[k], agora))
+
+        if alertas:
+            self.enviar(alertas)
+
+        self._gravar_estado()
+
+        return alertas
+
+    # Último estado comunicado aos destinos (estados gravados antes deste campo: o próprio estado)
+    @staticmethod
+    def _comunicado(estado):
+        return estado.get("comunicado", {"nivel": estado.get("nivel", "normal"),
+                                         "subida": "rapida" if estado.get("subida", False) else "normal"})
+
+    # Há alguma mudança de estado ainda não comunicada?
+    def _pendentes(self):
+        return any(self._comunicado(e) != {"nivel": e["nivel"], "subida": "rapida" if e["subida"] else "normal"}
+                   for e in self.estado.values())
+
+    # Alertas da estação k onde o estado difere do último comunicado (respeitando o intervalo de repetição)
+    def _transicoes(self, k, nivel_depois, subida_depois, nivel, velocidade, ultimo, agora):
+
+        entrada = self.entradas[k]
+        estado = self.estado.setdefault(entrada["codigo"], {"nivel": "normal", "subida": False, "enviados": {}})
+        comunicado = estado["comunicado"] = self._comunicado(estado)
+        estado["nivel"] = ESTADOS_NIVEL[nivel_depois]
+        estado["subida"] = bool(subida_depois)
+
+        alertas = []
+
+        for tipo, novo in (("nivel", estado["nivel"]), ("subida", "rapida" if subida_depois else "normal")):
+
+            anterior = comunicado[tipo]
+            chave = f"{tipo}:{novo}"
+
+            # Suprimida: continua pendente e é reavaliada nas próximas avaliações
+            if novo == anterior or agora - estado["enviados"].get(chave, 0) < REPETICAO_S * 1e9:
+                continue
+
+            estado["enviados"][chave] = agora
+            comunicado[tipo] = novo
+
+            campos = {
+                "estacao": entrada["codigo"],
+                "descricao": entrada["info"].get("descricao"),
+                "tipo": tipo,
+                "estado": novo,
+                "anterior": anterior,
+                "nivel_m": round(float(nivel), 4),
+                "velocidade_m_h": None if np.isnan(velocidade) else round(float(velocidade), 4),
+                "cota_alerta": None if np.isnan(self.cota_alerta[k]) else float(self.cota_alerta[k]),
+                "cota_inundacao": None if np.isnan(self.cota_inundacao[k]) else float(self.cota_inundacao[k]),
+                "limite_subida_m_h": float(self.limite_subida[k]),
+                "medicao": instante_iso(ultimo, "UTC"),
+                "gerado_em": instante_iso(agora, "UTC"),
+            }
+            campos["mensagem"] = MENSAGENS[(tipo, novo)].format(**{c: (v if v is not None else np.nan) for c, v in campos.items()})
+
+            alertas.append(campos)
+
+        return alertas
+
+    # Uma falha em um destino não impede a entrega aos demais
+    def enviar(self, alertas):
+        for destino in self.destinos:
+            try:
+                destino.enviar(alertas)
+            except Exception as e:
+                registrar_falha("alertas", f"falha no destino: {e}", destino=destino.nome)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Avalia os alertas das estações a cada ciclo de coleta.")
+    parser.add_argument("--intervalo", type=float, default=VALIDADE_CACHE, help="segundos entre avaliações")
+    parser.add_argument("--uma-vez", action="store_true", help="avalia uma única vez e encerra")
+    args = parser.parse_args()
+
+    motor = MotorAlertas()
+    cache = obter_cache()
+
+    while True:
+        inicio = time.monotonic()
+        dfs = {}
+
+        for entrada in CATALOGO.values():
+            try:
+                dfs[entrada["info"]["url"]] = cache.obter(entrada["info"]["url"])
+            except ErroDadosEstacao as e:
+                registrar_falha("alertas", e, estacao=entrada["codigo"])
+
+        alertas = motor.avaliar(dfs)
+        print(f"[alertas] {len(dfs)} estações, {len(alertas)} alertas em {time.monotonic() - inicio:.1f} s", flush=True)
+
+        if args.uma_vez:
+            break
+
+        time.sleep(max(args.intervalo - (time.monotonic() - inicio), 0))
@@ -0,0 +1,118 @@
+'''
+Arquivo que contém o alinhamento de várias estações em uma grade de tempo
+comum. As séries são reamostradas (média por intervalo) em uma grade definida
+pelo período visível e pela quantidade de pixels do gráfico, resultando em
+uma única matriz 2-D sobre a qual sobreposições, diferenças entre estações e
+limites do eixo Y são calculados com NumPy.
+
+'''
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Cadência nominal das estações (10 minutos), em nanossegundos
+CADENCIA_NOMINAL = 600 * 10**9
+
+# Largura padrão (em pixels) considerada para o gráfico
+LARGURA_PADRAO_PX = 1200
+
+Alinhamento = namedtuple("Alinhamento", ["codigos", "grade", "matriz", "minimos", "maximos"])
+
+
+# Extrai os vetores de tempo (ns, UTC) e nível de um DataFrame de estação
+def vetores_estacao(df):
+
+    tempos = df['datetime_utc'].to_numpy(dtype='datetime64[ns]').view('int64')
+    niveis = df['water_level(m)'].to_numpy(dtype='float64')
+
+    return tempos, niveis
+
+
+# Define a grade comum: nunca mais fina que a cadência nominal e com no máximo um ponto por pixel
+def grade_comum(inicio_ns, fim_ns, largura_px=LARGURA_PADRAO_PX):
+
+    duracao = max(int(fim_ns - inicio_ns), 1)
+    passo = max(CADENCIA_NOMINAL, -(-duracao // max(int(largura_px), 1)))
+
+    # Arredonda o passo para minutos inteiros e alinha o início da grade
+    passo = -(-passo // (60 * 10**9)) * (60 * 10**9)
+    inicio = (int(inicio_ns) // passo) * passo
+
+    return np.arange(inicio, int(fim_ns), passo, dtype='int64'), passo
+
+
+# Reamostra uma série na grade (média dos valores em cada intervalo; NaN nos intervalos vazios)
+def reamostrar(tempos, niveis, grade, passo):
+
+    n = len(grade)
+    inicio = np.searchsorted(tempos, grade[0], side='left')
+    fim = np.searchsorted(tempos, grade[-1] + passo, side='left')
+
+    t = tempos[inicio:fim]
+    v = niveis[inicio:fim]
+    validos = ~np.isnan(v)
+
+    indices = (t[validos] - grade[0]) // passo
+    soma = np.bincount(indices, weights=v[validos], minlength=n)
+    contagem = np.bincount(indices, minlength=n)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return soma / contagem
+
+
+# Alinha várias estações na mesma grade. `series` é um dicionário código -> (tempos ns, níveis)
+def alinhar_estacoes(series, inicio, fim, largura_px=LARGURA_PADRAO_PX):
+
+    inicio_ns = pd.Timestamp(inicio).value
+    fim_ns = pd.Timestamp(fim).value
+
+    grade, passo = grade_comum(inicio_ns, fim_ns, largura_px)
+    codigos = list(series.keys())
+
+    matriz = np.full((len(codigos), len(grade)), np.nan)
+    minimos = np.full(len(codigos), np.nan)
+    maximos = np.full(len(codigos), np.nan)
+
+    if len(grade) == 0:
+        return Alinhamento(codigos, grade, matriz, minimos, maximos)
+
+    for i, cod in enumerate(codigos):
+
+        tempos, niveis = series[cod]
+        matriz[i] = reamostrar(tempos, niveis, grade, passo)
+
+        # Extremos calculados sobre as medições brutas da janela (não sobre as médias)
+        i0, i1 = np.searchsorted(tempos, [grade[0], grade[-1] + passo])
+        brutos = niveis[i0:i1]
+
+        if np.any(~np.isnan(brutos)):
+            minimos[i] = np.nanmin(brutos)
+            maximos[i] = np.nanmax(brutos)
+
+    # Marca temporal no centro de cada intervalo
+    return Alinhamento(codigos, grade + passo // 2, matriz, minimos, maximos)
+
+
+# Diferença ponto a ponto entre duas estações já alinhadas
+def diferenca_estacoes(alinhamento, cod_a, cod_b):
+
+    a = alinhamento.codigos.index(cod_a)
+    b = alinhamento.codigos.index(cod_b)
+
+    return alinhamento.matriz[a] - alinhamento.matriz[b]
+
+
+# Limites globais (mínimo, máximo) das estações alinhadas
+def limites_globais(alinhamento):
+
+    if np.all(np.isnan(alinhamento.minimos)):
+        return None
+
+    return float(np.nanmin(alinhamento.minimos)), float(np.nanmax(alinhamento.maximos))
+
+
+# Converte a grade (ns, UTC) para o fuso selecionado, para uso no eixo X
+def grade_no_fuso(alinhamento, fuso):
+    return pd.DatetimeIndex(alinhamento.grade, tz='UTC').tz_convert(fuso)
@@ -0,0 +1,529 @@
+'''
+Arquivo que contém a API HTTP (JSON/CSV) dos dados das estações, para
+clientes automáticos (Defesa Civil, operadores portuários) que hoje raspam a
+dashboard ou baixam os CSVs brutos da origem. As respostas saem do mesmo
+cache compartilhado e do mesmo índice por janela de tempo usados pela
+dashboard, reduzidas a no máximo `max_points` pontos e com ETag (respostas
+304 enquanto a série não muda).
+
+Rotas:
+    /stations                                   estações cadastradas e cotas
+    /stations/{id}/latest                       nível, velocidade, status e situação
+    /stations/{id}/series?from&to&tz&max_points&format=json|csv
+    /stations/{id}/export?from&to&tz&format=csv|parquet   histórico completo (ver exportacao.py)
+    /stations/{id}/images/{arquivo}             sparklines e cartão (ver imagens_estacoes.py)
+
+A API roda junto da dashboard quando TIDESAT_API_PORTA está definida, ou
+separada: python api_dados.py --porta 8600
+
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+import pandas as pd
+import pytz
+import streamlit as st
+
+from main_config import TIMEZONE_PADRAO
+from inquilinos import INQUILINOS
+from cache_estacoes import obter_cache, ErroDadosEstacao
+from indice import obter_arquivo_indices
+from alinhamento import vetores_estacao
+from estatisticas import cota_numerica
+from exportacao import instantes_iso, exportar, nome_arquivo, FORMATOS
+from rastreamento import registrar_falha
+
+# Pontos por série: padrão e máximo aceito em max_points
+PONTOS_PADRAO = 1000
+PONTOS_MAXIMO = 10_000
+
+# Período padrão da série (a partir da última medição)
+PERIODO_PADRAO = pd.Timedelta(days=7)
+
+# Janela das medições recentes (nível e velocidade) e limite de inatividade, como na dashboard
+JANELA_RECENTE = pd.Timedelta(hours=6)
+LIMITE_INATIVIDADE = pd.Timedelta(hours=12)
+
+# Tempo (s) que os clientes podem reutilizar uma resposta sem revalidar
+MAX_IDADE_S = 60
+
+
+class ErroRequisicao(Exception):
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+# Cotas que uma dashboard pode deixar em branco e outra preencher
+CAMPOS_COTA = ("cota_alerta", "cota_inundacao")
+
+
+# Estações de todas as dashboards (id em maiúsculas -> configuração e dashboards que a exibem). Uma estação
+# exibida em mais de uma dashboard fica com as cotas numéricas de qualquer uma delas, em vez das cotas em
+# branco de outra, independentemente da ordem dos inquilinos.
+def catalogo_estacoes():
+
+    catalogo = {}
+
+    for painel, inquilino in INQUILINOS.items():
+        for codigo, info in inquilino["estacoes"].items():
+
+            entrada = catalogo.setdefault(codigo.upper(), {"codigo": codigo, "info": dict(info), "paineis": []})
+            entrada["paineis"].append(painel)
+
+            for campo in CAMPOS_COTA:
+                if cota_numerica(entrada["info"].get(campo)) is None and cota_numerica(info.get(campo)) is not None:
+                    entrada["info"][campo] = info[campo]
+
+    return catalogo
+
+
+CATALOGO = catalogo_estacoes()
+
+
+def descrever_estacao(entrada):
+
+    info = entrada["info"]
+
+    return {
+        "id": entrada["codigo"],
+        "descricao": info.get("descricao"),
+        "coord": info.get("coord"),
+        "cota_alerta": cota_numerica(info.get("cota_alerta")),
+        "cota_inundacao": cota_numerica(info.get("cota_inundacao")),
+        "paineis": entrada["paineis"],
+    }
+
+
+def estacao_da_rota(identificador):
+
+    entrada = CATALOGO.get(identificador.upper())
+
+    if entrada is None:
+        raise ErroRequisicao(404, f"estação desconhecida: {identificador}")
+
+    return entrada
+
+
+def etiqueta(*partes):
+    return '"' + hashlib.sha1("|".join(map(str, partes)).encode()).hexdigest()[:20] + '"'
+
+
+def instante_iso(ns, fuso):
+    return pd.Timestamp(int(ns), tz='UTC').tz_convert(fuso).isoformat()
+
+
+def lista_json(valores, casas=4):
+    return [None if v != v else round(v, casas) for v in valores.tolist()]
+
+
+################# MEDIÇÕES RECENTES #################
+# Inclinação (m/h) e valor no instante `agora` da reta ajustada às medições a partir de `desde`
+def ajuste_linear(tempos, niveis, desde, agora):
+
+    i0 = np.searchsorted(tempos, desde)
+    x = (tempos[i0:] - agora) / 3.6e12
+    y = niveis[i0:]
+    validos = ~np.isnan(y)
+
+    if validos.sum() < 2:
+        return None, None
+
+    inclinacao, valor = np.polyfit(x[validos], y[validos], deg=1)
+
+    return float(inclinacao), float(valor)
+
+
+def situacao(nivel, cota_alerta, cota_inundacao):
+
+    if nivel is None or cota_alerta is None or cota_inundacao is None:
+        return "indisponivel"
+
+    if nivel < cota_alerta:
+        return "normal"
+
+    return "alerta" if nivel < cota_inundacao else "inundacao"
+
+
+# Última medição, nível ajustado, velocidade, status e situação (os mesmos cálculos dos indicadores)
+def resumo_recente(entrada, df, fuso):
+
+    tempos, niveis = vetores_estacao(df)
+    descricao = descrever_estacao(entrada)
+    agora = pd.Timestamp.utcnow().value
+
+    if not len(tempos):
+        return {**descricao, "ultimo": None, "nivel_m": None, "velocidade_m_h": None,
+                "status": "inativa", "situacao": "indisponivel"}
+
+    ultimo = int(tempos[-1])
+
+    # Nível: reta das últimas 6 h de dados, avaliada agora; velocidade: reta das últimas 6 h até agora
+    _, nivel = ajuste_linear(tempos, niveis, ultimo - JANELA_RECENTE.value, agora)
+    velocidade, _ = ajuste_linear(tempos, niveis, agora - JANELA_RECENTE.value, agora)
+
+    return {
+        **descricao,
+        "fuso": fuso,
+        "ultimo": {"t": instante_iso(ultimo, fuso), "nivel_m": None if np.isnan(niveis[-1]) else float(niveis[-1])},
+        "nivel_m": None if nivel is None else round(nivel, 4),
+        "velocidade_m_h": None if velocidade is None else round(velocidade, 4),
+        "status": "ativa" if ultimo > agora - LIMITE_INATIVIDADE.value else "inativa",
+        "situacao": situacao(nivel, descricao["cota_alerta"], descricao["cota_inundacao"]),
+    }
+
+
+################# SÉRIES #################
+def ler_fuso(parametros):
+
+    fuso = parametros.get("tz", TIMEZONE_PADRAO)
+
+    try:
+        pytz.timezone(fuso)
+    except pytz.UnknownTimeZoneError:
+        raise ErroRequisicao(400, f"fuso desconhecido: {fuso}")
+
+    return fuso
+
+
+# Instante (ns, UTC) de um parâmetro; datas sem horário em `to` incluem o dia inteiro, como na dashboard
+def ler_instante(texto, fuso, fim=False):
+
+    try:
+        instante = pd.Timestamp(texto)
+    except ValueError:
+        raise ErroRequisicao(400, f"data inválida: {texto}")
+
+    if instante.tzinfo is None:
+        instante = instante.tz_localize(fuso)
+
+    if fim and len(texto) <= 10:
+        instante += pd.Timedelta(days=1)
+
+    return instante.value
+
+
+def ler_pontos(parametros):
+
+    try:
+        pontos = int(parametros.get("max_points", PONTOS_PADRAO))
+    except ValueError:
+        raise ErroRequisicao(400, "max_points deve ser um inteiro")
+
+    return min(max(pontos, 1), PONTOS_MAXIMO)
+
+
+# Período [t0, t1) pedido (padrão: os 7 dias até a última medição)
+def ler_periodo(parametros, indice, fuso):
+
+    t1 = ler_instante(parametros["to"], fuso, fim=True) if "to" in parametros else int(indice.tempos[-1]) + 10**9
+    t0 = ler_instante(parametros["from"], fuso) if "from" in parametros else t1 - PERIODO_PADRAO.value
+
+    if t1 <= t0:
+        raise ErroRequisicao(400, "'to' deve ser posterior a 'from'")
+
+    return t0, t1
+
+
+# Medições de [t0, t1), reduzidas a no máximo `max_pontos` intervalos de mesma duração (média, mínimo e máximo)
+def serie_reduzida(indice, t0, t1, max_pontos):
+
+    i0, i1 = indice.posicoes(t0, t1)
+
+    if i1 - i0 <= max_pontos:
+        return {"t": indice.tempos[i0:i1], "nivel": indice.niveis(i0, i1), "minimo": None, "maximo": None,
+                "intervalo_s": None}
+
+    # Bordas inteiras (o float64 não representa instantes em ns com exatidão)
+    passo = (t1 - t0) / max_pontos
+    bordas = t0 + (np.arange(max_pontos + 1) * passo).astype('int64')
+    bordas[-1] = t1
+    posicoes = np.clip(np.searchsorted(indice.tempos, bordas, side='left'), i0, i1)
+
+    # Intervalos vazios (lacunas) são descartados; os demais são contíguos nas posições
+    ocupados = posicoes[1:] > posicoes[:-1]
+    inicios = posicoes[:-1][ocupados]
+
+    v = indice.niveis(i0, i1)
+    validos = ~np.isnan(v)
+    contagem = np.add.reduceat(validos.astype('int64'), inicios - i0)
+    soma = np.add.reduceat(np.where(validos, v, 0.0), inicios - i0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(contagem > 0, soma / contagem, np.nan)
+
+    # fmin / fmax ignoram NaN (intervalos só com medições inválidas ficam NaN)
+    minimo = np.fmin.reduceat(v, inicios - i0)
+    maximo = np.fmax.reduceat(v, inicios - i0)
+
+    return {"t": bordas[:-1][ocupados], "nivel": media, "minimo": minimo, "maximo": maximo,
+            "intervalo_s": passo / 1e9}
+
+
+def serie_json(entrada, serie, fuso, t0, t1, medicoes):
+
+    corpo = {
+        "id": entrada["codigo"],
+        "fuso": fuso,
+        "inicio": instante_iso(t0, fuso),
+        "fim": instante_iso(t1, fuso),
+        "medicoes": medicoes,
+        "reduzida": serie["intervalo_s"] is not None,
+        "intervalo_s": serie["intervalo_s"],
+        "pontos": len(serie["t"]),
+        "t": instantes_iso(serie["t"], fuso).tolist(),
+        "nivel": lista_json(serie["nivel"]),
+    }
+
+    if serie["minimo"] is not None:
+        corpo["minimo"] = lista_json(serie["minimo"])
+        corpo["maximo"] = lista_json(serie["maximo"])
+
+    return json.dumps(corpo).encode(), "application/json"
+
+
+def serie_csv(serie, fuso):
+
+    colunas = {"datetime": instantes_iso(serie["t"], fuso),
+               "water_level(m)": serie["nivel"]}
+
+    if serie["minimo"] is not None:
+        colunas["min(m)"], colunas["max(m)"] = serie["minimo"], serie["maximo"]
+
+    return pd.DataFrame(colunas).to_csv(index=False, float_format="%.4f").encode(), "text/csv; charset=utf-8"
+
+
+################# SERVIDOR #################
+class ManipuladorAPI(BaseHTTPRequestHandler):
+
+    def _responder(self, status, corpo=b"", tipo="application/json", etag=None):
+
+        self.send_response(status)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", f"public, max-age={MAX_IDADE_S}")
+
+        if etag:
+            self.send_header("ETag", etag)
+
+        if status != 304:
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+
+        self.end_headers()
+
+        if status != 304:
+            self.wfile.write(corpo)
+
+    # Responde 304 (e retorna True) se o cliente já tem a versão atual
+    def _cliente_atualizado(self, etag):
+
+        if etag in [valor.strip() for valor in self.headers.get("If-None-Match", "").split(",")]:
+            self._responder(304, etag=etag)
+            return True
+
+        return False
+
+    # Responde 304 se o cliente já tem a versão atual; caso contrário monta e envia o corpo
+    def _responder_com_etag(self, etag, montar):
+
+        if self._cliente_atualizado(etag):
+            return
+
+        corpo, tipo = montar()
+        self._responder(200, corpo, tipo, etag)
+
+    def do_GET(self):
+
+        self.resposta_iniciada = False
+        endereco = urlsplit(self.path)
+        partes = [parte for parte in endereco.path.split("/") if parte]
+        parametros = {chave: valores[-1] for chave, valores in parse_qs(endereco.query).items()}
+
+        try:
+            if partes == ["stations"]:
+                self.listar_estacoes()
+            elif len(partes) == 3 and partes[0] == "stations" and partes[2] == "latest":
+                self.ultima_medicao(estacao_da_rota(partes[1]), parametros)
+            elif len(partes) == 3 and partes[0] == "stations" and partes[2] == "series":
+                self.serie(estacao_da_rota(partes[1]), parametros)
+            elif len(partes) == 3 and partes[0] == "stations" and partes[2] == "export":
+                self.exportacao(estacao_da_rota(partes[1]), parametros)
+            elif len(partes) == 4 and partes[0] == "stations" and partes[2] == "images":
+                self.imagem(estacao_da_rota(partes[1]), partes[3])
+            else:
+                raise ErroRequisicao(404, "rota desconhecida")
+
+        except ErroRequisicao as e:
+            self._responder(e.status, json.dumps({"erro": str(e)}).encode())
+        except ErroDadosEstacao as e:
+            self._responder(502, json.dumps({"erro": str(e)}).encode())
+        except Exception as e:
+            registrar_falha("api", f"erro inesperado: {e!r}", caminho=self.path)
+
+            # Com a exportação já em andamento não há como mudar o status: a conexão é encerrada
+            if self.resposta_iniciada:
+                self.close_connection = True
+            else:
+                self._responder(500, json.dumps({"erro": "erro interno"}).encode())
+
+    def listar_estacoes(self):
+
+        estacoes = [descrever_estacao(entrada) for entrada in CATALOGO.values()]
+
+        self._responder_com_etag(etiqueta("estacoes", json.dumps(estacoes)),
+                                 lambda: (json.dumps({"estacoes": estacoes}).encode(), "application/json"))
+
+    def ultima_medicao(self, entrada, parametros):
+
+        fuso = ler_fuso(parametros)
+        url = entrada["info"]["url"]
+        cache = obter_cache()
+        df = cache.obter(url)
+
+        # O status depende do relógio: a etiqueta muda também a cada minuto
+        etag = etiqueta("ultimo", url, cache.versao(url), fuso, int(time.time() // 60))
+
+        self._responder_com_etag(
+            etag, lambda: (json.dumps(resumo_recente(entrada, df, fuso)).encode(), "application/json"))
+
+    def serie(self, entrada, parametros):
+
+        fuso = ler_fuso(parametros)
+        max_pontos = ler_pontos(parametros)
+        formato = parametros.get("format", "json")
+
+        if formato not in ("json", "csv"):
+            raise ErroRequisicao(400, "format deve ser json ou csv")
+
+        url = entrada["info"]["url"]
+        indice = obter_arquivo_indices().obter(url)
+
+        # O índice é estendido sob a trava; a resposta é montada sobre uma versão consistente
+        with indice.trava:
+
+            if not len(indice):
+                raise ErroRequisicao(404, "estação sem medições")
+
+            t0, t1 = ler_periodo(parametros, indice, fuso)
+            etag = etiqueta("serie", url, indice.versao, fuso, t0, t1, max_pontos, formato)
+
+            def montar():
+                serie = serie_reduzida(indice, t0, t1, max_pontos)
+                if formato == "csv":
+                    return serie_csv(serie, fuso)
+                i0, i1 = indice.posicoes(t0, t1)
+                return serie_json(entrada, serie, fuso, t0, t1, i1 - i0)
+
+            self._responder_com_etag(etag, montar)
+
+    # Histórico completo (sem redução) transmitido bloco a bloco; a conexão HTTP/1.0 termina com o arquivo
+    def exportacao(self, entrada, parametros):
+
+        fuso = ler_fuso(parametros)
+        formato = parametros.get("format", "csv")
+
+        if formato not in FORMATOS:
+            raise ErroRequisicao(400, "format deve ser csv ou parquet")
+
+        codigo, url = entrada["codigo"], entrada["info"]["url"]
+        inicio = ler_instante(parametros["from"], fuso) if "from" in parametros else None
+        fim = ler_instante(parametros["to"], fuso, fim=True) if "to" in parametros else None
+
+        cache = obter_cache()
+        cache.obter(url)
+        etag = etiqueta("exportacao", url, cache.versao(url), fuso, inicio, fim, formato)
+
+        if self._cliente_atualizado(etag):
+            return
+
+        nome = nome_arquivo([codigo], parametros.get("from", "inicio"), parametros.get("to", "fim"), formato)
+
+        self.send_response(200)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Type", FORMATOS[formato]["tipo"])
+        self.send_header("Content-Disposition", f'attachment; filename="{nome}"')
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.resposta_iniciada = True
+
+        for parte in exportar({codigo: url}, inicio, fim, fuso, formato):
+            self.wfile.write(parte)
+
+    # Imagem pré-renderizada da estação, lida do disco (ver imagens_estacoes.py)
+    def imagem(self, entrada, nome):
+
+        # Importado aqui: o renderizador usa o catálogo e os resumos deste arquivo
+        from imagens_estacoes import obter_renderizador, ARQUIVOS, TIPOS
+
+        if nome not in ARQUIVOS:
+            raise ErroRequisicao(404, f"imagem desconhecida: {nome}")
+
+        caminho, marca = obter_renderizador().arquivo(entrada, nome)
+
+        if marca is None:
+            raise ErroRequisicao(503, "imagem ainda não renderizada")
+
+        def ler():
+            with open(caminho, "rb") as arquivo:
+                return arquivo.read(), TIPOS[nome.rsplit(".", 1)[-1]]
+
+        self._responder_com_etag(etiqueta("imagem", entrada["codigo"], nome, marca), ler)
+
+    def log_message(self, *args):
+        pass
+
+
+def criar_servidor(host="0.0.0.0", porta=8600):
+
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorAPI)
+    servidor.daemon_threads = True
+
+    return servidor
+
+
+# Inicia (uma única vez por processo) a API na porta configurada no ambiente, junto da dashboard
+@st.cache_resource(show_spinner=False)
+def iniciar_api():
+
+    porta = os.environ.get("TIDESAT_API_PORTA")
+
+    if not porta:
+        return None
+
+    try:
+        servidor = criar_servidor(porta=int(porta))
+    except OSError as e:
+        # Outro processo do mesmo host pode já estar servindo a porta
+        registrar_falha("api", f"porta {porta} indisponível: {e}")
+        return None
+
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    # As imagens servidas pela API passam a acompanhar as atualizações do cache deste processo
+    from imagens_estacoes import obter_renderizador
+    obter_renderizador()
+
+    return servidor
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="API HTTP dos dados das estações.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=8600)
+    args = parser.parse_args()
+
+    from imagens_estacoes import obter_renderizador
+    obter_renderizador()
+
+    print(f"[api] servindo em http://{args.host}:{args.porta}", flush=True)
+    criar_servidor(args.host, args.porta).serve_forever()
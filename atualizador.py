@@ -0,0 +1,63 @@
+'''
+Arquivo que contém o processo atualizador do armazenamento compartilhado.
+Em implantações com vários processos da dashboard no mesmo host, apenas este
+processo baixa e interpreta os dados de todas as estações cadastradas e os
+grava em memória compartilhada; as dashboards (iniciadas com TIDESAT_SHM
+apontando para o mesmo diretório) apenas leem as séries.
+
+As consultas seguem o agendador (ver agendador.py): cada estação é
+consultada logo depois da próxima medição esperada, com no máximo
+--max-consultas consultas simultâneas. Com --alertas, os alertas das
+estações (ver alertas.py) são avaliados uma vez por ciclo de consultas,
+sobre todas as estações consultadas no ciclo.
+
+Uso: TIDESAT_SHM=/dev/shm/tidesat python atualizador.py [--max-consultas 4] [--uma-vez] [--alertas]
+
+'''
+
+import argparse
+
+from cache_estacoes import CacheEstacoes, MAX_CONSULTAS_ORIGEM
+from alinhamento import vetores_estacao
+from memoria_compartilhada import EscritorSerie, DIRETORIO_COMPARTILHADO
+from agendador import Agendador, urls_cadastradas, cotas_alerta
+from pacote_inicial import pacote_do_ambiente
+
+
+# Grava no armazenamento apenas as medições novas da estação
+def gravar(escritores, url, df, diretorio=DIRETORIO_COMPARTILHADO):
+
+    if url not in escritores:
+        escritores[url] = EscritorSerie(url, diretorio)
+
+    escritores[url].escrever(*vetores_estacao(df))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Atualiza o armazenamento compartilhado das estações.")
+    parser.add_argument("--max-consultas", type=int, default=MAX_CONSULTAS_ORIGEM, help="consultas simultâneas à origem")
+    parser.add_argument("--diretorio", default=DIRETORIO_COMPARTILHADO, help="diretório do armazenamento")
+    parser.add_argument("--uma-vez", action="store_true", help="consulta cada estação uma única vez e encerra")
+    parser.add_argument("--alertas", action="store_true", help="avalia os alertas a cada atualização")
+    args = parser.parse_args()
+
+    if args.alertas:
+        from alertas import MotorAlertas
+        motor = MotorAlertas()
+
+    # O atualizador é o único processo que consulta a origem
+    cache = CacheEstacoes(validade=0, pacote=pacote_do_ambiente())
+    escritores = {}
+
+    def ao_consultar(url, df):
+        gravar(escritores, url, df, args.diretorio)
+
+    # Os alertas são avaliados uma vez por ciclo, sobre todas as estações consultadas nele
+    agendador = Agendador(urls_cadastradas(), lambda url: cache.obter(url, forcar=True), cotas_alerta(),
+                          args.max_consultas)
+    agendador.executar(ao_consultar, uma_vez=args.uma_vez, ao_ciclo=motor.avaliar if args.alertas else None)
+
+
+if __name__ == "__main__":
+    main()
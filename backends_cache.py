@@ -0,0 +1,401 @@
+'''
+Arquivo que contém os backends do cache de estações. O cache de cada processo
+(cache_estacoes.py) publica em um backend compartilhado o retrato de cada
+estação após um download, e uma instância recém-iniciada (ou cujo cache
+expirou) aproveita um retrato ainda válido publicado por outra instância em
+vez de consultar app.tidesatglobal.com.
+
+Backends disponíveis, escolhidos pela variável TIDESAT_CACHE:
+    memoria            dicionário no próprio processo
+    disco:/caminho     um arquivo por estação
+    redis://host:porta qualquer servidor compatível com o protocolo Redis (RESP)
+
+Para desenvolvimento, este arquivo também traz um servidor RESP mínimo:
+    python backends_cache.py --porta 6379
+
+Os retratos são gravados no formato comprimido em blocos (ver compressao.py),
+precedidos por um cabeçalho com o CRC-32 do conteúdo; a idade e a última
+medição de um retrato são conferidas sem descomprimir a série, e um retrato
+corrompido no backend é descartado antes de qualquer bloco ser lido.
+
+'''
+
+import argparse
+import os
+import re
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+from compressao import comprimir_serie, SerieComprimida
+from rastreamento import registrar_falha
+
+# Cabeçalho do retrato: identificador, quantidade de medições, instante (epoch) da consulta à origem e
+# CRC-32 do conteúdo comprimido
+CABECALHO_RETRATO = struct.Struct("<8sQdI")
+MAGICO_RETRATO = b"TSATSNP3"
+
+# Erros levantados ao ler blocos de um retrato corrompido
+ERROS_RETRATO = (ValueError, IndexError, KeyError, OverflowError, struct.error, zlib.error)
+
+PREFIXO_CHAVE = "tidesat:estacao:"
+
+
+# Chave de uma estação nos backends
+def chave_estacao(url):
+    return PREFIXO_CHAVE + url
+
+
+# Serializa a série da estação no formato comprimido. Com `anterior` (a série comprimida do retrato
+# anterior da mesma estação, antes dos acréscimos), os blocos já comprimidos são reaproveitados.
+def serializar_serie(tempos, niveis, consultado_em, anterior=None):
+
+    conteudo = comprimir_serie(tempos, niveis, anterior)
+
+    return CABECALHO_RETRATO.pack(MAGICO_RETRATO, len(tempos), consultado_em, zlib.crc32(conteudo)) + conteudo
+
+
+# Retorna (série comprimida, consultado_em) sem descomprimir os blocos, ou None
+def abrir_retrato(dados):
+
+    if dados is None or len(dados) < CABECALHO_RETRATO.size:
+        return None
+
+    magico, n, consultado_em, crc = CABECALHO_RETRATO.unpack_from(dados)
+    conteudo = memoryview(dados)[CABECALHO_RETRATO.size:]
+
+    if magico != MAGICO_RETRATO or zlib.crc32(conteudo) != crc:
+        return None
+
+    try:
+        serie = SerieComprimida(conteudo)
+        if len(serie) != n:
+            return None
+    except ERROS_RETRATO:
+        return None
+
+    return serie, consultado_em
+
+
+# Retorna (tempos, níveis, consultado_em) do retrato, ou None
+def desserializar_serie(dados):
+
+    retrato = abrir_retrato(dados)
+
+    if retrato is None:
+        return None
+
+    serie, consultado_em = retrato
+
+    return (*serie.descomprimir(), consultado_em)
+
+
+# Interface comum: valores são bytes; falhas do backend equivalem a ausência do valor
+class BackendCache:
+
+    nome = "base"
+
+    def ler(self, chave):
+        raise NotImplementedError
+
+    def gravar(self, chave, dados):
+        raise NotImplementedError
+
+    def apagar(self, chave):
+        raise NotImplementedError
+
+
+class BackendMemoria(BackendCache):
+
+    nome = "memoria"
+
+    def __init__(self):
+        self._valores = {}
+        self._trava = threading.Lock()
+
+    def ler(self, chave):
+        with self._trava:
+            return self._valores.get(chave)
+
+    def gravar(self, chave, dados):
+        with self._trava:
+            self._valores[chave] = bytes(dados)
+
+    def apagar(self, chave):
+        with self._trava:
+            self._valores.pop(chave, None)
+
+
+class BackendDisco(BackendCache):
+
+    nome = "disco"
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, re.sub(r'[^A-Za-z0-9_.-]', '_', chave) + ".bin")
+
+    def ler(self, chave):
+        try:
+            with open(self._caminho(chave), "rb") as arquivo:
+                return arquivo.read()
+        except OSError:
+            return None
+
+    # Gravação atômica: leitores nunca veem um arquivo pela metade
+    def gravar(self, chave, dados):
+
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+
+        try:
+            with open(temporario, "wb") as arquivo:
+                arquivo.write(dados)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            registrar_falha("cache", f"falha ao gravar {caminho}: {e}")
+
+    def apagar(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except OSError:
+            pass
+
+
+# Erro retornado pelo servidor RESP
+class ErroRESP(Exception):
+    pass
+
+
+# Resposta fora do protocolo: a conexão perde o alinhamento e precisa ser refeita
+class ErroProtocoloRESP(ErroRESP):
+    pass
+
+
+# Codifica um comando como array RESP de bulk strings
+def codificar_comando(*partes):
+
+    saida = [b"*%d\r\n" % len(partes)]
+
+    for parte in partes:
+        parte = parte if isinstance(parte, bytes) else str(parte).encode()
+        saida.append(b"$%d\r\n%s\r\n" % (len(parte), parte))
+
+    return b"".join(saida)
+
+
+# Lê uma resposta RESP de um arquivo de socket
+def ler_resposta(arquivo):
+
+    linha = arquivo.readline()
+
+    if not linha:
+        raise ConnectionError("conexão encerrada pelo servidor")
+
+    tipo, resto = linha[:1], linha[1:-2]
+
+    if not linha.endswith(b"\r\n"):
+        raise ErroProtocoloRESP(f"resposta inválida: {linha!r}")
+    if tipo == b"+":
+        return resto.decode(errors="replace")
+    if tipo == b"-":
+        raise ErroRESP(resto.decode(errors="replace"))
+    if tipo == b":":
+        return _inteiro(resto, linha)
+    if tipo == b"$":
+        n = _inteiro(resto, linha)
+        if n < 0:
+            return None
+        dados = arquivo.read(n + 2)
+        if len(dados) != n + 2 or not dados.endswith(b"\r\n"):
+            raise ErroProtocoloRESP(f"bulk string incompleta ({len(dados)} de {n + 2} bytes)")
+        return dados[:-2]
+    if tipo == b"*":
+        n = _inteiro(resto, linha)
+        return None if n < 0 else [ler_resposta(arquivo) for _ in range(n)]
+
+    raise ErroProtocoloRESP(f"resposta inválida: {linha!r}")
+
+
+def _inteiro(texto, linha):
+    try:
+        return int(texto)
+    except ValueError:
+        raise ErroProtocoloRESP(f"resposta inválida: {linha!r}") from None
+
+
+class BackendRedis(BackendCache):
+
+    nome = "redis"
+
+    def __init__(self, host="localhost", porta=6379, timeout=2.0, expiracao=None):
+        self.endereco = (host, porta)
+        self.timeout = timeout
+        self.expiracao = expiracao
+        self._conexao = None
+        self._arquivo = None
+        self._trava = threading.Lock()
+
+    def _conectar(self):
+        self._conexao = socket.create_connection(self.endereco, timeout=self.timeout)
+        self._arquivo = self._conexao.makefile("rb")
+
+    def _fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+        self._conexao = self._arquivo = None
+
+    # Executa um comando, reconectando uma vez se a conexão tiver caído
+    def comando(self, *partes):
+
+        with self._trava:
+            for tentativa in range(2):
+                try:
+                    if self._conexao is None:
+                        self._conectar()
+                    self._conexao.sendall(codificar_comando(*partes))
+                    return ler_resposta(self._arquivo)
+                except ErroProtocoloRESP:
+                    # O restante da resposta ficaria para o próximo comando: descarta a conexão
+                    self._fechar()
+                    raise
+                except (OSError, ConnectionError):
+                    self._fechar()
+                    if tentativa:
+                        raise
+
+    # Qualquer falha (ou resposta que não seja um valor) vale como "sem retrato": o cache baixa da origem
+    def ler(self, chave):
+
+        try:
+            valor = self.comando("GET", chave)
+        except (OSError, ConnectionError, ErroRESP) as e:
+            registrar_falha("cache", f"backend redis indisponível: {e}")
+            return None
+
+        return valor if isinstance(valor, bytes) else None
+
+    def gravar(self, chave, dados):
+
+        partes = ["SET", chave, dados] + (["EX", int(self.expiracao)] if self.expiracao else [])
+
+        try:
+            self.comando(*partes)
+        except (OSError, ConnectionError, ErroRESP) as e:
+            registrar_falha("cache", f"backend redis indisponível: {e}")
+
+    def apagar(self, chave):
+        try:
+            self.comando("DEL", chave)
+        except (OSError, ConnectionError, ErroRESP) as e:
+            registrar_falha("cache", f"backend redis indisponível: {e}")
+
+
+# Backend configurado por TIDESAT_CACHE, ou None quando não definido (apenas o cache do processo)
+def backend_do_ambiente(valor=None):
+
+    valor = os.environ.get("TIDESAT_CACHE", "") if valor is None else valor
+
+    if not valor:
+        return None
+
+    if valor == "memoria":
+        return BackendMemoria()
+
+    if valor.startswith("disco:"):
+        return BackendDisco(valor[len("disco:"):])
+
+    if valor.startswith("redis://"):
+        host, _, porta = valor[len("redis://"):].rstrip("/").partition(":")
+        return BackendRedis(host or "localhost", int(porta or 6379))
+
+    raise ValueError(f"TIDESAT_CACHE inválido: {valor!r}")
+
+
+################# SERVIDOR RESP LOCAL #################
+
+# Atende um cliente: PING, GET, SET (com EX opcional), DEL, EXISTS e FLUSHALL
+class ManipuladorRESP(socketserver.StreamRequestHandler):
+
+    def _responder(self, valor):
+
+        if valor is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(valor, int):
+            self.wfile.write(b":%d\r\n" % valor)
+        elif isinstance(valor, bytes):
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(valor), valor))
+        else:
+            self.wfile.write(b"+%s\r\n" % valor.encode())
+
+    def handle(self):
+
+        dados = self.server.dados
+
+        while True:
+            try:
+                partes = ler_resposta(self.rfile)
+            except (ConnectionError, ErroRESP, ValueError):
+                return
+
+            comando = partes[0].upper() if partes else b""
+            agora = time.monotonic()
+
+            with self.server.trava:
+                if comando == b"PING":
+                    self._responder("PONG")
+                elif comando == b"GET":
+                    valor, expira = dados.get(partes[1], (None, None))
+                    if expira is not None and expira <= agora:
+                        dados.pop(partes[1], None)
+                        valor = None
+                    self._responder(valor)
+                elif comando == b"SET":
+                    expira = agora + float(partes[4]) if len(partes) >= 5 and partes[3].upper() == b"EX" else None
+                    dados[partes[1]] = (partes[2], expira)
+                    self._responder("OK")
+                elif comando == b"DEL":
+                    self._responder(sum(dados.pop(chave, None) is not None for chave in partes[1:]))
+                elif comando == b"EXISTS":
+                    self._responder(sum(chave in dados for chave in partes[1:]))
+                elif comando == b"FLUSHALL":
+                    dados.clear()
+                    self._responder("OK")
+                else:
+                    self.wfile.write(b"-ERR comando desconhecido\r\n")
+
+
+class ServidorRESP(socketserver.ThreadingTCPServer):
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, endereco):
+        super().__init__(endereco, ManipuladorRESP)
+        self.dados = {}
+        self.trava = threading.Lock()
+
+
+# Inicia o servidor RESP em segundo plano e o retorna (porta 0 = porta livre qualquer)
+def iniciar_servidor_local(host="127.0.0.1", porta=0):
+
+    servidor = ServidorRESP((host, porta))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    return servidor
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Servidor RESP local para testes do cache compartilhado.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=6379)
+    args = parser.parse_args()
+
+    print(f"[cache] servidor RESP em {args.host}:{args.porta}", flush=True)
+    ServidorRESP((args.host, args.porta)).serve_forever()
@@ -0,0 +1,14 @@
+'''
+Pacote que contém os benchmarks da dashboard. Os dados são arquivos
+sintéticos no formato exato da origem (ver dados_sinteticos.py) e os
+resultados são gravados em JSON para comparação entre commits:
+
+    python -m benchmarks.executar --linhas 50000 500000 5000000 --saida resultado.json
+    python -m benchmarks.comparar antes.json depois.json
+
+O teste de carga (carga.py) simula várias sessões simultâneas contra um
+servidor local no lugar da origem dos dados (origem_local.py):
+
+    python -m benchmarks.carga --sessoes 20 --reexecucoes 5 --latencia 0.3 --falhas 0.05
+
+'''
@@ -0,0 +1,334 @@
+'''
+Arquivo que contém o teste de carga da dashboard. Inicia o servidor local no
+lugar da origem dos dados (ver origem_local.py), aponta a dashboard para ele
+(TIDESAT_ORIGEM) e simula N sessões com reexecuções, de duas formas:
+
+- websocket (padrão): inicia `streamlit run main-multi.py` em um processo
+  separado e conecta N clientes simultâneos pelo mesmo protocolo do navegador
+  (BackMsg/ForwardMsg em /_stcore/stream). As métricas do servidor vêm de
+  /metrics.json (TIDESAT_METRICAS_PORTA);
+- apptest: usa a API de testes do Streamlit no próprio processo. O AppTest
+  substitui o Runtime global a cada execução e não pode rodar em várias
+  threads ao mesmo tempo, então as sessões se alternam (uma execução por vez),
+  compartilhando os caches como em uma instância real.
+
+Ao final relata os percentis da duração das execuções (primeira execução e
+reexecuções), as requisições recebidas pela origem, a memória do servidor, do
+cache compartilhado e das sessões, em texto e JSON.
+
+Uso: python -m benchmarks.carga --sessoes 20 --reexecucoes 5 --painel estrela --latencia 0.3 --falhas 0.05
+
+'''
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import warnings
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Configuração da dashboard antes de qualquer importação dos módulos dela
+os.environ.setdefault("TIDESAT_DADOS", tempfile.mkdtemp(prefix="tidesat_carga_"))
+os.environ.setdefault("TIDESAT_RASTREIO", "0")
+
+from benchmarks.origem_local import iniciar_origem, adicionar_argumentos, opcoes_origem  # noqa: E402
+
+# Ponto de entrada simulado (o mesmo da implantação, ver app.yaml)
+DIRETORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARQUIVO_APP = os.path.join(DIRETORIO_APP, "main-multi.py")
+
+PERCENTIS = (50, 90, 95, 99)
+
+# Tempo máximo de espera pelo servidor da dashboard (s)
+ESPERA_SERVIDOR_S = 60
+
+
+# Memória residente atual e pico de um processo (bytes), lidos de /proc/<pid>/status
+def memoria_processo(pid="self"):
+
+    try:
+        with open(f"/proc/{pid}/status") as arquivo:
+            campos = dict(linha.split(":", 1) for linha in arquivo if ":" in linha)
+    except OSError:
+        return {}
+
+    # Valores em kB
+    return {chave: int(campos[campo].split()[0]) * 1024
+            for chave, campo in (("rss_bytes", "VmRSS"), ("rss_pico_bytes", "VmHWM")) if campo in campos}
+
+
+# Pico de memória residente deste processo (bytes; ru_maxrss é dado em KiB no Linux)
+def rss_pico():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentis(valores):
+
+    if not valores:
+        return {}
+
+    valores = np.asarray(valores)
+
+    return {**{f"p{p}_s": float(np.percentile(valores, p)) for p in PERCENTIS},
+            "maximo_s": float(valores.max()), "contagem": int(len(valores))}
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ResultadosCarga:
+
+    def __init__(self):
+        self.primeiras = []
+        self.reexecucoes = []
+        self.erros = Counter()
+        self.bytes_sessoes = []
+        self.trava = threading.Lock()
+
+    def registrar(self, primeira, duracao, erros):
+        with self.trava:
+            (self.primeiras if primeira else self.reexecucoes).append(duracao)
+            self.erros.update(erros)
+
+
+################# MODO WEBSOCKET #################
+# Inicia a dashboard com `streamlit run` e espera o servidor responder
+def iniciar_dashboard(porta, porta_metricas):
+
+    ambiente = {**os.environ, "TIDESAT_METRICAS_PORTA": str(porta_metricas)}
+    comando = [sys.executable, "-m", "streamlit", "run", ARQUIVO_APP, "--server.port", str(porta),
+               "--server.address", "127.0.0.1", "--server.headless", "true",
+               "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"]
+
+    processo = subprocess.Popen(comando, cwd=DIRETORIO_APP, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + ESPERA_SERVIDOR_S
+
+    while time.monotonic() < limite:
+
+        if processo.poll() is not None:
+            raise RuntimeError(f"a dashboard terminou durante a inicialização (código {processo.returncode})")
+
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{porta}/_stcore/health", timeout=1):
+                return processo
+        except OSError:
+            time.sleep(0.5)
+
+    processo.terminate()
+    raise RuntimeError("a dashboard não respondeu a tempo")
+
+
+def ler_json(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resposta:
+            return json.load(resposta)
+    except (OSError, ValueError):
+        return None
+
+
+# Uma execução pelo websocket: envia rerun_script e espera script_finished (retorna as exceções exibidas)
+async def executar_websocket(conexao, query_string, timeout):
+
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    pedido = BackMsg()
+    pedido.rerun_script.query_string = query_string
+    await conexao.write_message(pedido.SerializeToString(), binary=True)
+
+    erros = []
+
+    while True:
+
+        mensagem = await asyncio.wait_for(conexao.read_message(), timeout)
+
+        if mensagem is None:
+            raise ConnectionError("conexão encerrada pelo servidor")
+
+        resposta = ForwardMsg()
+        resposta.ParseFromString(mensagem)
+        tipo = resposta.WhichOneof("type")
+
+        if tipo == "delta" and resposta.delta.new_element.WhichOneof("type") == "exception":
+            excecao = resposta.delta.new_element.exception
+            erros.append(f"{excecao.type}: {excecao.message}".splitlines()[0][:120])
+
+        # Fim da execução do script inteiro (as reexecuções automáticas de fragmentos são ignoradas)
+        elif tipo == "script_finished" and resposta.script_finished != ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+            return erros
+
+
+async def sessao_websocket(args, porta, resultados):
+
+    from tornado.websocket import websocket_connect
+
+    await asyncio.sleep(random.uniform(0, args.rampa))
+
+    conexao = await websocket_connect(f"ws://127.0.0.1:{porta}/_stcore/stream", subprotocols=["streamlit"])
+
+    try:
+        for execucao in range(args.reexecucoes + 1):
+
+            inicio = time.perf_counter()
+            try:
+                erros = await executar_websocket(conexao, f"painel={args.painel}", args.timeout)
+            except (asyncio.TimeoutError, ConnectionError) as e:
+                erros = [f"{type(e).__name__}: {e}"]
+            resultados.registrar(execucao == 0, time.perf_counter() - inicio, erros)
+
+            if args.pausa:
+                await asyncio.sleep(random.uniform(0, args.pausa))
+    finally:
+        conexao.close()
+
+
+async def sessoes_websocket(args, porta, resultados):
+    await asyncio.gather(*(sessao_websocket(args, porta, resultados) for _ in range(args.sessoes)))
+
+
+def carga_websocket(args, resultados):
+
+    porta, porta_metricas = porta_livre(), porta_livre()
+    processo = iniciar_dashboard(porta, porta_metricas)
+
+    try:
+        asyncio.run(sessoes_websocket(args, porta, resultados))
+
+        metricas = ler_json(f"http://127.0.0.1:{porta_metricas}/metrics.json") or {}
+        memoria_sessao = metricas.get("tidesat_sessao_memoria_bytes", {})
+
+        return {
+            "servidor": memoria_processo(processo.pid),
+            "sessao_bytes_quantis": memoria_sessao,
+            "metricas_servidor": {nome: metricas.get(nome) for nome in
+                                  ("tidesat_cache_consultas_total", "tidesat_execucao_quantis_segundos")},
+        }
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+################# MODO APPTEST #################
+# Uma execução por vez no processo (o AppTest troca o Runtime global a cada execução)
+TRAVA_APPTEST = threading.Lock()
+
+
+# Uma sessão simulada: primeira execução e `reexecucoes` reexecuções com pausas aleatórias
+def sessao_apptest(args, resultados):
+
+    from streamlit.testing.v1 import AppTest
+    from memoria import bytes_sessao
+
+    time.sleep(random.uniform(0, args.rampa))
+
+    app = AppTest.from_file(ARQUIVO_APP, default_timeout=args.timeout)
+    app.query_params["painel"] = args.painel
+
+    for execucao in range(args.reexecucoes + 1):
+
+        # A duração inclui a espera pela vez, como a fila de um processo ocupado
+        inicio = time.perf_counter()
+        with TRAVA_APPTEST:
+            app.run()
+        duracao = time.perf_counter() - inicio
+
+        resultados.registrar(execucao == 0, duracao, [e.message.splitlines()[0][:120] for e in app.exception])
+
+        if args.pausa:
+            time.sleep(random.uniform(0, args.pausa))
+
+    with resultados.trava:
+        resultados.bytes_sessoes.append(sum(bytes_sessao(app.session_state.filtered_state).values()))
+
+
+def carga_apptest(args, resultados):
+
+    # Avisos do modo de testes e do pandas não interessam ao relatório
+    warnings.simplefilter("ignore")
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+
+    with ThreadPoolExecutor(max_workers=args.sessoes) as executor:
+        for futuro in [executor.submit(sessao_apptest, args, resultados) for _ in range(args.sessoes)]:
+            futuro.result()
+
+    from cache_estacoes import obter_cache
+    from memoria import bytes_cache
+
+    return {
+        "servidor": {**memoria_processo(), "rss_pico_bytes": rss_pico()},
+        "cache_compartilhado_bytes": bytes_cache(obter_cache()),
+        "sessao_media_bytes": float(np.mean(resultados.bytes_sessoes)) if resultados.bytes_sessoes else None,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Teste de carga da dashboard com uma origem local.")
+    parser.add_argument("--modo", choices=("websocket", "apptest"), default="websocket",
+                        help="clientes websocket contra `streamlit run` ou AppTest no próprio processo")
+    parser.add_argument("--sessoes", type=int, default=10, help="sessões simultâneas")
+    parser.add_argument("--reexecucoes", type=int, default=3, help="reexecuções por sessão após a primeira")
+    parser.add_argument("--painel", default="tidesat", help="dashboard simulada (ver inquilinos.py)")
+    parser.add_argument("--pausa", type=float, default=1.0, help="pausa máxima entre execuções (s)")
+    parser.add_argument("--rampa", type=float, default=2.0, help="atraso máximo de início das sessões (s)")
+    parser.add_argument("--timeout", type=float, default=300, help="tempo máximo por execução (s)")
+    parser.add_argument("--saida", default=None, help="arquivo JSON com o relatório")
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    origem = iniciar_origem(**opcoes_origem(args))
+    os.environ["TIDESAT_ORIGEM"] = f"http://{origem.server_address[0]}:{origem.server_address[1]}"
+
+    resultados = ResultadosCarga()
+    inicio = time.perf_counter()
+
+    print(f"[carga] {args.sessoes} sessões x {args.reexecucoes + 1} execuções ({args.painel}, {args.modo}) "
+          f"contra {os.environ['TIDESAT_ORIGEM']}", file=sys.stderr, flush=True)
+
+    memoria = (carga_websocket if args.modo == "websocket" else carga_apptest)(args, resultados)
+
+    relatorio = {
+        "parametros": {k: v for k, v in vars(args).items() if k != "saida"},
+        "duracao_total_s": time.perf_counter() - inicio,
+        "primeira_execucao": percentis(resultados.primeiras),
+        "reexecucoes": percentis(resultados.reexecucoes),
+        "erros": dict(resultados.erros),
+        "origem": {
+            "requisicoes": sum(origem.estatisticas["requisicoes"].values()),
+            "falhas_injetadas": sum(origem.estatisticas["falhas"].values()),
+            "bytes_servidos": origem.estatisticas["bytes"],
+            "por_arquivo": origem.estatisticas["requisicoes"],
+        },
+        "memoria": memoria,
+    }
+
+    origem.shutdown()
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            arquivo.write(texto + "\n")
+
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
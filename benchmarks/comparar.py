@@ -0,0 +1,52 @@
+'''
+Arquivo que contém a comparação entre dois resultados dos benchmarks
+(ex.: antes e depois de um commit). Mostra a mediana de cada caso nos dois
+resultados e a razão depois/antes, destacando as regressões acima do limite.
+
+Uso: python -m benchmarks.comparar antes.json depois.json [--limite 1.10]
+
+'''
+
+import argparse
+import json
+import sys
+
+
+# Medianas por (linhas, caso)
+def medianas(resultado):
+    return {(tamanho["linhas"], caso): dados["mediana_s"]
+            for tamanho in resultado["tamanhos"] for caso, dados in tamanho["casos"].items()}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Compara dois resultados dos benchmarks.")
+    parser.add_argument("antes")
+    parser.add_argument("depois")
+    parser.add_argument("--limite", type=float, default=1.10, help="razão depois/antes considerada regressão")
+    args = parser.parse_args()
+
+    with open(args.antes) as arquivo:
+        antes = json.load(arquivo)
+    with open(args.depois) as arquivo:
+        depois = json.load(arquivo)
+
+    m_antes, m_depois = medianas(antes), medianas(depois)
+    regressoes = 0
+
+    print(f"{'linhas':>9}  {'caso':<40} {'antes (ms)':>11} {'depois (ms)':>12} {'razão':>7}")
+    print(f"{'':>9}  {antes.get('commit') or '?':<40} {'':>11} {depois.get('commit') or '?':>12}")
+
+    for chave in sorted(set(m_antes) & set(m_depois)):
+        razao = m_depois[chave] / m_antes[chave] if m_antes[chave] > 0 else float("inf")
+        marca = "  <-- regressão" if razao > args.limite else ""
+        regressoes += bool(marca)
+        print(f"{chave[0]:>9}  {chave[1]:<40} {m_antes[chave] * 1e3:>11.2f} {m_depois[chave] * 1e3:>12.2f} "
+              f"{razao:>7.2f}{marca}")
+
+    # Código de saída diferente de zero permite usar a comparação em um workflow
+    sys.exit(1 if regressoes else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+'''
+Arquivo que contém a geração dos arquivos sintéticos das estações, no mesmo
+formato CSV publicado pela origem (cabeçalho "% year, month, day, hour,
+minute, second (GMT/UTC), water level (meters)"). As séries têm cadência de
+10 minutos terminando no instante atual, maré semidiurna, ondas de cheia,
+ruído e lacunas, e são guardadas em disco para não serem regeradas a cada
+execução.
+
+'''
+
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CABECALHO = "% year, month, day, hour, minute, second (GMT/UTC), water level (meters)"
+
+# Cadência nominal das estações (segundos)
+CADENCIA_S = 600
+
+# Fração das medições removidas para simular lacunas
+FRACAO_LACUNAS = 0.005
+
+DIRETORIO_SINTETICOS = os.path.join(tempfile.gettempdir(), "tidesat_benchmarks")
+
+
+# Tempos (UTC) e níveis sintéticos com `linhas` medições terminando em `fim`
+def serie_sintetica(linhas, semente=0, fim=None):
+
+    rng = np.random.default_rng(semente)
+    fim = pd.Timestamp.utcnow().floor("10min") if fim is None else pd.Timestamp(fim)
+
+    # Algumas medições a mais compensam as lacunas removidas
+    total = int(linhas / (1 - FRACAO_LACUNAS)) + 1
+    horas = (np.arange(total) - total + 1) * (CADENCIA_S / 3600)
+
+    mare = 0.4 * np.sin(2 * np.pi * horas / 12.42) + 0.1 * np.sin(2 * np.pi * horas / 12.0)
+    cheias = 1.5 * np.sin(2 * np.pi * horas / (24 * 45)) ** 8
+    niveis = 2.0 + mare + cheias + rng.normal(0, 0.01, total)
+
+    manter = np.sort(rng.choice(total, size=linhas, replace=False))
+    tempos = fim.tz_localize(None) + pd.to_timedelta(horas[manter], unit="h").round("s")
+
+    return tempos, niveis[manter]
+
+
+# Grava as medições no formato da origem (um arquivo aberto ou qualquer objeto com write)
+def escrever_csv(destino, linhas, semente=0, fim=None):
+
+    tempos, niveis = serie_sintetica(linhas, semente, fim)
+    colunas = np.column_stack([tempos.year, tempos.month, tempos.day, tempos.hour, tempos.minute, tempos.second, niveis])
+
+    np.savetxt(destino, colunas, fmt="%d, %d, %d, %d, %d, %d, %.3f", header=CABECALHO, comments="")
+
+
+# Texto CSV no formato da origem
+def gerar_csv(linhas, semente=0, fim=None):
+
+    destino = io.StringIO()
+    escrever_csv(destino, linhas, semente, fim)
+
+    return destino.getvalue()
+
+
+# Caminho do arquivo sintético (gerado apenas se ainda não existir para a hora atual)
+def arquivo_sintetico(linhas, semente=0, diretorio=DIRETORIO_SINTETICOS):
+
+    # A hora faz parte do nome: as séries terminam "agora", como exigem os indicadores recentes
+    hora = pd.Timestamp.utcnow().strftime("%Y%m%d%H")
+    caminho = os.path.join(diretorio, f"estacao_{linhas}_{semente}_{hora}.csv")
+
+    if not os.path.exists(caminho):
+        os.makedirs(diretorio, exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+
+        with open(temporario, "w") as arquivo:
+            escrever_csv(arquivo, linhas, semente)
+
+        os.replace(temporario, caminho)
+
+    return caminho
+
+
+# Conteúdo do arquivo sintético
+def ler_sintetico(linhas, semente=0, diretorio=DIRETORIO_SINTETICOS):
+    with open(arquivo_sintetico(linhas, semente, diretorio)) as arquivo:
+        return arquivo.read()
@@ -0,0 +1,216 @@
+'''
+Arquivo que contém a execução dos benchmarks. Para cada tamanho de estação
+são medidos o carregamento (CSV -> DataFrame, frio e via cache), a filtragem
+por período, nivel_recente, calcular_velocidade, a montagem da figura de
+plotar_grafico (24h, 7 dias e período inteiro, pelo mesmo caminho usado na
+dashboard) e plotar_sobreposicao_estrela. Os downloads são substituídos pela
+leitura dos arquivos sintéticos e o Streamlit roda em modo "bare".
+
+Uso: python -m benchmarks.executar [--linhas 50000 500000 5000000] [--saida resultado.json]
+
+'''
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import timedelta
+
+import numpy as np
+
+# Sem persistência dos agregados entre execuções e sem logs de rastreio durante as medições
+os.environ.setdefault("TIDESAT_DADOS", tempfile.mkdtemp(prefix="tidesat_bench_"))
+os.environ["TIDESAT_RASTREIO"] = "0"
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.dados_sinteticos import ler_sintetico  # noqa: E402
+
+TAMANHOS_PADRAO = [50_000, 500_000, 5_000_000]
+
+# Acima deste tamanho a comparação entre estações usa este número de linhas nas demais estações
+LIMITE_COMPARACAO = 500_000
+
+
+# Estatísticas (em segundos) de `repeticoes` execuções de `funcao`, após `aquecimento` execuções descartadas
+def medir(funcao, repeticoes=5, aquecimento=1):
+
+    for _ in range(aquecimento):
+        funcao()
+
+    tempos = []
+
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    tempos = np.array(tempos)
+
+    return {
+        "repeticoes": repeticoes,
+        "mediana_s": float(np.median(tempos)),
+        "minimo_s": float(tempos.min()),
+        "media_s": float(tempos.mean()),
+        "maximo_s": float(tempos.max()),
+    }
+
+
+# Commit atual (quando executado dentro do repositório)
+def commit_atual():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Descarta os caches do processo e os agregados gravados (cada tamanho começa do zero)
+def reiniciar_estado():
+
+    import streamlit as st
+
+    st.cache_resource.clear()
+
+    diretorio = os.environ["TIDESAT_DADOS"]
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio, exist_ok=True)
+
+
+# Dados do gráfico principal pelo mesmo caminho da dashboard (agregados horários em períodos longos)
+def dados_grafico(tools, url, inicio, fim, fuso):
+
+    if fim - inicio > timedelta(days=tools.LIMITE_DIAS_BRUTOS):
+        dados = tools.dados_agregados_periodo(url, inicio, fim, fuso)
+    else:
+        dados = tools.dados_periodo(url, inicio, fim, fuso)
+
+    return tools.corte_ultima_1h(dados)
+
+
+# Executa os benchmarks de uma estação com `linhas` medições
+def benchmarks_tamanho(linhas, repeticoes, limite_comparacao):
+
+    import streamlit as st
+    import cache_estacoes
+    import tools
+    from main_estrela_config import ESTACOES_ESTRELA, TIMEZONE_PADRAO
+    from perfis import PERFIL_ESTRELA
+    from language import LANG
+
+    lang = LANG["pt"]
+    fuso = TIMEZONE_PADRAO
+    estacoes = PERFIL_ESTRELA.estacoes_comparacao
+    url = ESTACOES_ESTRELA["EST1"]["url"]
+
+    # Estação principal com `linhas` medições; as demais da comparação limitadas a `limite_comparacao`
+    textos = {ESTACOES_ESTRELA[cod]["url"]: ler_sintetico(linhas if cod == "EST1" else min(linhas, limite_comparacao),
+                                                         semente=i)
+              for i, cod in enumerate(estacoes)}
+    cache_estacoes.baixar_csv_estacao = textos.__getitem__
+
+    resultados = {}
+    repeticoes_frio = max(1, repeticoes // 2)
+
+    def carregar_frio():
+        reiniciar_estado()
+        tools.carregar_dados(url)
+
+    resultados["carregar_dados_frio"] = medir(carregar_frio, repeticoes_frio, aquecimento=0)
+    resultados["carregar_dados_cache"] = medir(lambda: tools.carregar_dados(url), repeticoes)
+
+    df = tools.carregar_dados(url)
+    ultimo = df['datetime_utc'].iloc[-1].tz_convert(fuso).date()
+    primeiro = df['datetime_utc'].iloc[0].tz_convert(fuso).date()
+    periodos = {"24h": (ultimo - timedelta(days=1), ultimo), "7d": (ultimo - timedelta(days=7), ultimo),
+                "inteiro": (primeiro, ultimo)}
+
+    # Filtragem: caminho atual (busca binária + fuso só no período) e o filtro por máscara
+    df_ajustado = df.assign(datetime_ajustado=df['datetime_utc'].dt.tz_convert(fuso))
+
+    for nome, (inicio, fim) in periodos.items():
+        resultados[f"filtro_periodo_{nome}"] = medir(lambda: tools.dados_periodo(url, inicio, fim, fuso), repeticoes)
+        resultados[f"filtro_mascara_{nome}"] = medir(lambda: tools.filtrar_dados(df_ajustado, inicio, fim, fuso),
+                                                     repeticoes)
+
+    resultados["nivel_recente"] = medir(lambda: tools.nivel_recente(df, fuso, lang), repeticoes)
+    resultados["nivel_recente_ajustado"] = medir(lambda: tools.nivel_recente(df, fuso, lang, modo="ajustado"), repeticoes)
+    resultados["calcular_velocidade"] = medir(lambda: tools.calcular_velocidade(df), repeticoes)
+
+    # Primeira consulta aos agregados horários (inclui a construção a partir dos dados brutos)
+    resultados["agregados_frio"] = medir(
+        lambda: dados_grafico(tools, url, *periodos["inteiro"], fuso), 1, aquecimento=0)
+
+    st.session_state["fuso_selecionado"] = fuso
+    cota_alerta, cota_inundacao = tools.cotas_notaveis("EST1", ESTACOES_ESTRELA)
+
+    for nome, (inicio, fim) in periodos.items():
+
+        dados = dados_grafico(tools, url, inicio, fim, fuso)
+
+        resultados[f"plotar_grafico_figura_{nome}"] = {
+            **medir(lambda: tools.construir_grafico(url, ESTACOES_ESTRELA, dados, "EST1", cota_alerta, cota_inundacao,
+                                                    inicio, fim, lang, PERFIL_ESTRELA), repeticoes),
+            "pontos": len(dados),
+        }
+
+    for nome, (inicio, fim) in periodos.items():
+
+        st.session_state["dados_inicio"], st.session_state["dados_fim"] = inicio, fim
+
+        resultados[f"plotar_sobreposicao_estrela_{nome}"] = medir(
+            lambda: tools.plotar_sobreposicao_estrela(ESTACOES_ESTRELA, lang, PERFIL_ESTRELA), repeticoes)
+
+    return {"linhas": linhas, "linhas_comparacao": min(linhas, limite_comparacao), "casos": resultados}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmarks da dashboard com estações sintéticas.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS_PADRAO, help="tamanhos das estações")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições por caso")
+    parser.add_argument("--limite-comparacao", type=int, default=LIMITE_COMPARACAO,
+                        help="linhas máximas das demais estações na comparação")
+    parser.add_argument("--saida", default=None, help="arquivo JSON de saída (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    import streamlit
+    import plotly
+
+    # Avisos do modo "bare" (sem ScriptRunContext) e do pandas não interessam às medições
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    warnings.simplefilter("ignore")
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": pd.Timestamp.utcnow().isoformat(),
+        "ambiente": {
+            "python": platform.python_version(), "plataforma": platform.platform(),
+            "numpy": np.__version__, "pandas": pd.__version__,
+            "plotly": plotly.__version__, "streamlit": streamlit.__version__,
+        },
+        "tamanhos": [],
+    }
+
+    for linhas in args.linhas:
+        print(f"[benchmarks] {linhas} linhas...", file=sys.stderr, flush=True)
+        resultado["tamanhos"].append(benchmarks_tamanho(linhas, args.repeticoes, args.limite_comparacao))
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
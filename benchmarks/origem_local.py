@@ -0,0 +1,185 @@
+'''
+Arquivo que contém o servidor HTTP local que substitui app.tidesatglobal.com
+nos testes de carga. Serve, para qualquer caminho terminado em .csv, um
+arquivo gravado (--gravados, pelo nome do arquivo) ou uma série sintética,
+com latência, falhas e crescimento lento configuráveis. Pedidos com
+"Range: bytes=N-" recebem apenas o trecho a partir do byte N (206), como na
+origem real. As estatísticas de requisições ficam em /_estatisticas (JSON).
+
+Uso: python -m benchmarks.origem_local --porta 8765 --linhas 50000 --latencia 0.3 --falhas 0.05 --crescimento 6
+
+A dashboard é apontada para o servidor com TIDESAT_ORIGEM=http://127.0.0.1:8765.
+
+'''
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_csv
+
+
+# Série de uma estação já formatada, servida em prefixos que crescem com o tempo
+class SerieServida:
+
+    def __init__(self, texto, reserva):
+        # As últimas `reserva` linhas são liberadas aos poucos para simular medições novas
+        linhas = texto.encode().split(b"\n")
+        linhas = [linha for linha in linhas if linha]
+        self.texto = b"\n".join(linhas) + b"\n"
+        self.fins = np.cumsum([len(linha) + 1 for linha in linhas])
+        self.base = max(len(linhas) - reserva, 2)
+
+    # Conteúdo com as linhas liberadas até `extras` medições novas
+    def conteudo(self, extras):
+        n = min(self.base + int(extras), len(self.fins))
+        return self.texto[:self.fins[n - 1]]
+
+
+class ServidorOrigem(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, endereco, linhas=50_000, gravados=None, latencia=0.0, variacao=0.0, falhas=0.0,
+                 crescimento=0.0, reserva=10_000):
+        super().__init__(endereco, ManipuladorOrigem)
+        self.linhas = linhas
+        self.gravados = gravados
+        self.latencia = latencia
+        self.variacao = variacao
+        self.falhas = falhas
+        self.crescimento = crescimento  # medições novas por minuto
+        self.reserva = reserva
+        self.inicio = time.monotonic()
+        self.series = {}
+        self.estatisticas = {"requisicoes": {}, "falhas": {}, "bytes": 0}
+        self.trava = threading.Lock()
+
+    # Série do arquivo pedido (gravada ou sintética, com semente derivada do nome)
+    def serie(self, nome):
+
+        with self.trava:
+            if nome in self.series:
+                return self.series[nome]
+
+        caminho = os.path.join(self.gravados, nome) if self.gravados else None
+
+        if caminho and os.path.exists(caminho):
+            with open(caminho) as arquivo:
+                serie = SerieServida(arquivo.read(), 0)
+        else:
+            # As medições reservadas ficam "no futuro" e a parte servida de início termina agora
+            fim = pd.Timestamp.utcnow().floor("10min") + pd.Timedelta(minutes=10 * self.reserva)
+            serie = SerieServida(gerar_csv(self.linhas + self.reserva, zlib.crc32(nome.encode()), fim), self.reserva)
+
+        with self.trava:
+            return self.series.setdefault(nome, serie)
+
+    def registrar(self, chave, nome, n=1):
+        with self.trava:
+            self.estatisticas[chave][nome] = self.estatisticas[chave].get(nome, 0) + n
+
+
+class ManipuladorOrigem(BaseHTTPRequestHandler):
+
+    def _responder(self, status, corpo, tipo="text/plain", cabecalhos=None):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+
+        servidor = self.server
+
+        if self.path.startswith("/_estatisticas"):
+            with servidor.trava:
+                corpo = json.dumps(servidor.estatisticas).encode()
+            self._responder(200, corpo, "application/json")
+            return
+
+        nome = self.path.split("?")[0].rstrip("/").split("/")[-1]
+
+        if not nome.endswith(".csv"):
+            self._responder(404, b"nao encontrado")
+            return
+
+        servidor.registrar("requisicoes", nome)
+
+        atraso = servidor.latencia + random.uniform(0, servidor.variacao)
+        if atraso > 0:
+            time.sleep(atraso)
+
+        if random.random() < servidor.falhas:
+            servidor.registrar("falhas", nome)
+            self._responder(503, b"indisponivel")
+            return
+
+        extras = (time.monotonic() - servidor.inicio) / 60 * servidor.crescimento
+        corpo = servidor.serie(nome).conteudo(extras)
+        status, cabecalhos = 200, None
+        intervalo = self.headers.get("Range", "")
+
+        if intervalo.startswith("bytes=") and intervalo.endswith("-") and intervalo[6:-1].isdigit():
+            inicio = int(intervalo[6:-1])
+
+            if inicio >= len(corpo):
+                self._responder(416, b"", cabecalhos={"Content-Range": f"bytes */{len(corpo)}"})
+                return
+
+            status, cabecalhos = 206, {"Content-Range": f"bytes {inicio}-{len(corpo) - 1}/{len(corpo)}"}
+            corpo = corpo[inicio:]
+
+        with servidor.trava:
+            servidor.estatisticas["bytes"] += len(corpo)
+
+        self._responder(status, corpo, "text/csv", cabecalhos)
+
+    def log_message(self, *args):
+        pass
+
+
+# Inicia o servidor em segundo plano (porta 0 = porta livre qualquer)
+def iniciar_origem(host="127.0.0.1", porta=0, **opcoes):
+
+    servidor = ServidorOrigem((host, porta), **opcoes)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    return servidor
+
+
+def adicionar_argumentos(parser):
+    parser.add_argument("--linhas", type=int, default=50_000, help="medições das séries sintéticas")
+    parser.add_argument("--gravados", default=None, help="diretório com CSVs gravados (pelo nome do arquivo)")
+    parser.add_argument("--latencia", type=float, default=0.0, help="latência fixa (s)")
+    parser.add_argument("--variacao", type=float, default=0.0, help="latência adicional aleatória máxima (s)")
+    parser.add_argument("--falhas", type=float, default=0.0, help="fração de respostas 503")
+    parser.add_argument("--crescimento", type=float, default=0.0, help="medições novas por minuto")
+
+
+def opcoes_origem(args):
+    return {"linhas": args.linhas, "gravados": args.gravados, "latencia": args.latencia,
+            "variacao": args.variacao, "falhas": args.falhas, "crescimento": args.crescimento}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Servidor local no lugar da origem dos dados das estações.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    print(f"[origem] servindo em http://{args.host}:{args.porta}", flush=True)
+    ServidorOrigem((args.host, args.porta), **opcoes_origem(args)).serve_forever()
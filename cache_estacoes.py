@@ -0,0 +1,449 @@
+'''
+Arquivo que contém o cache compartilhado dos dados das estações. Uma única
+instância atende todas as sessões do processo: cada estação é baixada no
+máximo uma vez por período de validade e as medições novas são apenas
+acrescentadas ao final da série já carregada. Com vários processos no mesmo
+host (TIDESAT_SHM definido), as séries são lidas sem cópia do armazenamento
+compartilhado mantido pelo atualizador (ver memoria_compartilhada.py). Com
+várias instâncias (TIDESAT_CACHE definido), cada download é publicado em um
+backend compartilhado, no formato comprimido (ver compressao.py), e
+reaproveitado pelas demais (ver backends_cache.py).
+As linhas novas de cada download passam pela limpeza (ver limpeza.py) antes
+de serem acrescentadas. Em uma instância recém-iniciada, as séries partem do
+pacote inicial gerado na implantação (ver pacote_inicial.py) e apenas o
+trecho do arquivo da origem acrescentado depois dele é baixado.
+
+'''
+
+import os
+import threading
+import time
+from collections import namedtuple
+from io import StringIO
+
+import pandas as pd
+import requests
+import streamlit as st
+
+from memoria_compartilhada import loja_do_ambiente
+from backends_cache import backend_do_ambiente, chave_estacao, serializar_serie, abrir_retrato, ERROS_RETRATO
+from alinhamento import vetores_estacao
+from limpeza import limpar_df, cauda_serie
+from rastreamento import trecho, registrar_falha
+from metricas import (rotulo_estacao, CACHE_CONSULTAS, CACHE_EXPIRACOES, ORIGEM_LATENCIA, ORIGEM_RESPOSTAS,
+                      ORIGEM_BYTES, LEITURA_CSV, LIMPEZA_DESCARTES)
+
+# Tempo (em segundos) que uma estação é considerada atualizada
+VALIDADE_CACHE = int(os.environ.get("TIDESAT_VALIDADE_CACHE", 120))
+
+# Consultas simultâneas à origem permitidas no processo (sessões e agendador, ver agendador.py)
+MAX_CONSULTAS_ORIGEM = int(os.environ.get("TIDESAT_MAX_CONSULTAS", 4))
+
+# Origem dos dados das estações e substituta opcional (ex.: servidor local dos testes de carga)
+ORIGEM_PADRAO = "https://app.tidesatglobal.com"
+ORIGEM = os.environ.get("TIDESAT_ORIGEM", "").rstrip("/")
+
+# Nomes das colunas no arquivo de origem
+COLUNAS_ORIGEM = {
+    '% year': 'year', ' month': 'month', ' day': 'day',
+    ' hour': 'hour', ' minute': 'minute', ' second (GMT/UTC)': 'second',
+    ' water level (meters)': 'water_level(m)'}
+
+# Posição já lida do arquivo da origem (que só cresce): tamanho em bytes, linha de cabeçalho e última linha
+PosicaoOrigem = namedtuple("PosicaoOrigem", ["tamanho", "cabecalho", "ultima_linha"])
+
+
+# Funções chamadas a cada chegada de medições novas em uma estação (ver ao_atualizar)
+_ouvintes = []
+
+_vagas_origem = threading.BoundedSemaphore(MAX_CONSULTAS_ORIGEM)
+
+
+# Erro levantado quando a estação não pode ser baixada ou interpretada
+class ErroDadosEstacao(Exception):
+    pass
+
+
+# Registra uma função a ser chamada com (url, df) sempre que uma estação recebe medições novas.
+# A chamada acontece com a estação travada: a função deve apenas agendar o trabalho.
+def ao_atualizar(funcao):
+    if funcao not in _ouvintes:
+        _ouvintes.append(funcao)
+    return funcao
+
+
+def _notificar(url, df):
+    for ouvinte in list(_ouvintes):
+        ouvinte(url, df)
+
+
+# Converte o texto CSV da estação no DataFrame usado pela dashboard
+def ler_csv_estacao(texto):
+
+    # Respostas 200 com corpo vazio, HTML ou colunas diferentes também são erros da estação
+    try:
+        df = pd.read_csv(StringIO(texto), sep=',')
+
+        if df.empty:
+            raise ErroDadosEstacao("Erro ao carregar os dados da estação selecionada.")
+
+        df.rename(columns=COLUNAS_ORIGEM, inplace=True)
+
+        df['datetime'] = pd.to_datetime(df[['year', 'month', 'day', 'hour', 'minute', 'second']])
+        df['datetime_utc'] = df['datetime'].dt.tz_localize('UTC')
+
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, KeyError, ValueError, TypeError) as e:
+        raise ErroDadosEstacao(f"Dados da estação em formato inválido: {e!r}") from e
+
+    return df
+
+
+# URL efetivamente consultada (a origem pode ser substituída por TIDESAT_ORIGEM)
+def url_origem(url):
+
+    if ORIGEM and url.startswith(ORIGEM_PADRAO):
+        return ORIGEM + url[len(ORIGEM_PADRAO):]
+
+    return url
+
+
+# Faz o download do arquivo bruto da estação (no máximo MAX_CONSULTAS_ORIGEM ao mesmo tempo no processo)
+def baixar_csv_estacao(url):
+
+    estacao = rotulo_estacao(url)
+
+    with _vagas_origem:
+        inicio = time.perf_counter()
+
+        try:
+            resposta = requests.get(url_origem(url), verify=False, timeout=100)
+        except requests.RequestException as e:
+            ORIGEM_LATENCIA.observar(estacao, valor=time.perf_counter() - inicio)
+            ORIGEM_RESPOSTAS.incrementar(estacao, "erro")
+            raise ErroDadosEstacao(f"Erro ao acessar os dados da estação selecionada: {e}") from e
+
+        ORIGEM_LATENCIA.observar(estacao, valor=time.perf_counter() - inicio)
+
+    ORIGEM_RESPOSTAS.incrementar(estacao, str(resposta.status_code))
+    ORIGEM_BYTES.incrementar(estacao, valor=len(resposta.content))
+
+    if resposta.status_code != 200:
+        raise ErroDadosEstacao("Erro ao acessar os dados da estação selecionada.")
+
+    return resposta.text
+
+
+# Posição ao final do conteúdo lido a partir do byte `inicio` do arquivo da origem
+def posicao_conteudo(conteudo, inicio=0, cabecalho=None):
+
+    fim = conteudo.rfind(b"\n", 0, len(conteudo) - 1) + 1
+
+    if cabecalho is None:
+        cabecalho = conteudo[:conteudo.find(b"\n") + 1]
+
+    return PosicaoOrigem(inicio + len(conteudo), cabecalho, conteudo[fim:])
+
+
+# Faz o download apenas do trecho acrescentado ao arquivo da estação depois de `posicao` (requisição com
+# Range, a partir da última linha já lida, que precisa continuar igual). Retorna (texto, nova posição), com
+# texto None se não há linhas novas, ou None se a origem não atendeu ou o arquivo foi reescrito.
+def baixar_cauda_csv(url, posicao):
+
+    estacao = rotulo_estacao(url)
+    inicio_pedido = posicao.tamanho - len(posicao.ultima_linha)
+
+    with _vagas_origem:
+        inicio = time.perf_counter()
+
+        try:
+            resposta = requests.get(url_origem(url), headers={"Range": f"bytes={inicio_pedido}-"},
+                                    verify=False, timeout=100)
+        except requests.RequestException as e:
+            ORIGEM_LATENCIA.observar(estacao, valor=time.perf_counter() - inicio)
+            ORIGEM_RESPOSTAS.incrementar(estacao, "erro")
+            raise ErroDadosEstacao(f"Erro ao acessar os dados da estação selecionada: {e}") from e
+
+        ORIGEM_LATENCIA.observar(estacao, valor=time.perf_counter() - inicio)
+
+    ORIGEM_RESPOSTAS.incrementar(estacao, str(resposta.status_code))
+    ORIGEM_BYTES.incrementar(estacao, valor=len(resposta.content))
+    conteudo = resposta.content
+
+    # Origem sem suporte a Range: o arquivo veio inteiro
+    if resposta.status_code == 200:
+        return resposta.text, posicao_conteudo(conteudo)
+
+    if resposta.status_code != 206 or not conteudo.startswith(posicao.ultima_linha):
+        return None
+
+    nova_posicao = posicao_conteudo(conteudo, inicio_pedido, posicao.cabecalho)
+    novas = conteudo[len(posicao.ultima_linha):]
+
+    if not novas.strip():
+        return None, nova_posicao
+
+    return (posicao.cabecalho + novas).decode(resposta.encoding or "utf-8"), nova_posicao
+
+
+# DataFrame montado sobre os vetores do armazenamento compartilhado (ou do pacote inicial), sem cópia
+def df_de_vetores(tempos, niveis, qualidade=None):
+
+    datas = pd.arrays.DatetimeArray(tempos.view('M8[ns]'), dtype=pd.DatetimeTZDtype(tz='UTC'), copy=False)
+    colunas = {
+        'datetime_utc': pd.Series(datas, copy=False),
+        'water_level(m)': pd.Series(niveis, copy=False)}
+
+    if qualidade is not None:
+        colunas['qualidade'] = pd.Series(qualidade, copy=False)
+
+    return pd.DataFrame(colunas, copy=False)
+
+
+# Estado de uma estação dentro do cache
+class EntradaEstacao:
+
+    def __init__(self):
+        self.df = None
+        self.versao = 0
+        self.consultado_em = 0.0
+        self.versao_loja = None
+        # Últimas medições brutas (antes da limpeza), contexto do filtro de picos no próximo acréscimo
+        self.cauda_bruta = None
+        # Posição no arquivo da origem, conhecida quando a série veio do pacote inicial (ver baixar_cauda_csv)
+        self.posicao = None
+        # Série comprimida do último retrato publicado ou adotado (blocos reaproveitados na próxima publicação)
+        self.comprimido = None
+        self.trava = threading.Lock()
+
+    # Último instante (UTC) presente na série
+    @property
+    def ultimo_utc(self):
+        if self.df is None or self.df.empty:
+            return None
+        return self.df['datetime_utc'].iloc[-1]
+
+
+class CacheEstacoes:
+
+    def __init__(self, validade=VALIDADE_CACHE, loja=None, backend=None, pacote=None):
+        self.validade = validade
+        self.loja = loja
+        self.backend = backend
+        self.pacote = pacote
+        # Com o agendador (ver agendador.py), as séries carregadas não expiram: ele decide quando consultar
+        self.agendado = False
+        self._entradas = {}
+        self._trava = threading.Lock()
+
+    def _entrada(self, url):
+        with self._trava:
+            if url not in self._entradas:
+                self._entradas[url] = EntradaEstacao()
+            return self._entradas[url]
+
+    # Retorna a série da estação, consultando a origem apenas se o cache expirou.
+    # O DataFrame retornado é compartilhado entre sessões e não deve ser alterado.
+    def obter(self, url, forcar=False):
+
+        entrada = self._entrada(url)
+
+        with entrada.trava:
+            # Com o armazenamento compartilhado, basta conferir a versão no cabeçalho
+            if self.loja is not None and self._sincronizar_loja(entrada, url):
+                CACHE_CONSULTAS.incrementar(rotulo_estacao(url), "compartilhado")
+                return entrada.df
+
+            expirado = not self.agendado and time.monotonic() - entrada.consultado_em >= self.validade
+
+            if entrada.df is None and self.pacote is not None and self._adotar_pacote(entrada, url):
+                resultado = "pacote"
+            elif entrada.df is None:
+                resultado = "falta"
+            elif forcar:
+                resultado = "forcado"
+            elif expirado:
+                resultado = "expirado"
+                CACHE_EXPIRACOES.incrementar(rotulo_estacao(url))
+            else:
+                resultado = "acerto"
+
+            CACHE_CONSULTAS.incrementar(rotulo_estacao(url), resultado)
+
+            if resultado != "acerto":
+                self._atualizar(entrada, url, forcar)
+
+            return entrada.df
+
+    # Séries carregadas no momento (url -> DataFrame)
+    def series(self):
+        with self._trava:
+            entradas = list(self._entradas.items())
+        return {url: entrada.df for url, entrada in entradas if entrada.df is not None}
+
+    # Versão atual da estação (incrementada a cada chegada de medições novas)
+    def versao(self, url):
+        return self._entrada(url).versao
+
+    # Lê a estação do armazenamento compartilhado; False se o atualizador ainda não a gravou
+    def _sincronizar_loja(self, entrada, url):
+
+        leitor = self.loja.leitor(url)
+        versao = leitor.versao()
+
+        if versao is None:
+            return False
+
+        if versao == entrada.versao_loja:
+            return True
+
+        leitura = leitor.ler()
+
+        if leitura is None:
+            return entrada.df is not None
+
+        tempos, niveis, versao = leitura
+        entrada.df = df_de_vetores(tempos, niveis)
+        entrada.cauda_bruta = None
+        entrada.posicao = None
+        entrada.comprimido = None
+        entrada.versao_loja = versao
+        entrada.versao += 1
+        _notificar(url, entrada.df)
+
+        return True
+
+    # Adota o retrato publicado por outra instância se ele ainda estiver dentro da validade
+    def _adotar_retrato(self, entrada, url):
+
+        with trecho("backend", backend=self.backend.nome) as t:
+            dados = self.backend.ler(chave_estacao(url))
+            t.bytes = len(dados) if dados else 0
+
+        retrato = abrir_retrato(dados)
+
+        if retrato is None:
+            return False
+
+        serie, consultado_em = retrato
+        idade = time.time() - consultado_em
+
+        if idade >= self.validade or not len(serie):
+            return False
+
+        entrada.consultado_em = time.monotonic() - max(idade, 0.0)
+
+        # Mesma série já carregada: conferida pelos cabeçalhos, sem descomprimir
+        if entrada.df is not None and len(entrada.df) == len(serie) and \
+                entrada.ultimo_utc.value == serie.ultimo:
+            return True
+
+        # Blocos ilegíveis apesar do CRC: o retrato é descartado do backend e a estação é baixada da origem
+        try:
+            with trecho("descompressao", linhas=len(serie)):
+                vetores = serie.descomprimir()
+        except ERROS_RETRATO as e:
+            registrar_falha("cache", f"retrato corrompido: {e}", url=url)
+            self.backend.apagar(chave_estacao(url))
+            return False
+
+        entrada.df = df_de_vetores(*vetores)
+
+        entrada.cauda_bruta = None
+        entrada.posicao = None
+        entrada.comprimido = serie
+        entrada.versao += 1
+        _notificar(url, entrada.df)
+
+        return True
+
+    # Parte da série gravada no pacote inicial (vetores mapeados do disco); a seguir, só o trecho novo é baixado
+    def _adotar_pacote(self, entrada, url):
+
+        serie = self.pacote.serie(url)
+
+        if serie is None:
+            return False
+
+        tempos, niveis, qualidade = serie
+        entrada.df = df_de_vetores(tempos, niveis, qualidade)
+        entrada.posicao = self.pacote.posicao(url)
+        entrada.versao += 1
+        _notificar(url, entrada.df)
+
+        return True
+
+    # Texto CSV a interpretar: apenas o trecho novo quando a posição na origem é conhecida, senão o arquivo
+    # inteiro; None quando não há linhas novas
+    def _baixar(self, entrada, url):
+
+        if entrada.posicao is not None:
+            cauda = baixar_cauda_csv(url, entrada.posicao)
+
+            if cauda is not None:
+                texto, entrada.posicao = cauda
+                return texto
+
+        entrada.posicao = None
+        return baixar_csv_estacao(url)
+
+    def _atualizar(self, entrada, url, forcar=False):
+
+        if self.backend is not None and not forcar and self._adotar_retrato(entrada, url):
+            return
+
+        with trecho("download", url=url) as t:
+            texto = self._baixar(entrada, url)
+            t.bytes = len(texto) if texto else 0
+
+        if texto is None:
+            df_novo = None
+        else:
+            with trecho("leitura_csv") as t:
+                inicio = time.perf_counter()
+                df_novo = ler_csv_estacao(texto)
+                LEITURA_CSV.observar(rotulo_estacao(url), valor=time.perf_counter() - inicio)
+                t.bytes = len(texto)
+
+        entrada.consultado_em = time.monotonic()
+
+        versao = entrada.versao
+
+        # Somente as linhas posteriores à última medição conhecida são limpas e acrescentadas
+        if df_novo is None:
+            novas = None
+        else:
+            novas = df_novo if entrada.df is None else df_novo[df_novo['datetime_utc'] > entrada.ultimo_utc]
+
+        if novas is not None and not novas.empty:
+            cauda = entrada.cauda_bruta
+
+            if cauda is None and entrada.df is not None:
+                cauda = cauda_serie(entrada.df)
+
+            with trecho("limpeza", linhas=len(novas)):
+                novas, entrada.cauda_bruta, descartes = limpar_df(novas, cauda)
+
+            for motivo, quantidade in descartes.items():
+                if quantidade:
+                    LIMPEZA_DESCARTES.incrementar(rotulo_estacao(url), motivo, valor=quantidade)
+
+            if entrada.df is None:
+                entrada.df = novas
+            else:
+                entrada.df = pd.concat([entrada.df, novas[entrada.df.columns]], ignore_index=True)
+
+            entrada.versao += 1
+
+        if entrada.versao != versao:
+            _notificar(url, entrada.df)
+
+        if self.backend is not None:
+            dados = serializar_serie(*vetores_estacao(entrada.df), time.time(), entrada.comprimido)
+            self.backend.gravar(chave_estacao(url), dados)
+            entrada.comprimido = abrir_retrato(dados)[0]
+
+# Instância única do cache, compartilhada por todas as sessões do processo
+@st.cache_resource(show_spinner=False)
+def obter_cache():
+    from pacote_inicial import pacote_do_ambiente
+    return CacheEstacoes(loja=loja_do_ambiente(), backend=backend_do_ambiente(), pacote=pacote_do_ambiente())
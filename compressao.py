@@ -0,0 +1,354 @@
+'''
+Arquivo que contém o formato comprimido das séries das estações, usado nos
+retratos publicados nos backends do cache (ver backends_cache.py). A série é
+dividida em blocos de MEDICOES_BLOCO medições, cada um com um cabeçalho fixo
+(quantidade, primeiro e último instante, mínimo e máximo do nível) que
+permite localizar um período ou responder extremos sem descomprimir os blocos
+inteiramente contidos nele.
+
+Dentro de cada bloco:
+    - tempos: delta-of-delta (zero quando a cadência se mantém), na unidade
+      comum dos intervalos (em geral 1 s);
+    - níveis: deltas dos níveis quantizados quando todos têm no máximo
+      MAX_CASAS casas decimais (o caso das estações: milímetros); senão, XOR
+      dos bits de cada nível com o anterior. Nos dois casos a série
+      reconstruída é idêntica à original;
+    - medições sem nível: máscara de bits (somente se houver alguma).
+
+Os inteiros de cada bloco são gravados com a menor largura em bytes que
+atende a quase todos (0, 1, 2, 4 ou 8) e os poucos que não cabem vão como
+exceções (posição e valor), de modo que uma lacuna ou um salto isolado não
+alarga o bloco inteiro. A descompressão de um bloco é feita apenas com
+operações vetorizadas do NumPy (frombuffer e somas acumuladas).
+
+'''
+
+import struct
+
+import numpy as np
+
+MEDICOES_BLOCO = 1024
+MAX_CASAS = 6
+
+LARGURAS = (0, 1, 2, 4, 8)
+TIPOS_LARGURA = {1: '<u1', 2: '<u2', 4: '<u4', 8: '<u8'}
+
+# Bytes de cada exceção: posição no bloco (uint16) e valor (uint64)
+BYTES_EXCECAO = 10
+
+# Modos de codificação dos níveis
+MODO_QUANTIZADO = 0
+MODO_XOR = 1
+
+CABECALHO_SERIE = struct.Struct("<8sQI")
+MAGICO_SERIE = b"TSATCMP1"
+
+# Cabeçalho de cada bloco (a tabela de cabeçalhos é lida de uma vez com np.frombuffer)
+CABECALHO_BLOCO = np.dtype([
+    ("inicio", "<u8"),          # posição do conteúdo do bloco após a tabela
+    ("n", "<u4"),
+    ("t_primeiro", "<i8"), ("t_ultimo", "<i8"),
+    ("minimo", "<f8"), ("maximo", "<f8"),       # NaN se o bloco não tiver níveis
+    ("delta_inicial", "<i8"), ("unidade", "<i8"),
+    ("nivel_inicial", "<i8"),   # nível quantizado ou bits do primeiro nível (modo XOR)
+    ("modo", "u1"), ("casas", "u1"),           # casas decimais (quantizado) ou deslocamento (XOR)
+    ("largura_t", "u1"), ("largura_v", "u1"),
+    ("excecoes_t", "<u2"), ("excecoes_v", "<u2"),
+    ("com_ausentes", "u1"),
+])
+
+
+# Inteiros com sinal -> sem sinal, com valores pequenos em módulo virando valores pequenos
+def zigzag(valores):
+    valores = valores.astype('int64')
+    return ((valores << 1) ^ (valores >> 63)).view('uint64')
+
+
+def desfazer_zigzag(valores):
+    return ((valores >> np.uint64(1)) ^ (np.uint64(0) - (valores & np.uint64(1)))).view('int64')
+
+
+# Menor largura (bytes) pelo custo total, contando as exceções
+def escolher_largura(valores):
+
+    custos = [len(valores) * largura + int(np.count_nonzero(valores >> np.uint64(8 * largura) if largura < 8 else 0))
+              * BYTES_EXCECAO for largura in LARGURAS]
+    return LARGURAS[int(np.argmin(custos))]
+
+
+# Grava inteiros sem sinal na largura escolhida; retorna (bytes, largura, quantidade de exceções)
+def empacotar(valores):
+
+    largura = escolher_largura(valores)
+    excecoes = np.flatnonzero(valores >> np.uint64(8 * largura)) if largura < 8 else np.empty(0, dtype='int64')
+
+    densos = valores.copy()
+    densos[excecoes] = 0
+    partes = [densos.astype(TIPOS_LARGURA[largura]).tobytes()] if largura else []
+    partes += [excecoes.astype('<u2').tobytes(), valores[excecoes].astype('<u8').tobytes()]
+
+    return b"".join(partes), largura, len(excecoes)
+
+
+# Inverso de empacotar: `n` inteiros sem sinal a partir de `inicio`; retorna (valores, fim)
+def desempacotar(dados, inicio, n, largura, excecoes):
+
+    if largura:
+        valores = np.frombuffer(dados, dtype=TIPOS_LARGURA[largura], count=n, offset=inicio).astype('uint64')
+    else:
+        valores = np.zeros(n, dtype='uint64')
+
+    inicio += n * largura
+
+    if excecoes:
+        posicoes = np.frombuffer(dados, dtype='<u2', count=excecoes, offset=inicio)
+        valores[posicoes] = np.frombuffer(dados, dtype='<u8', count=excecoes, offset=inicio + 2 * excecoes)
+
+    return valores, inicio + BYTES_EXCECAO * excecoes
+
+
+# Menor quantidade de casas decimais que representa exatamente todos os níveis (None se não houver)
+def casas_decimais(niveis):
+
+    for casas in range(MAX_CASAS + 1):
+        escala = 10.0 ** casas
+        quantizados = np.round(niveis * escala)
+
+        if np.all(np.abs(quantizados) < 2 ** 52) and np.array_equal(quantizados / escala, niveis):
+            return casas
+
+    return None
+
+
+# Níveis ausentes trocados pelo último presente (pelo primeiro presente no início do bloco)
+def preencher_ausentes(niveis, ausentes):
+
+    if not ausentes.any():
+        return niveis
+
+    if ausentes.all():
+        return np.zeros(len(niveis))
+
+    posicoes = np.where(ausentes, 0, np.arange(len(niveis)))
+    posicoes = np.maximum.accumulate(posicoes)
+    posicoes[:np.argmax(~ausentes)] = np.argmax(~ausentes)
+
+    return niveis[posicoes]
+
+
+# Comprime um bloco; retorna (cabeçalho preenchido exceto 'inicio', conteúdo)
+def comprimir_bloco(tempos, niveis):
+
+    cabecalho = np.zeros((), dtype=CABECALHO_BLOCO)
+    n = len(tempos)
+    cabecalho["n"] = n
+    cabecalho["t_primeiro"], cabecalho["t_ultimo"] = tempos[0], tempos[-1]
+
+    ausentes = np.isnan(niveis)
+    presentes = niveis[~ausentes]
+    cabecalho["minimo"] = presentes.min() if len(presentes) else np.nan
+    cabecalho["maximo"] = presentes.max() if len(presentes) else np.nan
+
+    # Tempos: primeiro intervalo e delta-of-delta na unidade comum dos intervalos
+    deltas = np.diff(tempos)
+    unidade = int(np.gcd.reduce(deltas)) if len(deltas) else 0
+    unidade = unidade or 1
+    cabecalho["delta_inicial"] = deltas[0] if len(deltas) else 0
+    cabecalho["unidade"] = unidade
+    conteudo_t, cabecalho["largura_t"], cabecalho["excecoes_t"] = empacotar(zigzag(np.diff(deltas) // unidade))
+
+    # Níveis: deltas quantizados ou XOR dos bits
+    niveis = preencher_ausentes(niveis, ausentes)
+    casas = casas_decimais(niveis)
+
+    if casas is not None:
+        quantizados = np.round(niveis * 10.0 ** casas).astype('int64')
+        cabecalho["modo"], cabecalho["casas"] = MODO_QUANTIZADO, casas
+        cabecalho["nivel_inicial"] = quantizados[0]
+        diferencas = zigzag(np.diff(quantizados))
+    else:
+        bits = np.ascontiguousarray(niveis, dtype='float64').view('uint64')
+        diferencas = bits[1:] ^ bits[:-1]
+        combinados = int(np.bitwise_or.reduce(diferencas)) if len(diferencas) else 0
+        deslocamento = (combinados & -combinados).bit_length() - 1 if combinados else 0
+        cabecalho["modo"], cabecalho["casas"] = MODO_XOR, deslocamento
+        cabecalho["nivel_inicial"] = bits[:1].view('int64')[0]
+        diferencas = diferencas >> np.uint64(deslocamento)
+
+    conteudo_v, cabecalho["largura_v"], cabecalho["excecoes_v"] = empacotar(diferencas)
+
+    partes = [conteudo_t, conteudo_v]
+
+    if ausentes.any():
+        cabecalho["com_ausentes"] = 1
+        partes.append(np.packbits(ausentes, bitorder='little').tobytes())
+
+    return cabecalho, b"".join(partes)
+
+
+# Blocos completos de `anterior` reaproveitáveis no início da série, conferidos pelos instantes das bordas.
+# `anterior` deve ser uma versão da mesma série antes de acréscimos (a série só cresce).
+def blocos_reaproveitaveis(anterior, tempos, medicoes_bloco):
+
+    completos = anterior.cabecalhos[:min(len(tempos), len(anterior)) // medicoes_bloco]
+    k = int(np.argmin(np.r_[completos["n"] == medicoes_bloco, False]))
+
+    if k == 0:
+        return 0
+
+    inicios = np.arange(k) * medicoes_bloco
+    finais = inicios + medicoes_bloco - 1
+
+    iguais = (tempos[inicios] == completos["t_primeiro"][:k]) & (tempos[finais] == completos["t_ultimo"][:k])
+
+    return int(np.argmin(np.r_[iguais, False]))
+
+
+# Comprime a série inteira (tempos em ns UTC, em ordem crescente, e níveis). Com `anterior` (a versão
+# comprimida da mesma série antes dos acréscimos), os blocos completos são copiados sem recomprimir.
+def comprimir_serie(tempos, niveis, anterior=None, medicoes_bloco=MEDICOES_BLOCO):
+
+    tempos = np.ascontiguousarray(tempos, dtype='int64')
+    niveis = np.ascontiguousarray(niveis, dtype='float64')
+    n = len(tempos)
+
+    cabecalhos = np.zeros(-(-n // medicoes_bloco), dtype=CABECALHO_BLOCO)
+    conteudos = []
+    inicio = 0
+    reaproveitados = 0
+
+    if anterior is not None:
+        reaproveitados = blocos_reaproveitaveis(anterior, tempos, medicoes_bloco)
+
+        if reaproveitados:
+            cabecalhos[:reaproveitados] = anterior.cabecalhos[:reaproveitados]
+            inicio = int(anterior.cabecalhos["inicio"][reaproveitados - 1] +
+                         anterior.tamanho_bloco(reaproveitados - 1))
+            conteudos.append(anterior.dados[anterior.inicio_conteudo:anterior.inicio_conteudo + inicio])
+
+    for i in range(reaproveitados, len(cabecalhos)):
+        fatia = slice(i * medicoes_bloco, (i + 1) * medicoes_bloco)
+        cabecalho, conteudo = comprimir_bloco(tempos[fatia], niveis[fatia])
+        cabecalho["inicio"] = inicio
+        cabecalhos[i] = cabecalho
+        conteudos.append(conteudo)
+        inicio += len(conteudo)
+
+    return b"".join([CABECALHO_SERIE.pack(MAGICO_SERIE, n, len(cabecalhos)), cabecalhos.tobytes()] + conteudos)
+
+
+# Leitura de uma série comprimida: a tabela de cabeçalhos é lida sem cópia e os blocos sob demanda
+class SerieComprimida:
+
+    def __init__(self, dados):
+
+        magico, n, blocos = CABECALHO_SERIE.unpack_from(dados)
+
+        if magico != MAGICO_SERIE:
+            raise ValueError("série comprimida inválida")
+
+        self.dados = dados
+        self.n = n
+        self.cabecalhos = np.frombuffer(dados, dtype=CABECALHO_BLOCO, count=blocos, offset=CABECALHO_SERIE.size)
+        self.inicio_conteudo = CABECALHO_SERIE.size + self.cabecalhos.nbytes
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def ultimo(self):
+        return int(self.cabecalhos["t_ultimo"][-1]) if len(self.cabecalhos) else None
+
+    # Bytes do conteúdo do bloco `i`
+    def tamanho_bloco(self, i):
+        fim = self.cabecalhos["inicio"][i + 1] if i + 1 < len(self.cabecalhos) else \
+            len(self.dados) - self.inicio_conteudo
+        return int(fim - self.cabecalhos["inicio"][i])
+
+    # Tempos e níveis do bloco `i`
+    def bloco(self, i):
+
+        cabecalho = self.cabecalhos[i]
+        n = int(cabecalho["n"])
+        inicio = self.inicio_conteudo + int(cabecalho["inicio"])
+
+        dod, inicio = desempacotar(self.dados, inicio, max(n - 2, 0), int(cabecalho["largura_t"]),
+                                   int(cabecalho["excecoes_t"]))
+        deltas = np.empty(max(n - 1, 0), dtype='int64')
+        if n > 1:
+            deltas[0] = cabecalho["delta_inicial"]
+            deltas[1:] = cabecalho["delta_inicial"] + np.cumsum(desfazer_zigzag(dod)) * cabecalho["unidade"]
+        tempos = np.empty(n, dtype='int64')
+        tempos[0] = cabecalho["t_primeiro"]
+        np.cumsum(deltas, out=tempos[1:])
+        tempos[1:] += cabecalho["t_primeiro"]
+
+        diferencas, inicio = desempacotar(self.dados, inicio, n - 1, int(cabecalho["largura_v"]),
+                                          int(cabecalho["excecoes_v"]))
+
+        if cabecalho["modo"] == MODO_QUANTIZADO:
+            quantizados = np.empty(n, dtype='int64')
+            quantizados[0] = cabecalho["nivel_inicial"]
+            np.cumsum(desfazer_zigzag(diferencas), out=quantizados[1:])
+            quantizados[1:] += cabecalho["nivel_inicial"]
+            niveis = quantizados / 10.0 ** int(cabecalho["casas"])
+        else:
+            bits = np.empty(n, dtype='uint64')
+            bits[0] = np.int64(cabecalho["nivel_inicial"]).view('uint64')
+            bits[1:] = diferencas << np.uint64(cabecalho["casas"])
+            niveis = np.bitwise_xor.accumulate(bits).view('float64')
+
+        if cabecalho["com_ausentes"]:
+            ausentes = np.unpackbits(np.frombuffer(self.dados, dtype='uint8', count=-(-n // 8), offset=inicio),
+                                     count=n, bitorder='little').astype(bool)
+            niveis[ausentes] = np.nan
+
+        return tempos, niveis
+
+    # Blocos [b0, b1) com medições em [t0, t1) (ns, UTC)
+    def blocos(self, t0=None, t1=None):
+        b0 = 0 if t0 is None else int(np.searchsorted(self.cabecalhos["t_ultimo"], t0, side='left'))
+        b1 = len(self.cabecalhos) if t1 is None else int(np.searchsorted(self.cabecalhos["t_primeiro"], t1, side='left'))
+        return b0, max(b0, b1)
+
+    # Tempos e níveis em [t0, t1) (a série inteira por padrão), descomprimindo apenas os blocos do período
+    def descomprimir(self, t0=None, t1=None):
+
+        b0, b1 = self.blocos(t0, t1)
+
+        if b0 == b1:
+            return np.empty(0, dtype='int64'), np.empty(0)
+
+        partes = [self.bloco(i) for i in range(b0, b1)]
+        tempos = np.concatenate([t for t, _ in partes])
+        niveis = np.concatenate([v for _, v in partes])
+
+        i0 = 0 if t0 is None else int(np.searchsorted(tempos, t0, side='left'))
+        i1 = len(tempos) if t1 is None else int(np.searchsorted(tempos, t1, side='left'))
+
+        return tempos[i0:i1], niveis[i0:i1]
+
+    # Mínimo e máximo do nível em [t0, t1): blocos inteiros pelo cabeçalho, só as bordas são descomprimidas
+    def extremos(self, t0, t1):
+
+        b0, b1 = self.blocos(t0, t1)
+        cabecalhos = self.cabecalhos[b0:b1]
+        inteiros = (cabecalhos["t_primeiro"] >= t0) & (cabecalhos["t_ultimo"] < t1)
+        minimos = list(cabecalhos["minimo"][inteiros])
+        maximos = list(cabecalhos["maximo"][inteiros])
+
+        for i in np.flatnonzero(~inteiros) + b0:
+            tempos, niveis = self.bloco(i)
+            dentro = niveis[(tempos >= t0) & (tempos < t1)]
+            minimos.append(np.nanmin(dentro) if np.any(~np.isnan(dentro)) else np.nan)
+            maximos.append(np.nanmax(dentro) if np.any(~np.isnan(dentro)) else np.nan)
+
+        if np.all(np.isnan(minimos)):
+            return None, None
+
+        return float(np.nanmin(minimos)), float(np.nanmax(maximos))
+
+
+# Tempos e níveis de uma série comprimida inteira
+def descomprimir_serie(dados):
+    return SerieComprimida(dados).descomprimir()
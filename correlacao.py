@@ -0,0 +1,240 @@
+'''
+Arquivo que contém a análise de defasagem entre estações (tempo de
+propagação da onda de cheia). As séries são reamostradas na cadência
+nominal e comparadas por correlação cruzada via FFT, indicando quantas
+horas a estação de montante antecede a de jusante.
+
+Os resultados ficam em cache por par de estações e janela, e as séries
+reamostradas são estendidas apenas com as medições novas. As estações das
+cadeias acompanhadas (ver perfis.py) são atualizadas, e as defasagens da
+cadeia recalculadas, em segundo plano a cada chegada de medições (ver
+cache_estacoes.ao_atualizar), e não apenas quando a comparação é aberta.
+
+'''
+
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import streamlit as st
+
+from alinhamento import CADENCIA_NOMINAL, vetores_estacao
+from cache_estacoes import obter_cache, ao_atualizar
+from rastreamento import registrar_falha
+
+# Janela analisada (em horas) e defasagem máxima procurada (em horas)
+JANELA_PADRAO_H = 30 * 24
+ATRASO_MAX_H = 48
+
+# Mínimo de amostras válidas sobrepostas para aceitar uma correlação
+AMOSTRAS_MINIMAS = 36
+
+ResultadoDefasagem = namedtuple("ResultadoDefasagem", ["montante", "jusante", "atraso_h", "correlacao", "amostras"])
+
+
+# Correlação cruzada normalizada de duas séries alinhadas (NaN = ausente), para atrasos 0..atraso_max.
+# Atraso positivo significa que `b` repete o comportamento de `a` depois de k passos.
+def correlacao_cruzada(a, b, atraso_max):
+
+    n = len(a)
+    ma = ~np.isnan(a)
+    mb = ~np.isnan(b)
+
+    x = np.where(ma, a - np.nanmean(a), 0.0)
+    y = np.where(mb, b - np.nanmean(b), 0.0)
+
+    tamanho = 1 << int(np.ceil(np.log2(max(2 * n, 2))))
+
+    def xcorr(u, v):
+        # sum_t u[t] * v[t + k], para k >= 0
+        return np.fft.irfft(np.conj(np.fft.rfft(u, tamanho)) * np.fft.rfft(v, tamanho), tamanho)[:atraso_max + 1]
+
+    numerador = xcorr(x, y)
+    energia_x = xcorr(x * x, mb.astype(float))
+    energia_y = xcorr(ma.astype(float), y * y)
+    sobreposicao = np.rint(xcorr(ma.astype(float), mb.astype(float)))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = numerador / np.sqrt(energia_x * energia_y)
+
+    r[sobreposicao < AMOSTRAS_MINIMAS] = np.nan
+
+    return r, sobreposicao
+
+
+# Série de uma estação reamostrada em intervalos fixos alinhados à época (estendida incrementalmente)
+class SerieReamostrada:
+
+    def __init__(self):
+        self.versao = None
+        self.primeiro_intervalo = None
+        self.soma = np.empty(0)
+        self.contagem = np.empty(0)
+
+    # Incorpora as medições a partir do último intervalo (que pode estar incompleto)
+    def atualizar(self, tempos, niveis, versao):
+
+        if self.versao == versao or len(tempos) == 0:
+            return
+
+        intervalos = tempos // CADENCIA_NOMINAL
+
+        if self.primeiro_intervalo is None:
+            self.primeiro_intervalo = int(intervalos[0])
+            refazer_desde = 0
+        else:
+            # Recalcula a partir do último intervalo conhecido
+            refazer_desde = max(len(self.soma) - 1, 0)
+
+        corte = np.searchsorted(intervalos, self.primeiro_intervalo + refazer_desde, side='left')
+        indices = intervalos[corte:] - self.primeiro_intervalo - refazer_desde
+        v = niveis[corte:]
+        validos = ~np.isnan(v)
+
+        comprimento = int(indices[-1]) + 1 if len(indices) else 0
+        soma = np.bincount(indices[validos], weights=v[validos], minlength=comprimento)
+        contagem = np.bincount(indices[validos], minlength=comprimento)
+
+        self.soma = np.concatenate([self.soma[:refazer_desde], soma])
+        self.contagem = np.concatenate([self.contagem[:refazer_desde], contagem])
+        self.versao = versao
+
+    # Médias dos intervalos [inicio, fim) (índices absolutos), NaN quando não há dados
+    def janela(self, inicio, fim):
+
+        saida = np.full(fim - inicio, np.nan)
+
+        if self.primeiro_intervalo is None:
+            return saida
+
+        i0 = max(inicio - self.primeiro_intervalo, 0)
+        i1 = min(fim - self.primeiro_intervalo, len(self.soma))
+
+        if i1 > i0:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                saida[i0 + self.primeiro_intervalo - inicio:i1 + self.primeiro_intervalo - inicio] = \
+                    self.soma[i0:i1] / self.contagem[i0:i1]
+
+        return saida
+
+    @property
+    def ultimo_intervalo(self):
+        return None if self.primeiro_intervalo is None else self.primeiro_intervalo + len(self.soma) - 1
+
+
+class AnalisadorDefasagens:
+
+    def __init__(self, janela_h=JANELA_PADRAO_H, atraso_max_h=ATRASO_MAX_H):
+        self.janela_h = janela_h
+        self.atraso_max_h = atraso_max_h
+        self._series = {}
+        self._resultados = {}
+        self._acompanhadas = {}  # url -> códigos das estações acompanhadas
+        self._cadeias = set()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="defasagens")
+        self._trava = threading.Lock()
+
+    # Mantém a série reamostrada da estação em dia com a versão do cache
+    def atualizar_estacao(self, cod, tempos, niveis, versao):
+
+        with self._trava:
+            serie = self._series.setdefault(cod, SerieReamostrada())
+            serie.atualizar(tempos, niveis, versao)
+
+    # Defasagem entre montante e jusante; recalculada apenas quando uma das duas séries mudou
+    def defasagem(self, montante, jusante):
+
+        with self._trava:
+            serie_a = self._series.get(montante)
+            serie_b = self._series.get(jusante)
+
+            if serie_a is None or serie_b is None or serie_a.versao is None or serie_b.versao is None:
+                return None
+
+            chave = (montante, jusante, self.janela_h)
+            versoes = (serie_a.versao, serie_b.versao)
+            guardado = self._resultados.get(chave)
+
+            if guardado is not None and guardado[0] == versoes:
+                return guardado[1]
+
+            passos_hora = 3600 * 10**9 // CADENCIA_NOMINAL
+            fim = min(serie_a.ultimo_intervalo, serie_b.ultimo_intervalo) + 1
+            inicio = fim - self.janela_h * passos_hora
+
+            a = serie_a.janela(inicio, fim)
+            b = serie_b.janela(inicio, fim)
+
+            resultado = None
+
+            if np.count_nonzero(~np.isnan(a)) >= AMOSTRAS_MINIMAS and np.count_nonzero(~np.isnan(b)) >= AMOSTRAS_MINIMAS:
+
+                r, sobreposicao = correlacao_cruzada(a, b, self.atraso_max_h * passos_hora)
+
+                if not np.all(np.isnan(r)):
+                    k = int(np.nanargmax(r))
+                    resultado = ResultadoDefasagem(montante, jusante, k / passos_hora, float(r[k]), int(sobreposicao[k]))
+
+            self._resultados[chave] = (versoes, resultado)
+
+            return resultado
+
+    # Defasagens entre estações consecutivas de uma cadeia (montante -> jusante)
+    def defasagens_cadeia(self, cadeia):
+        return [self.defasagem(a, b) for a, b in zip(cadeia[:-1], cadeia[1:])]
+
+    # Passa a acompanhar as estações da cadeia (`urls`: código -> url) a cada chegada de medições
+    def acompanhar(self, cadeia, urls):
+
+        with self._trava:
+            if tuple(cadeia) in self._cadeias:
+                return
+
+            self._cadeias.add(tuple(cadeia))
+
+            for cod in cadeia:
+                if cod in urls:
+                    self._acompanhadas.setdefault(urls[cod], set()).add(cod)
+
+        # Estações já carregadas no cache não esperam a próxima medição
+        cache = obter_cache()
+        for url, df in cache.series().items():
+            if url in urls.values():
+                self.ao_atualizar(url, df, cache.versao(url))
+
+    # Chamado pelo cache com a estação travada: apenas agenda a atualização
+    def ao_atualizar(self, url, df, versao=None):
+
+        with self._trava:
+            codigos = set(self._acompanhadas.get(url, ()))
+
+        if codigos:
+            versao = obter_cache().versao(url) if versao is None else versao
+            self._executor.submit(self._atualizar_acompanhada, codigos, df, versao)
+
+    def _atualizar_acompanhada(self, codigos, df, versao):
+
+        try:
+            tempos, niveis = vetores_estacao(df)
+
+            for cod in codigos:
+                self.atualizar_estacao(cod, tempos, niveis, versao)
+
+            # Deixa prontas as defasagens das cadeias que contêm a estação
+            for cadeia in [c for c in self._cadeias if codigos & set(c)]:
+                self.defasagens_cadeia(cadeia)
+
+        except Exception as e:
+            registrar_falha("defasagens", repr(e), estacoes=sorted(codigos))
+
+
+# Instância única do analisador, compartilhada por todas as sessões do processo e inscrita nas
+# atualizações do cache
+@st.cache_resource(show_spinner=False)
+def obter_analisador():
+
+    analisador = AnalisadorDefasagens()
+    ao_atualizar(analisador.ao_atualizar)
+
+    return analisador
@@ -0,0 +1,227 @@
+'''
+Arquivo que contém os destinos dos alertas das estações (ver alertas.py):
+arquivo de log (uma linha JSON por alerta), webhook (POST JSON) e e-mail
+(SMTP). Os destinos são escolhidos por TIDESAT_ALERTAS, separados por
+vírgula:
+
+    log:/var/log/tidesat/alertas.log
+    webhook:https://exemplo.gov.br/tidesat
+    smtp://localhost:8025/defesacivil@exemplo.gov.br;porto@exemplo.com.br
+
+Também contém um servidor SMTP mínimo, usado no lugar de um servidor de
+e-mail real em testes e desenvolvimento; as mensagens recebidas são
+gravadas como arquivos .eml:
+
+    python destinos_alertas.py --porta 8025 --diretorio ./emails
+
+'''
+
+import argparse
+import json
+import os
+import smtplib
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+import requests
+
+from agregados import DIRETORIO_DADOS
+
+ARQUIVO_LOG_PADRAO = os.path.join(DIRETORIO_DADOS, "alertas.log")
+
+REMETENTE_PADRAO = os.environ.get("TIDESAT_ALERTAS_REMETENTE", "alertas@tidesatglobal.com")
+
+# Tempo máximo de espera dos destinos remotos (s)
+TIMEOUT_DESTINO = 10
+
+
+class DestinoAlertas:
+
+    nome = "base"
+
+    # Entrega os alertas de um ciclo (lista de dicionários, ver alertas.py)
+    def enviar(self, alertas):
+        raise NotImplementedError
+
+
+class DestinoLog(DestinoAlertas):
+
+    nome = "log"
+
+    def __init__(self, caminho=ARQUIVO_LOG_PADRAO):
+        self.caminho = caminho
+        self._trava = threading.Lock()
+
+    def enviar(self, alertas):
+
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+
+        with self._trava, open(self.caminho, "a", encoding="utf-8") as arquivo:
+            for alerta in alertas:
+                arquivo.write(json.dumps(alerta, ensure_ascii=False) + "\n")
+
+
+class DestinoWebhook(DestinoAlertas):
+
+    nome = "webhook"
+
+    def __init__(self, url, timeout=TIMEOUT_DESTINO):
+        self.url = url
+        self.timeout = timeout
+
+    def enviar(self, alertas):
+        resposta = requests.post(self.url, json={"alertas": alertas}, timeout=self.timeout)
+        resposta.raise_for_status()
+
+
+class DestinoEmail(DestinoAlertas):
+
+    nome = "email"
+
+    def __init__(self, host, porta, destinatarios, remetente=REMETENTE_PADRAO, timeout=TIMEOUT_DESTINO):
+        self.host = host
+        self.porta = porta
+        self.destinatarios = destinatarios
+        self.remetente = remetente
+        self.timeout = timeout
+
+    # Uma única mensagem por ciclo, com todos os alertas
+    def mensagem(self, alertas):
+
+        estacoes = sorted({alerta["estacao"] for alerta in alertas})
+
+        mensagem = EmailMessage()
+        mensagem["Subject"] = f"[TideSat] {len(alertas)} alerta(s): {', '.join(estacoes)}"
+        mensagem["From"] = self.remetente
+        mensagem["To"] = ", ".join(self.destinatarios)
+        mensagem.set_content("\n".join(alerta["mensagem"] for alerta in alertas) + "\n")
+
+        return mensagem
+
+    def enviar(self, alertas):
+        with smtplib.SMTP(self.host, self.porta, timeout=self.timeout) as smtp:
+            smtp.send_message(self.mensagem(alertas))
+
+
+# Destinos configurados por TIDESAT_ALERTAS (padrão: apenas o arquivo de log)
+def destinos_do_ambiente(valor=None):
+
+    valor = os.environ.get("TIDESAT_ALERTAS", "") if valor is None else valor
+    destinos = []
+
+    for item in filter(None, (parte.strip() for parte in valor.split(","))):
+
+        if item.startswith("log:"):
+            destinos.append(DestinoLog(item[len("log:"):]))
+
+        elif item.startswith("webhook:"):
+            destinos.append(DestinoWebhook(item[len("webhook:"):]))
+
+        elif item.startswith("smtp://"):
+            endereco, _, destinatarios = item[len("smtp://"):].partition("/")
+            host, _, porta = endereco.partition(":")
+            destinos.append(DestinoEmail(host or "localhost", int(porta or 25),
+                                         [d for d in destinatarios.split(";") if d]))
+
+        else:
+            raise ValueError(f"destino de alertas inválido: {item!r}")
+
+    return destinos or [DestinoLog()]
+
+
+################# SERVIDOR SMTP LOCAL #################
+
+# Atende um cliente SMTP: HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP e QUIT (sem autenticação nem TLS)
+class ManipuladorSMTP(socketserver.StreamRequestHandler):
+
+    def _responder(self, linha):
+        self.wfile.write(linha.encode() + b"\r\n")
+
+    def handle(self):
+
+        self._responder("220 tidesat SMTP local")
+        remetente, destinatarios = None, []
+
+        for linha in self.rfile:
+
+            comando = linha.decode(errors="replace").strip()
+            verbo = comando[:4].upper()
+
+            if verbo in ("HELO", "EHLO"):
+                self._responder("250 tidesat")
+            elif verbo == "MAIL":
+                remetente, destinatarios = comando.partition(":")[2].strip(), []
+                self._responder("250 OK")
+            elif verbo == "RCPT":
+                destinatarios.append(comando.partition(":")[2].strip())
+                self._responder("250 OK")
+            elif verbo == "DATA":
+                self._responder("354 Termine com <CRLF>.<CRLF>")
+                self.server.guardar(remetente, destinatarios, self._ler_dados())
+                self._responder("250 OK")
+            elif verbo in ("RSET", "NOOP"):
+                remetente, destinatarios = (None, []) if verbo == "RSET" else (remetente, destinatarios)
+                self._responder("250 OK")
+            elif verbo == "QUIT":
+                self._responder("221 Tchau")
+                return
+            else:
+                self._responder("502 Comando não implementado")
+
+    # Linhas da mensagem até "." sozinho (os pontos iniciais duplicados são desfeitos)
+    def _ler_dados(self):
+
+        linhas = []
+
+        for linha in self.rfile:
+            if linha.rstrip(b"\r\n") == b".":
+                break
+            linhas.append(linha[1:] if linha.startswith(b"..") else linha)
+
+        return b"".join(linhas)
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, endereco, diretorio=None):
+        super().__init__(endereco, ManipuladorSMTP)
+        self.diretorio = diretorio
+        self.mensagens = []
+        self.trava = threading.Lock()
+
+    def guardar(self, remetente, destinatarios, dados):
+
+        with self.trava:
+            self.mensagens.append({"remetente": remetente, "destinatarios": destinatarios, "dados": dados})
+            numero = len(self.mensagens)
+
+        if self.diretorio:
+            os.makedirs(self.diretorio, exist_ok=True)
+            with open(os.path.join(self.diretorio, f"{time.time_ns()}_{numero}.eml"), "wb") as arquivo:
+                arquivo.write(dados)
+
+
+# Inicia o servidor SMTP em segundo plano e o retorna (porta 0 = porta livre qualquer)
+def iniciar_servidor_smtp(host="127.0.0.1", porta=0, diretorio=None):
+
+    servidor = ServidorSMTP((host, porta), diretorio)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    return servidor
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Servidor SMTP local para testes dos alertas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8025)
+    parser.add_argument("--diretorio", default="emails", help="onde gravar as mensagens recebidas (.eml)")
+    args = parser.parse_args()
+
+    print(f"[alertas] servidor SMTP em {args.host}:{args.porta}, mensagens em {args.diretorio}", flush=True)
+    ServidorSMTP((args.host, args.porta), args.diretorio).serve_forever()
@@ -0,0 +1,187 @@
+'''
+Arquivo que contém as estatísticas do período selecionado, calculadas a
+partir dos agregados horários e diários. Somas, contagens, horas acima das
+cotas e início de lacunas ficam em somas de prefixo mantidas
+incrementalmente, de modo que qualquer intervalo de datas é respondido sem
+percorrer ou ordenar as medições brutas. Com o índice de consultas, as
+lacunas e a disponibilidade vêm do índice de lacunas (ver lacunas.py).
+
+'''
+
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Percentis exibidos na aba de estatísticas
+PERCENTIS = (5, 25, 50, 75, 95)
+
+
+# Converte uma cota da configuração em número (ou None quando indisponível)
+def cota_numerica(cota):
+    return None if cota in ("", " ", None) else float(cota)
+
+
+# Somas de prefixo dos agregados horários de uma estação (estendidas a cada atualização)
+class PrefixosHorarios:
+
+    CAMPOS = ("soma", "contagem", "horas_cheias", "acima_alerta", "acima_inundacao", "inicio_lacuna")
+
+    def __init__(self, cota_alerta=None, cota_inundacao=None):
+        self.cota_alerta = cota_alerta
+        self.cota_inundacao = cota_inundacao
+        self.versao = None
+        self.primeiro = None
+        for campo in self.CAMPOS:
+            setattr(self, campo, np.zeros(1))
+
+    def __len__(self):
+        return len(self.contagem) - 1
+
+    # Recalcula os prefixos a partir da última hora já conhecida (que pode ter mudado)
+    def atualizar(self, hora, versao):
+
+        if versao == self.versao:
+            return
+
+        if hora.primeiro != self.primeiro:
+            self.__init__(self.cota_alerta, self.cota_inundacao)
+            self.primeiro = hora.primeiro
+
+        inicio = max(len(self) - 1, 0)
+
+        media = hora.media[inicio:]
+        cheia = hora.contagem[inicio:] > 0
+        anterior_cheia = np.r_[hora.contagem[inicio - 1] > 0 if inicio > 0 else True, cheia[:-1]]
+
+        valores = {
+            "soma": hora.soma[inicio:],
+            "contagem": hora.contagem[inicio:],
+            "horas_cheias": cheia,
+            "acima_alerta": self._acima(media, self.cota_alerta),
+            "acima_inundacao": self._acima(media, self.cota_inundacao),
+            "inicio_lacuna": (~cheia & anterior_cheia),
+        }
+
+        for campo, valor in valores.items():
+            prefixo = getattr(self, campo)[:inicio + 1]
+            setattr(self, campo, np.concatenate([prefixo, prefixo[-1] + np.cumsum(valor, dtype='float64')]))
+
+        self.versao = versao
+
+    @staticmethod
+    def _acima(media, cota):
+        if cota is None:
+            return np.zeros(len(media))
+        return np.nan_to_num(media) >= cota
+
+    # Total de um campo nas horas [i0, i1)
+    def total(self, campo, i0, i1):
+        prefixo = getattr(self, campo)
+        return float(prefixo[i1] - prefixo[i0])
+
+
+# Cache dos prefixos por estação e cotas
+class ArquivoPrefixos:
+
+    def __init__(self):
+        self._prefixos = {}
+        self._trava = threading.Lock()
+
+    def obter(self, url, agregados, cota_alerta, cota_inundacao):
+
+        chave = (url, cota_alerta, cota_inundacao)
+
+        with self._trava:
+            prefixos = self._prefixos.setdefault(chave, PrefixosHorarios(cota_alerta, cota_inundacao))
+            prefixos.atualizar(agregados.hora, agregados.versao)
+
+        return prefixos
+
+
+# Instância única dos prefixos, compartilhada por todas as sessões do processo
+@st.cache_resource(show_spinner=False)
+def obter_arquivo_prefixos():
+    return ArquivoPrefixos()
+
+
+# Lacunas (do índice de lacunas) em [inicio, fim): quantidade, a maior (em horas, recortada no intervalo)
+# e a disponibilidade (fração do intervalo decorrido com dados), incluindo uma lacuna em andamento
+def resumo_lacunas(lacunas, inicio, fim, agora=None):
+
+    agora = pd.Timestamp.utcnow().value if agora is None else agora
+    inicios, fins = lacunas.intervalos(inicio, fim)
+    duracoes = np.minimum(fins, fim) - np.maximum(inicios, inicio)
+
+    if lacunas.lacuna_atual(agora) and lacunas.ultimo < fim:
+        duracoes = np.append(duracoes, min(agora, fim) - max(lacunas.ultimo, inicio))
+
+    return {
+        "lacunas": len(duracoes),
+        "maior_lacuna_h": float(duracoes.max()) / 3.6e12 if len(duracoes) else 0.0,
+        "disponibilidade": float(lacunas.cobertura([inicio, fim], agora)[0]),
+    }
+
+
+# Resumo estatístico do intervalo [inicio, fim) (ns, UTC). Com o índice de consultas,
+# mínimo, máximo e média são exatos (medições brutas) em vez de derivados dos agregados horários,
+# e as lacunas e a disponibilidade vêm do índice de lacunas.
+def resumo_periodo(agregados, prefixos, inicio, fim, indice=None):
+
+    hora = agregados.hora
+    i0, i1 = hora.fatia(inicio, fim)
+
+    if i1 <= i0 or prefixos.total("contagem", i0, i1) == 0:
+        return None
+
+    contagem = prefixos.total("contagem", i0, i1)
+
+    # Extremos e instantes a partir dos mínimos/máximos horários
+    j_min = i0 + int(np.nanargmin(hora.minimo[i0:i1]))
+    j_max = i0 + int(np.nanargmax(hora.maximo[i0:i1]))
+
+    medias = hora.media[i0:i1]
+    percentis = np.nanpercentile(medias, PERCENTIS)
+
+    # Amplitude diária
+    d0, d1 = agregados.dia.fatia(inicio, fim)
+    amplitude = agregados.dia.maximo[d0:d1] - agregados.dia.minimo[d0:d1]
+
+    # Lacunas: horas sem medições (conta também uma lacuna em andamento no início do intervalo)
+    lacunas = prefixos.total("inicio_lacuna", i0, i1)
+    if hora.contagem[i0] == 0 and prefixos.total("inicio_lacuna", i0, i0 + 1) == 0:
+        lacunas += 1
+
+    resumo = {
+        "minimo": float(hora.minimo[j_min]),
+        "t_minimo": pd.Timestamp(int(hora.t_minimo[j_min]), tz='UTC'),
+        "maximo": float(hora.maximo[j_max]),
+        "t_maximo": pd.Timestamp(int(hora.t_maximo[j_max]), tz='UTC'),
+        "media": prefixos.total("soma", i0, i1) / contagem,
+        "amostras": int(contagem),
+        "horas_com_dados": int(prefixos.total("horas_cheias", i0, i1)),
+        "horas_periodo": i1 - i0,
+        "percentis": dict(zip(PERCENTIS, percentis)),
+        "amplitude_media": float(np.nanmean(amplitude)) if len(amplitude) else np.nan,
+        "amplitude_maxima": float(np.nanmax(amplitude)) if len(amplitude) else np.nan,
+        "horas_acima_alerta": None if prefixos.cota_alerta is None else int(prefixos.total("acima_alerta", i0, i1)),
+        "horas_acima_inundacao": None if prefixos.cota_inundacao is None else int(prefixos.total("acima_inundacao", i0, i1)),
+        "lacunas": int(lacunas),
+    }
+
+    if indice is not None and len(indice):
+        resumo.update(resumo_lacunas(indice.lacunas, inicio, fim))
+        janela = indice.consultar(inicio, fim)
+
+        if janela.contagem:
+            resumo.update({
+                "minimo": janela.minimo,
+                "t_minimo": pd.Timestamp(janela.t_minimo, tz='UTC'),
+                "maximo": janela.maximo,
+                "t_maximo": pd.Timestamp(janela.t_maximo, tz='UTC'),
+                "media": janela.media,
+                "amostras": janela.contagem,
+            })
+
+    return resumo
@@ -0,0 +1,196 @@
+'''
+Arquivo que contém a exportação do histórico das estações em CSV ou Parquet.
+As medições saem dos vetores do cache compartilhado (ou do armazenamento em
+memória compartilhada, quando configurado) em blocos de tamanho fixo, e cada
+bloco é convertido e entregue por um gerador: exportar anos de dados de
+várias estações nunca monta um DataFrame completo em memória.
+
+A exportação é usada pelo botão de download da dashboard, pela rota
+/stations/{id}/export da API (ver api_dados.py) e pela linha de comando:
+
+    python exportacao.py --estacoes EST1 EST6 --de 2024-04-01 --ate 2024-06-30 --fuso UTC --formato parquet --saida taquari.parquet
+
+'''
+
+import argparse
+import io
+import sys
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cache_estacoes import obter_cache
+from alinhamento import vetores_estacao
+
+# Medições por bloco (cada bloco é convertido e entregue separadamente)
+LINHAS_POR_BLOCO = 100_000
+
+FORMATOS = {
+    "csv": {"extensao": "csv", "tipo": "text/csv"},
+    "parquet": {"extensao": "parquet", "tipo": "application/vnd.apache.parquet"},
+}
+
+COLUNAS = ("estacao", "datetime", "water_level(m)")
+
+
+# Período [início, fim) em ns (UTC) a partir das datas escolhidas no fuso (data final inclusiva, como na dashboard)
+def periodo_ns(dados_inicio, dados_fim, fuso):
+
+    inicio = pd.Timestamp(dados_inicio).tz_localize(fuso) if dados_inicio is not None else None
+    fim = pd.Timestamp(dados_fim).tz_localize(fuso) + timedelta(days=1) if dados_fim is not None else None
+
+    return (None if inicio is None else inicio.value), (None if fim is None else fim.value)
+
+
+# Blocos (tempos, níveis) da estação no período, como fatias dos vetores do cache (sem cópia)
+def blocos_estacao(url, inicio=None, fim=None, linhas_por_bloco=LINHAS_POR_BLOCO):
+
+    tempos, niveis = vetores_estacao(obter_cache().obter(url))
+
+    i0 = 0 if inicio is None else int(np.searchsorted(tempos, inicio, side='left'))
+    i1 = len(tempos) if fim is None else int(np.searchsorted(tempos, fim, side='left'))
+
+    for i in range(i0, i1, linhas_por_bloco):
+        j = min(i + linhas_por_bloco, i1)
+        yield tempos[i:j], niveis[i:j]
+
+
+# Blocos de todas as estações pedidas ({código: url}), com o código de cada uma
+def blocos_estacoes(estacoes, inicio=None, fim=None, linhas_por_bloco=LINHAS_POR_BLOCO):
+    for codigo, url in estacoes.items():
+        for tempos, niveis in blocos_estacao(url, inicio, fim, linhas_por_bloco):
+            yield codigo, tempos, niveis
+
+
+# Instantes (ns, UTC) em ISO 8601 no fuso pedido (ex.: 2024-05-03T12:00:00-03:00), sem strftime por linha
+def instantes_iso(tempos, fuso):
+
+    locais = pd.DatetimeIndex(tempos.view('M8[ns]'), tz='UTC').tz_convert(fuso).tz_localize(None).asi8
+    base = np.datetime_as_string(locais.view('M8[ns]'), unit='s')
+
+    # Poucos deslocamentos distintos (horário de verão): o sufixo de cada um é formatado uma única vez
+    minutos, posicoes = np.unique((locais - tempos) // 60_000_000_000, return_inverse=True)
+    sufixos = np.array([f"{'+' if m >= 0 else '-'}{abs(m) // 60:02d}:{abs(m) % 60:02d}" for m in minutos], dtype='<U6')
+
+    return np.char.add(base, sufixos[posicoes])
+
+
+################# CSV #################
+def exportar_csv(estacoes, inicio=None, fim=None, fuso="UTC", linhas_por_bloco=LINHAS_POR_BLOCO):
+
+    yield (",".join(COLUNAS) + "\n").encode()
+
+    for codigo, tempos, niveis in blocos_estacoes(estacoes, inicio, fim, linhas_por_bloco):
+
+        bloco = pd.DataFrame({
+            "estacao": codigo,
+            "datetime": instantes_iso(tempos, fuso),
+            "water_level(m)": niveis,
+        }, copy=False)
+
+        yield bloco.to_csv(header=False, index=False, float_format="%.3f").encode()
+
+
+################# PARQUET #################
+# Destino do ParquetWriter que apenas acumula os bytes escritos até serem retirados pelo gerador
+class ColetorBytes(io.RawIOBase):
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self.partes.append(dados)
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def retirar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+
+def esquema_parquet(fuso):
+    return pa.schema([
+        ("estacao", pa.dictionary(pa.int32(), pa.string())),
+        ("datetime", pa.timestamp("ns", tz=fuso)),
+        ("water_level(m)", pa.float64()),
+    ])
+
+
+# Um grupo de linhas por bloco; os bytes de cada grupo são entregues assim que escritos
+def exportar_parquet(estacoes, inicio=None, fim=None, fuso="UTC", linhas_por_bloco=LINHAS_POR_BLOCO):
+
+    esquema = esquema_parquet(fuso)
+    coletor = ColetorBytes()
+
+    with pq.ParquetWriter(coletor, esquema, compression="zstd") as escritor:
+
+        for codigo, tempos, niveis in blocos_estacoes(estacoes, inicio, fim, linhas_por_bloco):
+
+            tabela = pa.table([
+                pa.DictionaryArray.from_arrays(pa.array(np.zeros(len(tempos), dtype='int32')), pa.array([codigo])),
+                pa.array(tempos, type=pa.timestamp("ns")).cast(pa.timestamp("ns", tz=fuso)),
+                pa.array(niveis, type=pa.float64()),
+            ], schema=esquema)
+
+            escritor.write_table(tabela)
+            yield coletor.retirar()
+
+    # Rodapé com os metadados, escrito ao fechar
+    yield coletor.retirar()
+
+
+def exportar(estacoes, inicio=None, fim=None, fuso="UTC", formato="csv", linhas_por_bloco=LINHAS_POR_BLOCO):
+
+    if formato == "parquet":
+        return exportar_parquet(estacoes, inicio, fim, fuso, linhas_por_bloco)
+
+    return exportar_csv(estacoes, inicio, fim, fuso, linhas_por_bloco)
+
+
+# Nome sugerido do arquivo (ex.: tidesat_EST1_2024-04-01_2024-06-30.csv)
+def nome_arquivo(codigos, dados_inicio, dados_fim, formato):
+    return f"tidesat_{'-'.join(codigos)}_{dados_inicio}_{dados_fim}.{FORMATOS[formato]['extensao']}"
+
+
+if __name__ == "__main__":
+
+    from main_config import TIMEZONE_PADRAO
+    from api_dados import CATALOGO
+
+    parser = argparse.ArgumentParser(description="Exporta o histórico das estações em CSV ou Parquet.")
+    parser.add_argument("--estacoes", nargs="+", required=True, help="códigos das estações (ex.: EST1 EST6)")
+    parser.add_argument("--de", default=None, help="data inicial (padrão: primeira medição)")
+    parser.add_argument("--ate", default=None, help="data final, inclusiva (padrão: última medição)")
+    parser.add_argument("--fuso", default=TIMEZONE_PADRAO)
+    parser.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+    parser.add_argument("--saida", default=None, help="arquivo de saída (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    desconhecidas = [codigo for codigo in args.estacoes if codigo.upper() not in CATALOGO]
+
+    if desconhecidas:
+        parser.error(f"estações desconhecidas: {', '.join(desconhecidas)}")
+
+    estacoes = {CATALOGO[c.upper()]["codigo"]: CATALOGO[c.upper()]["info"]["url"] for c in args.estacoes}
+    inicio, fim = periodo_ns(args.de, args.ate, args.fuso)
+
+    destino = open(args.saida, "wb") if args.saida else sys.stdout.buffer
+
+    try:
+        for parte in exportar(estacoes, inicio, fim, args.fuso, args.formato):
+            destino.write(parte)
+    finally:
+        if args.saida:
+            destino.close()
@@ -0,0 +1,382 @@
+'''
+Arquivo que contém as imagens pré-renderizadas de cada estação: sparklines
+das últimas 24 h e 7 dias (SVG e PNG) e um cartão com o nível atual (SVG e
+PNG, no tamanho usado pelas redes sociais). As imagens são refeitas quando a
+estação recebe medições novas (ver cache_estacoes.ao_atualizar) e, como o
+cartão depende do relógio (nível e velocidade avaliados agora, estação
+inativa), quando são pedidas depois de PASSO_MARCA; a renderização roda em
+um grupo de threads fora do caminho das requisições e é gravada em disco.
+A API (ver api_dados.py) as serve em /stations/{id}/images/{arquivo}, de
+modo que incorporá-las não custa nenhuma plotagem por visualização.
+
+Uso (renderiza todas as estações uma vez): python imagens_estacoes.py [--estacoes EST1 EST6]
+
+'''
+
+import argparse
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from PIL import Image, ImageDraw, ImageFont
+
+from main_config import TIMEZONE_PADRAO
+from cache_estacoes import obter_cache, ao_atualizar, ErroDadosEstacao
+from alinhamento import vetores_estacao, grade_comum, reamostrar, CADENCIA_NOMINAL
+from agregados import DIRETORIO_DADOS
+from api_dados import CATALOGO, resumo_recente
+from rastreamento import registrar_falha
+
+DIRETORIO_IMAGENS = os.environ.get("TIDESAT_IMAGENS", os.path.join(DIRETORIO_DADOS, "imagens"))
+
+JANELAS = {"24h": pd.Timedelta(hours=24), "7d": pd.Timedelta(days=7)}
+
+# Tamanhos (px): sparkline e cartão (proporção das prévias de redes sociais)
+TAMANHO_SPARKLINE = (240, 48)
+TAMANHO_CARTAO = (1200, 630)
+
+# Os PNGs são desenhados em escala maior e reduzidos (bordas suavizadas)
+SUPERAMOSTRAGEM = 3
+
+TRABALHADORES = 2
+
+# Intervalo (ns) em que o relógio entra na marca das imagens (a cadência nominal das estações)
+PASSO_MARCA = CADENCIA_NOMINAL
+
+# Fontes do cartão (a fonte embutida do Pillow não tem acentos); TIDESAT_FONTE substitui a regular
+FONTE_REGULAR = os.environ.get("TIDESAT_FONTE", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+FONTE_NEGRITO = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+COR_LINHA = "#1f77b4"
+COR_TEXTO = "#262730"
+
+# Cores e rótulos da situação, como nos indicadores da dashboard
+CORES_SITUACAO = {"normal": "green", "alerta": "orange", "inundacao": "red", "indisponivel": "gray"}
+ROTULOS_SITUACAO = {"normal": "Normal", "alerta": "Em alerta", "inundacao": "Inundação", "indisponivel": "Indisponível"}
+
+ARQUIVOS = tuple(f"sparkline_{janela}.{extensao}" for janela in JANELAS for extensao in ("svg", "png")) + \
+    ("cartao.svg", "cartao.png")
+
+TIPOS = {"svg": "image/svg+xml", "png": "image/png"}
+
+# Estações por URL (o cache notifica pela URL)
+POR_URL = {entrada["info"]["url"]: entrada for entrada in CATALOGO.values()}
+
+
+# Marca das imagens: muda com medições novas e a cada PASSO_MARCA do relógio
+def marca_serie(tempos, agora=None):
+    agora = pd.Timestamp.utcnow().value if agora is None else agora
+    return f"{len(tempos)}-{int(tempos[-1]) if len(tempos) else 0}-{agora // PASSO_MARCA}"
+
+
+# Situação exibida no cartão: estação inativa aparece como indisponível
+def situacao_cartao(resumo):
+    return "indisponivel" if resumo["status"] == "inativa" else resumo["situacao"]
+
+
+################# DESENHO #################
+# Médias da janela que termina na última medição, em uma grade de no máximo `pontos` intervalos
+def serie_janela(tempos, niveis, janela, pontos):
+
+    fim = int(tempos[-1]) + 1
+    grade, passo = grade_comum(fim - janela.value, fim, pontos)
+    media = reamostrar(tempos, niveis, grade, passo)
+
+    return media
+
+
+# Trechos contínuos da série em coordenadas da área (as lacunas interrompem a linha)
+def trechos_linha(valores, area):
+
+    x0, y0, x1, y1 = area
+    validos = ~np.isnan(valores)
+
+    if not validos.any():
+        return []
+
+    minimo, maximo = np.nanmin(valores), np.nanmax(valores)
+    amplitude = max(maximo - minimo, 0.05)
+
+    x = x0 + np.arange(len(valores)) * (x1 - x0) / max(len(valores) - 1, 1)
+    y = (y0 + y1) / 2 - (valores - (minimo + maximo) / 2) / amplitude * (y1 - y0)
+
+    grupos = np.split(np.arange(len(valores)), np.flatnonzero(np.diff(validos)) + 1)
+
+    return [list(zip(x[grupo].tolist(), y[grupo].tolist())) for grupo in grupos if validos[grupo[0]]]
+
+
+def svg_trechos(trechos, cor, espessura):
+
+    linhas = "".join(f'<polyline points="{" ".join(f"{x:.1f},{y:.1f}" for x, y in trecho)}"/>'
+                     for trecho in trechos if len(trecho) > 1)
+    ponto = ""
+
+    if trechos:
+        x, y = trechos[-1][-1]
+        ponto = f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{espessura * 1.5:.1f}" fill="{cor}"/>'
+
+    return (f'<g fill="none" stroke="{cor}" stroke-width="{espessura}" stroke-linejoin="round" '
+            f'stroke-linecap="round">{linhas}</g>{ponto}')
+
+
+def desenhar_trechos(desenho, trechos, cor, espessura):
+
+    for trecho in trechos:
+        if len(trecho) > 1:
+            desenho.line(trecho, fill=cor, width=espessura, joint="curve")
+
+    if trechos:
+        x, y = trechos[-1][-1]
+        raio = espessura * 1.5
+        desenho.ellipse((x - raio, y - raio, x + raio, y + raio), fill=cor)
+
+
+def fonte(tamanho, negrito=False):
+    try:
+        return ImageFont.truetype(FONTE_NEGRITO if negrito else FONTE_REGULAR, tamanho)
+    except OSError:
+        return ImageFont.load_default(size=tamanho)
+
+
+def png_bytes(imagem, tamanho):
+
+    destino = io.BytesIO()
+    imagem.resize(tamanho, Image.LANCZOS).save(destino, format="PNG", optimize=True)
+
+    return destino.getvalue()
+
+
+def svg_sparkline(valores, tamanho=TAMANHO_SPARKLINE, cor=COR_LINHA):
+
+    largura, altura = tamanho
+    trechos = trechos_linha(valores, (3, 3, largura - 3, altura - 3))
+
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura}" height="{altura}" '
+            f'viewBox="0 0 {largura} {altura}">{svg_trechos(trechos, cor, 1.5)}</svg>').encode()
+
+
+def png_sparkline(valores, tamanho=TAMANHO_SPARKLINE, cor=COR_LINHA):
+
+    largura, altura = (medida * SUPERAMOSTRAGEM for medida in tamanho)
+    imagem = Image.new("RGBA", (largura, altura), (255, 255, 255, 0))
+    margem = 3 * SUPERAMOSTRAGEM
+
+    desenhar_trechos(ImageDraw.Draw(imagem), trechos_linha(valores, (margem, margem, largura - margem, altura - margem)),
+                     cor, int(1.5 * SUPERAMOSTRAGEM))
+
+    return png_bytes(imagem, tamanho)
+
+
+# Textos do cartão a partir do resumo recente (mesmos números da API e dos indicadores)
+def textos_cartao(resumo):
+
+    nivel = "Indisp." if resumo["nivel_m"] is None else f"{resumo['nivel_m']:.2f} m".replace('.', ',')
+    velocidade = "Indisp." if resumo["velocidade_m_h"] is None else \
+        f"{resumo['velocidade_m_h']:+.2f} m/h".replace('.', ',')
+    atualizacao = "" if resumo["ultimo"] is None else \
+        pd.Timestamp(resumo["ultimo"]["t"]).strftime('%d/%m/%Y - %H:%M')
+
+    return {
+        "titulo": resumo["descricao"] or resumo["id"],
+        "nivel": nivel,
+        "situacao": ROTULOS_SITUACAO[situacao_cartao(resumo)],
+        "detalhes": f"Velocidade: {velocidade}   ·   Atualização: {atualizacao}",
+    }
+
+
+def svg_cartao(resumo, valores, tamanho=TAMANHO_CARTAO):
+
+    largura, altura = tamanho
+    textos = {chave: escape(valor) for chave, valor in textos_cartao(resumo).items()}
+    cor = CORES_SITUACAO[situacao_cartao(resumo)]
+    trechos = trechos_linha(valores, (60, 400, largura - 60, altura - 70))
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura}" height="{altura}" viewBox="0 0 {largura} {altura}" '
+        f'font-family="sans-serif">'
+        f'<rect width="{largura}" height="{altura}" fill="white"/>'
+        f'<rect width="{largura}" height="16" fill="{cor}"/>'
+        f'<text x="60" y="100" font-size="44" fill="{COR_TEXTO}">{textos["titulo"]}</text>'
+        f'<text x="60" y="250" font-size="130" font-weight="bold" fill="{COR_TEXTO}">{textos["nivel"]}</text>'
+        f'<text x="{largura - 60}" y="250" font-size="56" font-weight="bold" fill="{cor}" text-anchor="end">'
+        f'{textos["situacao"]}</text>'
+        f'<text x="60" y="330" font-size="32" fill="{COR_TEXTO}">{textos["detalhes"]}</text>'
+        f'{svg_trechos(trechos, COR_LINHA, 4)}'
+        f'<text x="{largura - 60}" y="{altura - 25}" font-size="26" fill="gray" text-anchor="end">TideSat · 24 h</text>'
+        f'</svg>').encode()
+
+
+def png_cartao(resumo, valores, tamanho=TAMANHO_CARTAO):
+
+    escala = SUPERAMOSTRAGEM
+    largura, altura = (medida * escala for medida in tamanho)
+    textos = textos_cartao(resumo)
+    cor = CORES_SITUACAO[situacao_cartao(resumo)]
+
+    imagem = Image.new("RGB", (largura, altura), "white")
+    desenho = ImageDraw.Draw(imagem)
+
+    desenho.rectangle((0, 0, largura, 16 * escala), fill=cor)
+    desenho.text((60 * escala, 100 * escala), textos["titulo"], font=fonte(44 * escala), fill=COR_TEXTO, anchor="ls")
+    desenho.text((60 * escala, 250 * escala), textos["nivel"], font=fonte(130 * escala, negrito=True), fill=COR_TEXTO, anchor="ls")
+    desenho.text((largura - 60 * escala, 250 * escala), textos["situacao"], font=fonte(56 * escala, negrito=True), fill=cor, anchor="rs")
+    desenho.text((60 * escala, 330 * escala), textos["detalhes"], font=fonte(32 * escala), fill=COR_TEXTO, anchor="ls")
+    desenhar_trechos(desenho, trechos_linha(valores, (60 * escala, 400 * escala, largura - 60 * escala,
+                                                      altura - 70 * escala)), COR_LINHA, 4 * escala)
+    desenho.text((largura - 60 * escala, altura - 25 * escala), "TideSat · 24 h", font=fonte(26 * escala), fill="gray",
+                 anchor="rs")
+
+    return png_bytes(imagem, tamanho)
+
+
+# Conteúdo de todos os arquivos da estação (nome -> bytes)
+def renderizar_estacao(entrada, df):
+
+    tempos, niveis = vetores_estacao(df)
+    resumo = resumo_recente(entrada, df, TIMEZONE_PADRAO)
+
+    sparklines = {janela: serie_janela(tempos, niveis, duracao, TAMANHO_SPARKLINE[0])
+                  for janela, duracao in JANELAS.items()}
+    arquivos = {}
+
+    for janela, valores in sparklines.items():
+        arquivos[f"sparkline_{janela}.svg"] = svg_sparkline(valores)
+        arquivos[f"sparkline_{janela}.png"] = png_sparkline(valores)
+
+    cartao = serie_janela(tempos, niveis, JANELAS["24h"], TAMANHO_CARTAO[0] // 4)
+    arquivos["cartao.svg"] = svg_cartao(resumo, cartao)
+    arquivos["cartao.png"] = png_cartao(resumo, cartao)
+
+    return arquivos
+
+
+################# RENDERIZAÇÃO EM SEGUNDO PLANO #################
+def gravar_atomico(caminho, dados):
+
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(dados)
+
+    os.replace(temporario, caminho)
+
+
+class RenderizadorImagens:
+
+    def __init__(self, diretorio=DIRETORIO_IMAGENS, trabalhadores=TRABALHADORES):
+        self.diretorio = diretorio
+        self.executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="imagens")
+        self.pendentes = {}  # código -> série mais recente ainda não renderizada
+        self.futuros = {}  # código -> tarefa em andamento
+        self.trava = threading.Lock()
+
+    def caminho(self, codigo, nome=""):
+        return os.path.join(self.diretorio, codigo, nome)
+
+    # Marca das medições das imagens gravadas (None se ainda não houver imagens)
+    def marca(self, codigo):
+        try:
+            with open(self.caminho(codigo, "marca.txt")) as arquivo:
+                return arquivo.read().strip()
+        except OSError:
+            return None
+
+    # Agenda a renderização (chamado pelo cache a cada chegada de medições novas; retorna a tarefa)
+    def agendar(self, url, df):
+
+        entrada = POR_URL.get(url)
+
+        if entrada is None:
+            return None
+
+        codigo = entrada["codigo"]
+
+        with self.trava:
+            self.pendentes[codigo] = df
+
+            # Uma única tarefa por estação: a que estiver em andamento pega a série mais recente ao terminar
+            if codigo not in self.futuros:
+                self.futuros[codigo] = self.executor.submit(self._renderizar, entrada)
+
+            return self.futuros[codigo]
+
+    def _renderizar(self, entrada):
+
+        codigo = entrada["codigo"]
+
+        while True:
+            with self.trava:
+                df = self.pendentes.pop(codigo, None)
+                if df is None:
+                    self.futuros.pop(codigo, None)
+                    return
+
+            tempos, _ = vetores_estacao(df)
+            marca = marca_serie(tempos)
+
+            if not len(tempos) or marca == self.marca(codigo):
+                continue
+
+            try:
+                arquivos = renderizar_estacao(entrada, df)
+            except Exception as e:
+                registrar_falha("imagens", e, estacao=codigo)
+                continue
+
+            os.makedirs(self.caminho(codigo), exist_ok=True)
+
+            for nome, dados in arquivos.items():
+                gravar_atomico(self.caminho(codigo, nome), dados)
+
+            # A marca é gravada por último: as imagens nunca são mais antigas do que ela indica
+            gravar_atomico(self.caminho(codigo, "marca.txt"), marca.encode())
+
+    # Caminho e marca do arquivo. Com imagens desatualizadas (ou ausentes) apenas agenda a renderização:
+    # até ela terminar são servidas as anteriores, ou a marca é None (a API responde 503)
+    def arquivo(self, entrada, nome):
+
+        codigo = entrada["codigo"]
+        url = entrada["info"]["url"]
+        df = obter_cache().obter(url)
+        marca = self.marca(codigo)
+
+        if marca != marca_serie(vetores_estacao(df)[0]):
+            self.agendar(url, df)
+
+        return self.caminho(codigo, nome), marca
+
+
+# Instância única do renderizador, inscrita nas atualizações do cache do processo
+@st.cache_resource(show_spinner=False)
+def obter_renderizador():
+    renderizador = RenderizadorImagens()
+    ao_atualizar(renderizador.agendar)
+    return renderizador
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Renderiza as imagens das estações.")
+    parser.add_argument("--estacoes", nargs="+", default=None, help="códigos das estações (padrão: todas)")
+    parser.add_argument("--diretorio", default=DIRETORIO_IMAGENS)
+    args = parser.parse_args()
+
+    renderizador = RenderizadorImagens(args.diretorio)
+    codigos = [codigo.upper() for codigo in args.estacoes] if args.estacoes else list(CATALOGO)
+    tarefas = {}
+
+    for codigo in codigos:
+        url = CATALOGO[codigo]["info"]["url"]
+        try:
+            tarefas[codigo] = renderizador.agendar(url, obter_cache().obter(url))
+        except ErroDadosEstacao as e:
+            registrar_falha("imagens", e, estacao=codigo)
+
+    for codigo, tarefa in tarefas.items():
+        tarefa.result()
+        print(f"[imagens] {codigo}: {renderizador.caminho(codigo)}", flush=True)
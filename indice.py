@@ -0,0 +1,282 @@
+'''
+Arquivo que contém o índice de consultas por janela de tempo de cada
+estação. A série é dividida em blocos de MEDICOES_BLOCO medições: somas de
+prefixo por bloco respondem média e contagem e uma sparse table sobre os
+blocos responde mínimo e máximo (com o instante de cada um) de qualquer
+intervalo [t0, t1); as bordas da janela (menos de um bloco de cada lado) são
+lidas diretamente da série. O índice não copia a série (referencia os vetores
+do cache) e ocupa poucos bytes por bloco. Os vetores crescem com capacidade
+dobrada e um acréscimo regrava apenas os blocos novos e o último antigo.
+Cada índice mantém também o índice de lacunas da estação (ver lacunas.py).
+
+'''
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+import streamlit as st
+
+from cache_estacoes import obter_cache
+from alinhamento import vetores_estacao
+from lacunas import IndiceLacunas
+
+ResumoJanela = namedtuple("ResumoJanela", ["contagem", "media", "minimo", "t_minimo", "maximo", "t_maximo"])
+
+# Medições por bloco: as tabelas guardam um valor por bloco e as bordas da janela são lidas da série
+MEDICOES_BLOCO = 256
+CAPACIDADE_INICIAL = 64
+
+
+# Vetor com capacidade dobrada a cada estouro; só o trecho final é regravado nos acréscimos
+class VetorCrescente:
+
+    def __init__(self, dtype, preenchimento=0):
+        self.dados = np.full(CAPACIDADE_INICIAL, preenchimento, dtype=dtype)
+        self.preenchimento = preenchimento
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, item):
+        return self.dados[:self.n][item]
+
+    # Grava `valores` a partir da posição `inicio` (<= n), descartando o que vinha depois
+    def gravar(self, inicio, valores):
+
+        fim = inicio + len(valores)
+
+        if fim > len(self.dados):
+            capacidade = max(len(self.dados), 1)
+            while capacidade < fim:
+                capacidade *= 2
+            dados = np.full(capacidade, self.preenchimento, dtype=self.dados.dtype)
+            dados[:inicio] = self.dados[:inicio]
+            self.dados = dados
+
+        self.dados[inicio:fim] = valores
+        self.n = fim
+
+
+# Sparse table sobre os blocos: nível k guarda o melhor valor (e sua posição na série) de 2^k blocos
+class TabelaEsparsa:
+
+    def __init__(self, melhor, pior):
+        # `melhor(a, b)` retorna True onde o valor `a` deve prevalecer sobre `b`; `pior` nunca vence (NaN)
+        self.melhor = melhor
+        self.pior = pior
+        self.valores = []
+        self.posicoes = []
+
+    def _nivel(self, k):
+        if k == len(self.valores):
+            self.valores.append(VetorCrescente('float64', self.pior))
+            self.posicoes.append(VetorCrescente('int32', -1))
+        return self.valores[k], self.posicoes[k]
+
+    # Regrava os blocos a partir de `primeiro` (o último bloco antigo pode ter crescido)
+    def atualizar(self, primeiro, valores, posicoes):
+
+        valores_nivel, posicoes_nivel = self._nivel(0)
+        valores_nivel.gravar(primeiro, valores)
+        posicoes_nivel.gravar(primeiro, posicoes)
+        n = len(valores_nivel)
+
+        k = 1
+        while (1 << k) <= n:
+
+            metade = 1 << (k - 1)
+            anterior_v, anterior_p = self.valores[k - 1], self.posicoes[k - 1]
+
+            # Posições deste nível que cobrem algum bloco regravado
+            inicio = max(primeiro - (1 << k) + 1, 0)
+            fim = n - (1 << k) + 1
+            esquerda = np.arange(inicio, fim)
+            a, b = anterior_v[esquerda], anterior_v[esquerda + metade]
+            escolha = self.melhor(a, b)
+
+            valores_nivel, posicoes_nivel = self._nivel(k)
+            valores_nivel.gravar(inicio, np.where(escolha, a, b))
+            posicoes_nivel.gravar(inicio, np.where(escolha, anterior_p[esquerda], anterior_p[esquerda + metade]))
+
+            k += 1
+
+    # (valor, posição) do melhor dos blocos [b0, b1) (b1 > b0)
+    def consultar(self, b0, b1):
+
+        k = int(b1 - b0).bit_length() - 1
+        j = b1 - (1 << k)
+        a, b = self.valores[k][b0], self.valores[k][j]
+
+        if self.melhor(a, b):
+            return a, self.posicoes[k][b0]
+        return b, self.posicoes[k][j]
+
+
+class IndiceEstacao:
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self._reiniciar()
+
+    # Estado vazio do índice (a trava é mantida: uma reescrita acontece com ela adquirida)
+    def _reiniciar(self):
+        # Referências aos vetores do cache (memória compartilhada ou pacote), sem cópia
+        self.tempos = np.empty(0, dtype='int64')
+        self.valores = np.empty(0)
+        self.soma_blocos = VetorCrescente('float64')
+        self.contagem_blocos = VetorCrescente('int32')
+        self.prefixo_soma = VetorCrescente('float64')
+        self.prefixo_contagem = VetorCrescente('int64')
+        self.tabela_min = TabelaEsparsa(np.less_equal, np.inf)
+        self.tabela_max = TabelaEsparsa(np.greater_equal, -np.inf)
+        self.lacunas = IndiceLacunas()
+        self.versao = None
+
+        self.prefixo_soma.gravar(0, [0.0])
+        self.prefixo_contagem.gravar(0, [0])
+
+    def __len__(self):
+        return len(self.tempos)
+
+    # Incorpora apenas as medições posteriores à última indexada
+    def atualizar(self, tempos, niveis, versao):
+
+        if versao == self.versao:
+            return
+
+        inicio = len(self.tempos)
+
+        if inicio and (len(tempos) < inicio or tempos[inicio - 1] != self.tempos[-1]):
+            # A série foi reescrita (não é um acréscimo): recomeça o índice
+            self._reiniciar()
+            inicio = 0
+
+        self.lacunas.acrescentar(tempos[inicio:])
+        self.tempos, self.valores = tempos, niveis
+
+        # Recalcula os blocos a partir do último bloco antigo (que pode estar incompleto)
+        primeiro = inicio // MEDICOES_BLOCO
+        n = len(tempos)
+        n_blocos = -(-n // MEDICOES_BLOCO)
+
+        if n_blocos > primeiro:
+            self._atualizar_blocos(primeiro, n_blocos)
+
+        self.versao = versao
+
+    def _atualizar_blocos(self, primeiro, n_blocos):
+
+        trecho = self.valores[primeiro * MEDICOES_BLOCO:]
+        completo = np.full((n_blocos - primeiro) * MEDICOES_BLOCO, np.nan)
+        completo[:len(trecho)] = trecho
+        blocos = completo.reshape(-1, MEDICOES_BLOCO)
+
+        validos = ~np.isnan(blocos)
+        soma = np.where(validos, blocos, 0.0).sum(axis=1)
+        contagem = validos.sum(axis=1)
+        base = (primeiro + np.arange(len(blocos))) * MEDICOES_BLOCO
+
+        # NaN nunca vence: é trocado por +inf / -inf nas tabelas de mínimo / máximo
+        para_min = np.where(validos, blocos, np.inf)
+        para_max = np.where(validos, blocos, -np.inf)
+        arg_min = para_min.argmin(axis=1)
+        arg_max = para_max.argmax(axis=1)
+        linhas = np.arange(len(blocos))
+
+        self.soma_blocos.gravar(primeiro, soma)
+        self.contagem_blocos.gravar(primeiro, contagem)
+        self.prefixo_soma.gravar(primeiro + 1, self.prefixo_soma[primeiro] + np.cumsum(soma))
+        self.prefixo_contagem.gravar(primeiro + 1, self.prefixo_contagem[primeiro] + np.cumsum(contagem))
+        self.tabela_min.atualizar(primeiro, para_min[linhas, arg_min], base + arg_min)
+        self.tabela_max.atualizar(primeiro, para_max[linhas, arg_max], base + arg_max)
+
+    # Posições [i0, i1) das medições em [t0, t1) (ns, UTC)
+    def posicoes(self, t0, t1):
+        return int(np.searchsorted(self.tempos, t0, side='left')), int(np.searchsorted(self.tempos, t1, side='left'))
+
+    # Níveis das posições [i0, i1) (NaN nas medições inválidas)
+    def niveis(self, i0, i1):
+        return self.valores[i0:i1]
+
+    # Contagem, média, mínimo e máximo (com instantes) em [t0, t1)
+    def consultar(self, t0, t1):
+
+        i0, i1 = self.posicoes(t0, t1)
+
+        # Blocos inteiros [b0, b1) pelas tabelas; as bordas (menos de um bloco de cada lado) pela série
+        b0 = -(-i0 // MEDICOES_BLOCO)
+        b1 = i1 // MEDICOES_BLOCO
+
+        if b0 >= b1:
+            bordas = [(i0, i1)]
+            b0 = b1 = 0
+        else:
+            bordas = [(i0, b0 * MEDICOES_BLOCO), (b1 * MEDICOES_BLOCO, i1)]
+
+        contagem = int(self.prefixo_contagem[b1] - self.prefixo_contagem[b0])
+        soma = float(self.prefixo_soma[b1] - self.prefixo_soma[b0])
+        candidatos_min = [self.tabela_min.consultar(b0, b1)] if b1 > b0 else []
+        candidatos_max = [self.tabela_max.consultar(b0, b1)] if b1 > b0 else []
+
+        for j0, j1 in bordas:
+            v = self.valores[j0:j1]
+            validos = ~np.isnan(v)
+
+            if not validos.any():
+                continue
+
+            contagem += int(validos.sum())
+            soma += float(v[validos].sum())
+            j_min, j_max = j0 + int(np.nanargmin(v)), j0 + int(np.nanargmax(v))
+            candidatos_min.append((self.valores[j_min], j_min))
+            candidatos_max.append((self.valores[j_max], j_max))
+
+        if contagem == 0:
+            return ResumoJanela(0, np.nan, np.nan, None, np.nan, None)
+
+        # Empates ficam com a posição mais antiga, como na tabela
+        minimo, j_min = min(candidatos_min, key=lambda c: (c[0], c[1]))
+        maximo, j_max = max(candidatos_max, key=lambda c: (c[0], -c[1]))
+
+        return ResumoJanela(contagem, soma / contagem, float(minimo), int(self.tempos[j_min]),
+                            float(maximo), int(self.tempos[j_max]))
+
+    # Mínimo e máximo em [t0, t1), ou (None, None) se não houver dados
+    def extremos(self, t0=None, t1=None):
+
+        resumo = self.consultar(self.tempos[0] if t0 is None else t0, self.tempos[-1] + 1 if t1 is None else t1) \
+            if len(self) else None
+
+        if resumo is None or resumo.contagem == 0:
+            return None, None
+
+        return resumo.minimo, resumo.maximo
+
+
+# Índices de todas as estações do processo, sincronizados com o cache de dados brutos
+class ArquivoIndices:
+
+    def __init__(self):
+        self._indices = {}
+        self._trava = threading.Lock()
+
+    def obter(self, url):
+
+        cache = obter_cache()
+        df = cache.obter(url)
+
+        with self._trava:
+            indice = self._indices.setdefault(url, IndiceEstacao())
+
+        with indice.trava:
+            indice.atualizar(*vetores_estacao(df), cache.versao(url))
+
+        return indice
+
+
+# Instância única dos índices, compartilhada por todas as sessões do processo
+@st.cache_resource(show_spinner=False)
+def obter_arquivo_indices():
+    return ArquivoIndices()
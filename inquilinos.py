@@ -0,0 +1,120 @@
+'''
+Arquivo que contém o cadastro das dashboards (inquilinos) atendidas pelo
+ponto de entrada único main-multi.py. Cada inquilino reúne as estações,
+logotipo, idioma, senha e limites do modo ao vivo que antes ficavam em um
+script main-*.py separado. O inquilino é escolhido pelo domínio de acesso
+ou pelo parâmetro de URL "painel" (ex.: ?painel=estrela). O perfil de
+cada inquilino (ver perfis.py) declara seus comportamentos específicos.
+
+'''
+
+import streamlit as st
+
+from main_config import ESTACOES, ESTACAO_PADRAO, INTERVALO_AO_VIVO
+from main_estrela_config import ESTACOES_ESTRELA, ESTACAO_PADRAO_ESTRELA, INTERVALO_AO_VIVO_ESTRELA
+from main_barroso_config import ESTACOES_BARROSO, ESTACAO_PADRAO_BARROSO, INTERVALO_AO_VIVO_BARROSO
+from main_canoas_config import ESTACOES_CANOAS, ESTACAO_PADRAO_CANOAS, INTERVALO_AO_VIVO_CANOAS
+from main_ipatinga_config import ESTACOES_IPATINGA, ESTACAO_PADRAO_IPATINGA, INTERVALO_AO_VIVO_IPATINGA
+from main_portosrs_config import ESTACOES_PORTOS, ESTACAO_PADRAO_PORTOS, INTERVALO_AO_VIVO_PORTOS
+from perfis import PERFIL_PADRAO, PERFIL_ESTRELA, PERFIL_GUAIBA
+
+LOGO_TIDESAT = "TideSat_logo.webp"
+HTML_TIDESAT = "https://www.tidesatglobal.com/"
+
+################# CADASTRO DAS DASHBOARDS #################
+INQUILINOS = {
+    "tidesat": {
+        "dominios": ["tidesat"],
+        "estacoes": ESTACOES,
+        "estacao_padrao": ESTACAO_PADRAO,
+        "logotipo": LOGO_TIDESAT,
+        "html_logo": HTML_TIDESAT,
+        "idioma": "pt",
+        "senha": False,
+        "intervalo_ao_vivo": INTERVALO_AO_VIVO,
+        "perfil": PERFIL_GUAIBA
+    },
+    "estrela": {
+        "dominios": ["tidesat-estrela"],
+        "estacoes": ESTACOES_ESTRELA,
+        "estacao_padrao": ESTACAO_PADRAO_ESTRELA,
+        "logotipo": LOGO_TIDESAT,
+        "html_logo": HTML_TIDESAT,
+        "idioma": "pt",
+        "senha": False,
+        "intervalo_ao_vivo": INTERVALO_AO_VIVO_ESTRELA,
+        "perfil": PERFIL_ESTRELA
+    },
+    "barroso": {
+        "dominios": ["tidesat-barroso"],
+        "estacoes": ESTACOES_BARROSO,
+        "estacao_padrao": ESTACAO_PADRAO_BARROSO,
+        "logotipo": LOGO_TIDESAT,
+        "html_logo": HTML_TIDESAT,
+        "idioma": "pt",
+        "senha": True,
+        "intervalo_ao_vivo": INTERVALO_AO_VIVO_BARROSO,
+        "perfil": PERFIL_PADRAO
+    },
+    "canoas": {
+        "dominios": ["tidesat-canoas"],
+        "estacoes": ESTACOES_CANOAS,
+        "estacao_padrao": ESTACAO_PADRAO_CANOAS,
+        "logotipo": "metsul_logo.png",
+        "html_logo": "https://metsul.com/",
+        "idioma": "pt",
+        "senha": False,
+        "intervalo_ao_vivo": INTERVALO_AO_VIVO_CANOAS,
+        "perfil": PERFIL_PADRAO
+    },
+    "ipatinga": {
+        "dominios": ["tidesat-ipatinga"],
+        "estacoes": ESTACOES_IPATINGA,
+        "estacao_padrao": ESTACAO_PADRAO_IPATINGA,
+        "logotipo": LOGO_TIDESAT,
+        "html_logo": HTML_TIDESAT,
+        "idioma": "pt",
+        "senha": False,
+        "intervalo_ao_vivo": INTERVALO_AO_VIVO_IPATINGA,
+        "perfil": PERFIL_PADRAO
+    },
+    "portosrs": {
+        "dominios": ["tidesat-portosrs"],
+        "estacoes": ESTACOES_PORTOS,
+        "estacao_padrao": ESTACAO_PADRAO_PORTOS,
+        "logotipo": "portosrs_logo.png",
+        "html_logo": "https://www.portosrs.com.br/site/",
+        "idioma": "pt",
+        "senha": False,
+        "intervalo_ao_vivo": INTERVALO_AO_VIVO_PORTOS,
+        "perfil": PERFIL_GUAIBA
+    }
+}
+
+INQUILINO_PADRAO = "tidesat"
+
+# Índice domínio -> inquilino, montado uma única vez
+_POR_DOMINIO = {dominio: nome for nome, inq in INQUILINOS.items() for dominio in inq["dominios"]}
+
+
+# Identifica o inquilino pelo parâmetro de URL ou pelo primeiro rótulo do domínio
+def identificar_inquilino(host, painel=None):
+
+    if painel in INQUILINOS:
+        return painel
+
+    rotulo = (host or "").split(":")[0].split(".")[0].lower()
+
+    return _POR_DOMINIO.get(rotulo, INQUILINO_PADRAO)
+
+
+# Retorna (nome, configuração) do inquilino da sessão atual
+def obter_inquilino():
+
+    if "inquilino" not in st.session_state:
+        host = st.context.headers.get("Host", "")
+        st.session_state["inquilino"] = identificar_inquilino(host, st.query_params.get("painel"))
+
+    nome = st.session_state["inquilino"]
+
+    return nome, INQUILINOS[nome]
@@ -0,0 +1,108 @@
+'''
+Arquivo que contém o índice de lacunas de cada estação: os intervalos em que
+o espaçamento entre medições consecutivas passa de FATOR_LACUNA vezes a
+cadência nominal (10 min). O índice é estendido a cada acréscimo de
+medições (apenas o trecho novo é examinado) e guarda a duração acumulada das
+lacunas, de modo que as quebras do gráfico, a disponibilidade de um período
+e a completude de cada dia são respondidas com buscas binárias, sem
+percorrer a série.
+
+'''
+
+import numpy as np
+
+from alinhamento import CADENCIA_NOMINAL
+
+# Espaçamento (em cadências nominais) a partir do qual há uma lacuna
+FATOR_LACUNA = 3
+LIMIAR_LACUNA = FATOR_LACUNA * CADENCIA_NOMINAL
+
+
+class IndiceLacunas:
+
+    def __init__(self, limiar=LIMIAR_LACUNA):
+        self.limiar = limiar
+        # Última medição antes e primeira depois de cada lacuna (ns, UTC)
+        self.inicios = np.empty(0, dtype='int64')
+        self.fins = np.empty(0, dtype='int64')
+        # Tempo sem dados acumulado até cada lacuna (cada lacuna conta fins - inicios - cadência)
+        self.prefixo_falta = np.zeros(1, dtype='int64')
+        self.primeiro = None
+        self.ultimo = None
+
+    def __len__(self):
+        return len(self.inicios)
+
+    # Examina as medições novas (posteriores a self.ultimo), em ordem crescente
+    def acrescentar(self, tempos):
+
+        if not len(tempos):
+            return
+
+        if self.primeiro is None:
+            self.primeiro = int(tempos[0])
+            consecutivos = tempos
+        else:
+            consecutivos = np.concatenate([[self.ultimo], tempos])
+
+        passos = np.diff(consecutivos)
+        posicoes = np.flatnonzero(passos > self.limiar)
+
+        if len(posicoes):
+            inicios = consecutivos[posicoes]
+            fins = consecutivos[posicoes + 1]
+            self.inicios = np.concatenate([self.inicios, inicios])
+            self.fins = np.concatenate([self.fins, fins])
+            self.prefixo_falta = np.concatenate([self.prefixo_falta,
+                                                 self.prefixo_falta[-1] + np.cumsum(fins - inicios - CADENCIA_NOMINAL)])
+
+        self.ultimo = int(tempos[-1])
+
+    # Lacunas que interrompem [t0, t1) com espaçamento maior que `minimo` (ns): (inicios, fins)
+    def intervalos(self, t0, t1, minimo=0):
+
+        j0 = int(np.searchsorted(self.fins, t0, side='right'))
+        j1 = int(np.searchsorted(self.inicios, t1, side='left'))
+        inicios, fins = self.inicios[j0:j1], self.fins[j0:j1]
+        grandes = fins - inicios > minimo
+
+        return inicios[grandes], fins[grandes]
+
+    # Tempo sem dados dentro das lacunas antes de cada instante `t` (vetorizado)
+    def _falta_ate(self, t):
+
+        t = np.asarray(t, dtype='int64')
+
+        if not len(self):
+            return np.zeros(t.shape, dtype='int64')
+
+        # Lacunas iniciadas até t: todas completas, exceto talvez a última (conta só a parte decorrida)
+        j = np.searchsorted(self.inicios, t, side='right')
+        ultima = np.maximum(j - 1, 0)
+        parcial = np.clip(np.minimum(t, self.fins[ultima]) - self.inicios[ultima] - CADENCIA_NOMINAL, 0, None)
+
+        return np.where(j > 0, self.prefixo_falta[ultima] + parcial, 0)
+
+    # Fração com dados de cada intervalo [limites[i], limites[i+1]) até `agora` (NaN nos intervalos futuros).
+    # Antes da primeira medição, e depois da última quando ela tem mais de um limiar de atraso, não há dados.
+    def cobertura(self, limites, agora):
+
+        limites = np.asarray(limites, dtype='int64')
+
+        if self.primeiro is None:
+            return np.where(np.diff(np.minimum(limites, agora)) > 0, 0.0, np.nan)
+
+        fim_dados = agora if agora - self.ultimo <= self.limiar else self.ultimo
+        t = np.clip(limites, self.primeiro, fim_dados)
+
+        cobertos = np.diff((t - self.primeiro) - self._falta_ate(t))
+        duracoes = np.diff(np.minimum(limites, agora))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(duracoes > 0, np.clip(cobertos / duracoes, 0.0, 1.0), np.nan)
+
+    # Lacuna em andamento no instante `agora` (a partir da última medição), em ns; 0 se não houver
+    def lacuna_atual(self, agora):
+        if self.ultimo is None or agora - self.ultimo <= self.limiar:
+            return 0
+        return agora - self.ultimo
@@ -19,7 +19,22 @@ LANG = {
         "theme": "👓 Tema",
         "incorrect_password": "😕 Senha incorreta. Tente novamente",
         "light_mode": "Claro",
-        "dark_mode": "Escuro"
+        "dark_mode": "Escuro",
+        "live_mode": "📡 Modo ao vivo",
+        "live_mode_toggle": "Atualizar automaticamente",
+        "refresh_interval": "Intervalo de atualização",
+        "travel_time": "⏱️ Tempo de propagação",
+        "leads_by": "{a} antecede {b} em {h} h (r = {r})",
+        "lag_unavailable": "{a} → {b}: dados insuficientes",
+        "level_difference": "📏 Diferença de nível mais recente",
+        "export": "⬇️ Exportar dados do período",
+        "export_stations": "Estações",
+        "export_format": "Formato",
+        "export_prepare": "Preparar arquivo",
+        "export_download": "Baixar arquivo",
+        "forecast": "Previsão",
+        "forecast_band": "Previsão ({c}%)",
+        "forecast_in": "Previsão em {h} h"
     },
     "en": {
         "lang_code": "en",
@@ -36,6 +51,21 @@ LANG = {
         "theme": "👓 Theme",
         "incorrect_password": "😕 Incorrect password. Try again",
         "light_mode": "Light",
-        "dark_mode": "Dark"
+        "dark_mode": "Dark",
+        "live_mode": "📡 Live mode",
+        "live_mode_toggle": "Auto refresh",
+        "refresh_interval": "Refresh interval",
+        "travel_time": "⏱️ Travel time",
+        "leads_by": "{a} leads {b} by {h} h (r = {r})",
+        "lag_unavailable": "{a} → {b}: not enough data",
+        "level_difference": "📏 Latest level difference",
+        "export": "⬇️ Export data for this period",
+        "export_stations": "Stations",
+        "export_format": "Format",
+        "export_prepare": "Prepare file",
+        "export_download": "Download file",
+        "forecast": "Forecast",
+        "forecast_band": "Forecast ({c}%)",
+        "forecast_in": "Forecast in {h} h"
     }
 }
\ No newline at end of file
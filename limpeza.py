@@ -0,0 +1,162 @@
+'''
+Arquivo que contém a limpeza das medições na chegada ao cache: ordenação
+estável com remoção de instantes repetidos, rejeição de picos (filtro de
+Hampel) e um código de qualidade por medição. A limpeza roda uma única vez,
+apenas sobre as linhas novas de cada download; as telas recebem a série já
+limpa.
+
+O filtro é causal: cada medição é comparada com a projeção das medições
+anteriores (mediana das anteriores deslocadas pela inclinação de Theil-Sen,
+para não confundir a subida de uma cheia ou a maré com um pico) e rejeitada
+se o resíduo passar de LIMIAR_MAD desvios robustos dos resíduos recentes da
+própria estação. Como a decisão usa apenas o passado, ela é definitiva: a
+série continua sendo só acrescentada, e os índices, agregados e o
+armazenamento compartilhado não precisam refazer nada.
+
+'''
+
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from alinhamento import vetores_estacao
+
+# Medições anteriores usadas na projeção de cada medição nova
+JANELA_PICOS = 6
+
+# Resíduos anteriores usados na escala do filtro (6 h na cadência nominal)
+JANELA_ESCALA = 36
+
+# Medições anteriores válidas e resíduos anteriores necessários para testar uma medição
+MINIMO_VALIDOS = 4
+MINIMO_RESIDUOS = 12
+
+# Apenas medições anteriores até este intervalo (ns) entram na projeção (depois de uma falha, não há teste)
+ALCANCE_PICOS = 2 * 3600 * 10**9
+
+# Rejeição: resíduo maior que LIMIAR_MAD desvios robustos (1,4826 × MAD) e que DESVIO_MINIMO (m)
+LIMIAR_MAD = 6.0
+DESVIO_MINIMO = 0.05
+
+# Pares de colunas da janela usados na inclinação (estimador de Theil-Sen)
+PARES = np.array(list(combinations(range(JANELA_PICOS), 2))).T
+
+# Bits do código de qualidade (0 = medição válida e testada)
+AUSENTE = 1         # nível vazio na origem
+PICO = 2            # rejeitada pelo filtro (o nível fica NaN na série limpa)
+SEM_CONTEXTO = 4    # poucas medições ou resíduos anteriores: aceita sem teste
+
+# Contexto de um acréscimo: últimas medições brutas e últimos resíduos
+CaudaLimpeza = namedtuple("CaudaLimpeza", ["tempos", "niveis", "residuos"])
+
+CAUDA_VAZIA = CaudaLimpeza(np.empty(0, dtype='int64'), np.empty(0), np.empty(0))
+
+
+# Mediana de cada linha ignorando NaN (NaN quando a linha não tem valores)
+def mediana_linhas(matriz):
+
+    ordenada = np.sort(matriz, axis=1)
+    validos = np.sum(~np.isnan(matriz), axis=1)
+    linhas = np.arange(len(matriz))
+
+    baixo = ordenada[linhas, np.maximum((validos - 1) // 2, 0)]
+    alto = ordenada[linhas, np.maximum(validos // 2, 0)]
+
+    return np.where(validos > 0, (baixo + alto) / 2, np.nan)
+
+
+# Janelas com os `largura` valores anteriores a cada um dos `n` últimos valores, completando o início com `vazio`
+def anteriores(valores, largura, n, vazio):
+    completos = np.concatenate([np.full(largura, vazio, dtype=valores.dtype), valores])
+    return sliding_window_view(completos[:-1], largura)[-n:]
+
+
+# Picos e medições sem contexto entre as novas, dadas as medições anteriores (cauda)
+def marcar_picos(tempos, niveis, cauda=CAUDA_VAZIA):
+
+    n = len(tempos)
+    todos_tempos = np.concatenate([cauda.tempos, tempos])
+    todos_niveis = np.concatenate([cauda.niveis, niveis])
+
+    # Linha i: as JANELA_PICOS medições anteriores à medição nova i (as distantes demais são ignoradas)
+    janela_t = anteriores(todos_tempos, JANELA_PICOS, n, 0)
+    distancia = tempos[:, None] - janela_t
+    janela = np.where(distancia <= ALCANCE_PICOS, anteriores(todos_niveis, JANELA_PICOS, n, np.nan), np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inclinacao = mediana_linhas((janela[:, PARES[1]] - janela[:, PARES[0]]) /
+                                    (janela_t[:, PARES[1]] - janela_t[:, PARES[0]]))
+        previsto = mediana_linhas(janela + distancia * np.nan_to_num(inclinacao)[:, None])
+
+    residuos = niveis - previsto
+
+    # Escala: desvio robusto dos resíduos anteriores da estação
+    janela_residuos = anteriores(np.concatenate([cauda.residuos, residuos]), JANELA_ESCALA, n, np.nan)
+    escala = 1.4826 * mediana_linhas(np.abs(janela_residuos))
+
+    sem_contexto = (np.sum(~np.isnan(janela), axis=1) < MINIMO_VALIDOS) | \
+                   (np.sum(~np.isnan(janela_residuos), axis=1) < MINIMO_RESIDUOS)
+
+    with np.errstate(invalid='ignore'):
+        picos = ~sem_contexto & (np.abs(residuos) > np.maximum(LIMIAR_MAD * escala, DESVIO_MINIMO))
+
+    nova_cauda = CaudaLimpeza(todos_tempos[-JANELA_PICOS:].copy(), todos_niveis[-JANELA_PICOS:].copy(),
+                              np.concatenate([cauda.residuos, residuos])[-JANELA_ESCALA:].copy())
+
+    return picos, sem_contexto, nova_cauda
+
+
+# Níveis limpos, código de qualidade e a nova cauda (contexto do próximo acréscimo)
+def limpar(tempos, niveis, cauda=CAUDA_VAZIA):
+
+    picos, sem_contexto, cauda = marcar_picos(tempos, niveis, cauda)
+    ausentes = np.isnan(niveis)
+
+    qualidade = (ausentes * AUSENTE | picos * PICO | (sem_contexto & ~ausentes) * SEM_CONTEXTO).astype('uint8')
+
+    return np.where(picos, np.nan, niveis), qualidade, cauda
+
+
+# Cauda reconstruída de uma série já limpa, quando a cauda bruta não está disponível
+# (série lida do armazenamento compartilhado ou de outra instância)
+def cauda_serie(df):
+    tempos, niveis = vetores_estacao(df)
+    inicio = max(len(tempos) - JANELA_PICOS - JANELA_ESCALA, 0)
+    return marcar_picos(tempos[inicio:], niveis[inicio:])[2]
+
+
+# Posições em ordem cronológica sem instantes repetidos (fica a última ocorrência de cada
+# instante); None quando a série já está em ordem estritamente crescente
+def ordem_limpa(tempos):
+
+    if len(tempos) < 2 or np.all(tempos[1:] > tempos[:-1]):
+        return None
+
+    ordem = np.argsort(tempos, kind='stable')
+    ordenados = tempos[ordem]
+
+    return ordem[np.append(ordenados[1:] != ordenados[:-1], True)]
+
+
+# Limpa as linhas novas de uma estação; retorna o DataFrame limpo (com a coluna 'qualidade'),
+# a nova cauda e as contagens por motivo ({motivo: quantidade})
+def limpar_df(df, cauda=None):
+
+    tempos, _ = vetores_estacao(df)
+    posicoes = ordem_limpa(tempos)
+
+    descartes = {
+        "fora_de_ordem": int(np.sum(tempos[1:] < tempos[:-1])),
+        "duplicada": 0 if posicoes is None else len(tempos) - len(posicoes),
+    }
+
+    if posicoes is not None:
+        df = df.iloc[posicoes].reset_index(drop=True)
+
+    tempos, niveis = vetores_estacao(df)
+    limpos, qualidade, cauda = limpar(tempos, niveis, CAUDA_VAZIA if cauda is None else cauda)
+    descartes["pico"] = int(np.count_nonzero(qualidade & PICO))
+
+    return df.assign(**{'water_level(m)': limpos, 'qualidade': qualidade}), cauda, descartes
@@ -6,20 +6,17 @@ levando as informações constantes pertinentes a esse script.
 '''
 
 # SITE ESCOLA ALMIRANTE BARROSO
-import streamlit as st
-from tools import main, checar_senha
-from main_barroso_config import ESTACOES_BARROSO, ESTACAO_PADRAO_BARROSO
+from tools import main
+from main_barroso_config import ESTACOES_BARROSO, ESTACAO_PADRAO_BARROSO, INTERVALO_AO_VIVO_BARROSO
 from language import LANG
 
 # Define o idioma para essa instância
 idioma = "pt"
 lang = LANG[idioma]
 
-if not checar_senha():
-    st.stop()
 estacoes_info = ESTACOES_BARROSO
 estacao_padrao = ESTACAO_PADRAO_BARROSO
 logotipo = "TideSat_logo.webp"
 html_logo = "https://www.tidesatglobal.com/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_BARROSO, exigir_senha=True)
\ No newline at end of file
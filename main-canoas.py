@@ -6,7 +6,7 @@ levando as informações constantes pertinentes a esse script.
 '''
 
 # SITE DE CANOAS
-from main_canoas_config import ESTACOES_CANOAS, ESTACAO_PADRAO_CANOAS
+from main_canoas_config import ESTACOES_CANOAS, ESTACAO_PADRAO_CANOAS, INTERVALO_AO_VIVO_CANOAS
 from tools import main
 from language import LANG
 
@@ -19,4 +19,4 @@ estacao_padrao = ESTACAO_PADRAO_CANOAS
 logotipo = "metsul_logo.png"
 html_logo = "https://metsul.com/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_CANOAS)
\ No newline at end of file
@@ -6,7 +6,7 @@ levando as informações constantes pertinentes a esse script.
 '''
 
 # SITE DE ESTRELA
-from main_estrela_alt import ESTACOES_ESTRELA, ESTACAO_PADRAO_ESTRELA
+from main_estrela_alt import ESTACOES_ESTRELA, ESTACAO_PADRAO_ESTRELA, INTERVALO_AO_VIVO_ESTRELA
 from tools import main
 from language import LANG
 
@@ -19,4 +19,4 @@ estacao_padrao = ESTACAO_PADRAO_ESTRELA
 logotipo = "TideSat_logo.webp"
 html_logo = "https://www.tidesatglobal.com/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_ESTRELA)
@@ -6,8 +6,9 @@ levando as informações constantes pertinentes a esse script.
 '''
 
 # SITE DE ESTRELA
-from main_estrela_config import ESTACOES_ESTRELA, ESTACAO_PADRAO_ESTRELA
+from main_estrela_config import ESTACOES_ESTRELA, ESTACAO_PADRAO_ESTRELA, INTERVALO_AO_VIVO_ESTRELA
 from tools import main
+from perfis import PERFIL_ESTRELA
 from language import LANG
 
 # Define o idioma para essa instância
@@ -19,4 +20,4 @@ estacao_padrao = ESTACAO_PADRAO_ESTRELA
 logotipo = "TideSat_logo.webp"
 html_logo = "https://www.tidesatglobal.com/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_ESTRELA, perfil=PERFIL_ESTRELA)
\ No newline at end of file
@@ -6,7 +6,7 @@ levando as informações constantes pertinentes a esse script.
 '''
 
 # SITE DE IPATINGA
-from main_ipatinga_config import ESTACOES_IPATINGA, ESTACAO_PADRAO_IPATINGA
+from main_ipatinga_config import ESTACOES_IPATINGA, ESTACAO_PADRAO_IPATINGA, INTERVALO_AO_VIVO_IPATINGA
 from tools import main
 from language import LANG
 
@@ -19,4 +19,4 @@ estacao_padrao = ESTACAO_PADRAO_IPATINGA
 logotipo = "TideSat_logo.webp"
 html_logo = "https://www.tidesatglobal.com/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_IPATINGA)
\ No newline at end of file
@@ -0,0 +1,22 @@
+'''
+Arquivo que dá início a execução de todas as dashboards a partir de um único
+processo. O inquilino (estações, logotipo, idioma e senha) é escolhido pelo
+domínio de acesso ou pelo parâmetro de URL "painel", e todas as dashboards
+compartilham o mesmo cache de estações (ver inquilinos.py).
+
+'''
+
+# SITE MULTI-INQUILINO
+import streamlit as st
+from inquilinos import obter_inquilino
+from tools import main
+from language import LANG
+
+nome, inquilino = obter_inquilino()
+
+# Idioma do inquilino, podendo ser trocado pelo parâmetro de URL "idioma"
+idioma = st.query_params.get("idioma", inquilino["idioma"])
+lang = LANG.get(idioma, LANG[inquilino["idioma"]])
+
+main(inquilino["estacoes"], inquilino["estacao_padrao"], inquilino["logotipo"], inquilino["html_logo"], lang,
+     inquilino["intervalo_ao_vivo"], exigir_senha=inquilino["senha"], chave_senha=nome, perfil=inquilino["perfil"])
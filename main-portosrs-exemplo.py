@@ -1,4 +1,4 @@
-from main_portosrs_config import ESTACOES_PORTOS, ESTACAO_PADRAO_PORTOS
+from main_portosrs_config import ESTACOES_PORTOS, ESTACAO_PADRAO_PORTOS, INTERVALO_AO_VIVO_PORTOS
 from tools import main
 from language import LANG
 
@@ -13,4 +13,4 @@ logotipo = "portosrs_logo.png"
 html_logo = "https://www.portosrs.com.br/site/"
 
 # Executa o app com a linguagem definida
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_PORTOS)
\ No newline at end of file
@@ -6,8 +6,9 @@ levando as informações constantes pertinentes a esse script.
 '''
 
 # SITE PARA PORTOSRS
-from main_portosrs_config import ESTACOES_PORTOS, ESTACAO_PADRAO_PORTOS
+from main_portosrs_config import ESTACOES_PORTOS, ESTACAO_PADRAO_PORTOS, INTERVALO_AO_VIVO_PORTOS
 from tools import main
+from perfis import PERFIL_GUAIBA
 from language import LANG
 
 # Define o idioma para essa instância
@@ -19,4 +20,4 @@ estacao_padrao = ESTACAO_PADRAO_PORTOS
 logotipo = "portosrs_logo.png"
 html_logo = "https://www.portosrs.com.br/site/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, INTERVALO_AO_VIVO_PORTOS, perfil=PERFIL_GUAIBA)
\ No newline at end of file
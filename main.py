@@ -8,6 +8,7 @@ levando as informações constantes pertinentes a esse script.
 # SITE PRINCIPAL
 from main_config import ESTACOES, ESTACAO_PADRAO
 from tools import main
+from perfis import PERFIL_GUAIBA
 from language import LANG
 
 # Define o idioma para essa instância
@@ -19,4 +20,4 @@ estacao_padrao = ESTACAO_PADRAO
 logotipo = "TideSat_logo.webp"
 html_logo = "https://www.tidesatglobal.com/"
 
-main(estacoes_info, estacao_padrao, logotipo, html_logo, lang)
\ No newline at end of file
+main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, perfil=PERFIL_GUAIBA)
\ No newline at end of file
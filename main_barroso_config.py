@@ -21,4 +21,8 @@ ESTACOES_BARROSO = {
     }
 }
 
-ESTACAO_PADRAO_BARROSO = "IDP1"
\ No newline at end of file
+ESTACAO_PADRAO_BARROSO = "IDP1"
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO_BARROSO = (300, 900)
\ No newline at end of file
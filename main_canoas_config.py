@@ -21,4 +21,8 @@ ESTACOES_CANOAS = {
     }
 }
 
-ESTACAO_PADRAO_CANOAS = "CAN2"
\ No newline at end of file
+ESTACAO_PADRAO_CANOAS = "CAN2"
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO_CANOAS = (60, 900)
\ No newline at end of file
@@ -112,4 +112,11 @@ ESTACOES = {
     }
 }
 
-ESTACAO_PADRAO = "SPH4"
\ No newline at end of file
+ESTACAO_PADRAO = "SPH4"
+
+# Cadeia do Guaíba, de montante para jusante (análise de defasagem)
+CADEIA_GUAIBA = ["IDP1", "SPH4", "VDS1", "ITA1"]
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO = (60, 900)
\ No newline at end of file
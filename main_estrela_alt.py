@@ -67,3 +67,7 @@ ESTACOES_ESTRELA = {
 }
 
 ESTACAO_PADRAO_ESTRELA = "EST1"
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO_ESTRELA = (30, 600)
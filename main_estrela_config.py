@@ -57,4 +57,11 @@ ESTACOES_ESTRELA = {
         
 }
 
-ESTACAO_PADRAO_ESTRELA = "EST1"
\ No newline at end of file
+ESTACAO_PADRAO_ESTRELA = "EST1"
+
+# Cadeia do Rio Taquari, de montante para jusante (análise de defasagem)
+CADEIA_TAQUARI = ["EST6", "EST1", "EST2", "EST3"]
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO_ESTRELA = (30, 600)
\ No newline at end of file
@@ -22,3 +22,7 @@ ESTACOES_IPATINGA = {
 }
 
 ESTACAO_PADRAO_IPATINGA = "IPA2"
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO_IPATINGA = (300, 900)
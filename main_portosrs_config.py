@@ -70,4 +70,8 @@ ESTACOES_PORTOS = {
     }
 }
 
-ESTACAO_PADRAO_PORTOS = "EST1"
\ No newline at end of file
+ESTACAO_PADRAO_PORTOS = "EST1"
+
+################# MODO AO VIVO #################
+# Intervalo de atualização permitido (mínimo, máximo), em segundos
+INTERVALO_AO_VIVO_PORTOS = (60, 900)
\ No newline at end of file
@@ -0,0 +1,99 @@
+'''
+Arquivo que contém o relatório de memória das sessões. Mede quantos bytes
+cada sessão guarda no st.session_state e compara com o modelo anterior, em
+que cada sessão mantinha uma cópia completa da estação (incluindo a coluna
+convertida para o fuso), além do tamanho do cache compartilhado.
+
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Tamanho aproximado (em bytes) de um objeto, descendo em coleções e DataFrames
+def bytes_objeto(obj, vistos=None):
+
+    vistos = set() if vistos is None else vistos
+
+    if id(obj) in vistos:
+        return 0
+
+    vistos.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        uso = obj.memory_usage(deep=True)
+        return int(uso.sum() if hasattr(uso, "sum") else uso)
+
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(bytes_objeto(k, vistos) + bytes_objeto(v, vistos) for k, v in obj.items())
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(bytes_objeto(v, vistos) for v in obj)
+
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + bytes_objeto(vars(obj), vistos)
+
+    return sys.getsizeof(obj)
+
+
+# Bytes por chave do estado de uma sessão
+def bytes_sessao(estado):
+
+    tamanhos = {}
+
+    for chave in list(estado.keys()):
+        try:
+            tamanhos[str(chave)] = bytes_objeto(estado[chave])
+        except Exception:
+            tamanhos[str(chave)] = 0
+
+    return tamanhos
+
+
+# Bytes que a sessão guardava no modelo anterior: cópia da estação + coluna no fuso selecionado
+def bytes_sessao_anterior(df):
+
+    if df is None or df.empty:
+        return 0
+
+    return bytes_objeto(df) + int(df['datetime_utc'].memory_usage(deep=True, index=False))
+
+
+# Relatório comparando a sessão atual com o modelo de cópia por sessão
+def relatorio_memoria(estado, df_estacao, cache=None):
+
+    tamanhos = bytes_sessao(estado)
+    atual = sum(tamanhos.values())
+
+    # No modelo anterior a chave "dados_estacao" era o DataFrame completo
+    anterior = atual - tamanhos.get("dados_estacao", 0) + bytes_sessao_anterior(df_estacao)
+
+    relatorio = {
+        "bytes_sessao_antes": anterior,
+        "bytes_sessao_depois": atual,
+        "bytes_por_chave": dict(sorted(tamanhos.items(), key=lambda item: -item[1])),
+    }
+
+    if cache is not None:
+        relatorio["bytes_cache_compartilhado"] = bytes_cache(cache)
+
+    return relatorio
+
+
+# Bytes das séries guardadas no cache compartilhado (contadas uma única vez para todas as sessões)
+def bytes_cache(cache):
+    return sum(bytes_objeto(df) for df in cache.series().values())
+
+
+# Formata bytes para leitura
+def formatar_bytes(n):
+
+    for unidade in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unidade == "GiB":
+            return f"{n:.0f} {unidade}" if unidade == "B" else f"{n:.1f} {unidade}"
+        n /= 1024
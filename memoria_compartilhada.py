@@ -0,0 +1,192 @@
+'''
+Arquivo que contém o armazenamento das estações em memória compartilhada
+entre processos. Um único processo atualizador (atualizador.py) grava cada
+estação em um arquivo mapeado em memória (por padrão em /dev/shm) e qualquer
+número de processos da dashboard no mesmo host lê os vetores sem cópia.
+
+Cada arquivo tem um cabeçalho com um contador de versão: o escritor o deixa
+ímpar durante a gravação e par ao terminar, e os leitores repetem a leitura
+se a versão mudou no meio do caminho. Como as séries só crescem, os trechos
+já lidos continuam válidos sem travas nem nova interpretação do CSV.
+
+'''
+
+import os
+import re
+import time
+
+import numpy as np
+
+# Diretório padrão do armazenamento compartilhado
+DIRETORIO_COMPARTILHADO = os.environ.get(
+    "TIDESAT_SHM", "/dev/shm/tidesat" if os.path.isdir("/dev/shm") else "/tmp/tidesat")
+
+MAGICO = 0x5441534544495401  # "TIDESAT" + formato 1
+CAPACIDADE_INICIAL = 1 << 16
+
+# Posições (em uint64) dos campos do cabeçalho
+CAB_MAGICO, CAB_VERSAO, CAB_TAMANHO, CAB_CAPACIDADE = range(4)
+BYTES_CABECALHO = 64
+
+
+# Nome do arquivo da estação a partir da URL
+def caminho_serie(url, diretorio=DIRETORIO_COMPARTILHADO):
+
+    nome = re.sub(r'[^A-Za-z0-9_.-]', '_', url.rstrip('/').split('/')[-1])
+    return os.path.join(diretorio, f"{nome}.serie")
+
+
+# Mapeia o arquivo e devolve (cabeçalho, tempos, níveis) como vetores sobre a mesma memória
+def mapear(caminho, modo):
+
+    mapa = np.memmap(caminho, dtype='uint8', mode=modo)
+    cabecalho = mapa[:BYTES_CABECALHO].view('uint64')
+    capacidade = int(cabecalho[CAB_CAPACIDADE])
+
+    inicio_niveis = BYTES_CABECALHO + 8 * capacidade
+    tempos = mapa[BYTES_CABECALHO:inicio_niveis].view('int64')
+    niveis = mapa[inicio_niveis:inicio_niveis + 8 * capacidade].view('float64')
+
+    return cabecalho, tempos, niveis
+
+
+# Gravação das séries (apenas um processo escritor por diretório)
+class EscritorSerie:
+
+    def __init__(self, url, diretorio=DIRETORIO_COMPARTILHADO):
+        self.caminho = caminho_serie(url, diretorio)
+        self.mapa = None
+        os.makedirs(diretorio, exist_ok=True)
+
+    # Cria um arquivo novo com a capacidade pedida e o publica por renomeação atômica
+    def _criar(self, capacidade, tempos, niveis, versao):
+
+        temporario = self.caminho + ".tmp"
+
+        with open(temporario, "wb") as arquivo:
+            arquivo.truncate(BYTES_CABECALHO + 16 * capacidade)
+
+        # A capacidade precisa estar no cabeçalho antes de mapear os vetores
+        cabecalho = np.memmap(temporario, dtype='uint64', mode='r+', shape=(BYTES_CABECALHO // 8,))
+        cabecalho[CAB_CAPACIDADE] = capacidade
+        cabecalho[CAB_MAGICO] = MAGICO
+        cabecalho.flush()
+
+        cabecalho, t, v = mapear(temporario, "r+")
+        n = len(tempos)
+        t[:n] = tempos
+        v[:n] = niveis
+        cabecalho[CAB_TAMANHO] = n
+        cabecalho[CAB_VERSAO] = versao
+
+        os.replace(temporario, self.caminho)
+        self.mapa = (cabecalho, t, v)
+
+    # Grava a série completa; apenas as medições além das já gravadas são escritas
+    def escrever(self, tempos, niveis):
+
+        tempos = np.asarray(tempos, dtype='int64')
+        niveis = np.asarray(niveis, dtype='float64')
+
+        if self.mapa is None and os.path.exists(self.caminho):
+            try:
+                self.mapa = mapear(self.caminho, "r+")
+                if int(self.mapa[0][CAB_MAGICO]) != MAGICO:
+                    self.mapa = None
+            except (OSError, ValueError):
+                self.mapa = None
+
+        if self.mapa is None:
+            self._criar(max(CAPACIDADE_INICIAL, 2 * len(tempos)), tempos, niveis, 2)
+            return
+
+        cabecalho, t, v = self.mapa
+        n_antigo = int(cabecalho[CAB_TAMANHO])
+        versao = int(cabecalho[CAB_VERSAO])
+
+        # Só acréscimos são gravados no lugar; reescritas ou falta de espaço geram um arquivo novo
+        acrescimo = n_antigo <= len(tempos) and (n_antigo == 0 or tempos[n_antigo - 1] == t[n_antigo - 1])
+
+        if not acrescimo or len(tempos) > len(t):
+            self._criar(max(CAPACIDADE_INICIAL, 2 * len(tempos)), tempos, niveis, versao + 2)
+            return
+
+        if len(tempos) == n_antigo:
+            return
+
+        cabecalho[CAB_VERSAO] = versao + 1          # ímpar: gravação em andamento
+        t[n_antigo:len(tempos)] = tempos[n_antigo:]
+        v[n_antigo:len(tempos)] = niveis[n_antigo:]
+        cabecalho[CAB_TAMANHO] = len(tempos)
+        cabecalho[CAB_VERSAO] = versao + 2          # par: gravação concluída
+
+
+# Leitura sem cópia das séries gravadas pelo atualizador
+class LeitorSerie:
+
+    def __init__(self, url, diretorio=DIRETORIO_COMPARTILHADO):
+        self.caminho = caminho_serie(url, diretorio)
+        self.mapa = None
+        self.inode = None
+
+    def _remapear_se_necessario(self):
+
+        try:
+            inode = os.stat(self.caminho).st_ino
+        except OSError:
+            self.mapa = None
+            return False
+
+        if self.mapa is None or inode != self.inode:
+            self.mapa = mapear(self.caminho, "r")
+            self.inode = inode
+
+        return int(self.mapa[0][CAB_MAGICO]) == MAGICO
+
+    # Versão atual (leitura O(1) do cabeçalho), ou None se a estação não estiver gravada
+    def versao(self):
+
+        if not self._remapear_se_necessario():
+            return None
+
+        return int(self.mapa[0][CAB_VERSAO])
+
+    # Retorna (tempos, níveis, versão) como vistas somente leitura, ou None
+    def ler(self, tentativas=100):
+
+        for _ in range(tentativas):
+
+            if not self._remapear_se_necessario():
+                return None
+
+            cabecalho, t, v = self.mapa
+            antes = int(cabecalho[CAB_VERSAO])
+
+            if antes % 2:
+                time.sleep(0.0005)
+                continue
+
+            n = int(cabecalho[CAB_TAMANHO])
+
+            if int(cabecalho[CAB_VERSAO]) == antes:
+                return t[:n], v[:n], antes
+
+        return None
+
+
+# Conjunto de leitores do armazenamento compartilhado
+class LojaCompartilhada:
+
+    def __init__(self, diretorio=DIRETORIO_COMPARTILHADO):
+        self.diretorio = diretorio
+        self._leitores = {}
+
+    def leitor(self, url):
+        if url not in self._leitores:
+            self._leitores[url] = LeitorSerie(url, self.diretorio)
+        return self._leitores[url]
+
+
+# Loja configurada pelo ambiente (TIDESAT_SHM), ou None para o modo de processo único
+def loja_do_ambiente():
+    return LojaCompartilhada() if os.environ.get("TIDESAT_SHM") else None
@@ -0,0 +1,411 @@
+'''
+Arquivo que contém as métricas de desempenho do processo: consultas ao cache
+por estação, latência e códigos de resposta da origem, bytes baixados, tempo
+de interpretação dos CSVs, descartes da limpeza, sessões ativas, memória por sessão e percentis da
+duração das execuções (alimentados pelo rastreamento, ver rastreamento.py).
+
+As métricas ficam disponíveis no formato texto do Prometheus em uma porta
+auxiliar (TIDESAT_METRICAS_PORTA, rotas /metrics e /metrics.json) e/ou em
+um arquivo JSON regravado periodicamente (TIDESAT_METRICAS_ARQUIVO).
+
+'''
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import streamlit as st
+
+from rastreamento import ao_finalizar, registrar_falha
+from memoria import bytes_sessao
+
+# Limites (em segundos) dos histogramas de latência
+LIMITES_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 100)
+LIMITES_EXECUCAO = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+# Quantis publicados para as durações de execução e a memória por sessão
+QUANTIS = (0.5, 0.9, 0.99)
+
+# Quantidade de amostras recentes usadas no cálculo dos quantis
+JANELA_QUANTIS = 2048
+
+# Uma sessão é considerada ativa se executou algo nesse intervalo (maior que o intervalo ao vivo máximo)
+SESSAO_ATIVA_S = 20 * 60
+
+# Intervalo mínimo (s) entre duas medições de memória da mesma sessão
+INTERVALO_MEMORIA_S = 60
+
+# Intervalo (s) de regravação do arquivo JSON
+INTERVALO_ARQUIVO_S = 15
+
+
+# Rótulo curto da estação a partir da URL (ex.: ".../est1/est1_out.csv" -> "est1_out")
+def rotulo_estacao(url):
+    return re.sub(r'\.csv$', '', url.rstrip('/').split('/')[-1])
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+
+    pares = list(zip(nomes, valores)) + ([extra] if extra else [])
+
+    if not pares:
+        return ""
+
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class Metrica:
+
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._trava = threading.Lock()
+
+    def cabecalho(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(Metrica):
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.valores = {}
+
+    def incrementar(self, *rotulos, valor=1):
+        with self._trava:
+            self.valores[rotulos] = self.valores.get(rotulos, 0) + valor
+
+    def texto(self):
+        with self._trava:
+            itens = sorted(self.valores.items())
+        return self.cabecalho() + [f"{self.nome}{_formatar_rotulos(self.rotulos, r)} {v}" for r, v in itens]
+
+    def como_dict(self):
+        with self._trava:
+            return {",".join(r) or "total": v for r, v in self.valores.items()}
+
+
+class Medidor(Metrica):
+
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        self.valores = {}
+        self.funcao = funcao  # se definida, o valor é calculado no momento da leitura
+
+    def definir(self, *rotulos, valor):
+        with self._trava:
+            self.valores[rotulos] = valor
+
+    def _atuais(self):
+        if self.funcao is not None:
+            return self.funcao()
+        with self._trava:
+            return dict(self.valores)
+
+    def texto(self):
+        return self.cabecalho() + [f"{self.nome}{_formatar_rotulos(self.rotulos, r)} {v}"
+                                   for r, v in sorted(self._atuais().items())]
+
+    def como_dict(self):
+        return {",".join(r) or "valor": v for r, v in self._atuais().items()}
+
+
+class Histograma(Metrica):
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = np.asarray(limites, dtype='float64')
+        self.series = {}
+
+    def observar(self, *rotulos, valor):
+
+        with self._trava:
+            if rotulos not in self.series:
+                self.series[rotulos] = [np.zeros(len(self.limites) + 1, dtype='int64'), 0.0]
+
+            contagens, _ = self.series[rotulos]
+            contagens[np.searchsorted(self.limites, valor, side='left')] += 1
+            self.series[rotulos][1] += valor
+
+    def texto(self):
+
+        linhas = self.cabecalho()
+
+        with self._trava:
+            itens = sorted((r, c.copy(), s) for r, (c, s) in self.series.items())
+
+        for rotulos, contagens, soma in itens:
+            acumulado = np.cumsum(contagens)
+            for limite, n in zip(list(self.limites) + [float("inf")], acumulado):
+                le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, ('le', le))} {n}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {soma}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {acumulado[-1]}")
+
+        return linhas
+
+    def como_dict(self):
+        with self._trava:
+            return {",".join(r) or "total": {"contagem": int(c.sum()), "soma": s,
+                                             "limites": self.limites.tolist(), "contagens": c.tolist()}
+                    for r, (c, s) in self.series.items()}
+
+
+# Quantis calculados sobre as amostras mais recentes
+class Resumo(Metrica):
+
+    tipo = "summary"
+
+    def __init__(self, nome, ajuda, rotulos=(), janela=JANELA_QUANTIS):
+        super().__init__(nome, ajuda, rotulos)
+        self.janela = janela
+        self.series = {}
+
+    def observar(self, *rotulos, valor):
+        with self._trava:
+            if rotulos not in self.series:
+                self.series[rotulos] = [deque(maxlen=self.janela), 0.0, 0]
+            amostras = self.series[rotulos]
+            amostras[0].append(valor)
+            amostras[1] += valor
+            amostras[2] += 1
+
+    def _quantis(self):
+        with self._trava:
+            itens = sorted((r, np.array(a), s, n) for r, (a, s, n) in self.series.items())
+        return [(r, np.quantile(a, QUANTIS) if len(a) else [np.nan] * len(QUANTIS), s, n) for r, a, s, n in itens]
+
+    def texto(self):
+
+        linhas = self.cabecalho()
+
+        for rotulos, quantis, soma, n in self._quantis():
+            for q, v in zip(QUANTIS, quantis):
+                linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, rotulos, ('quantile', q))} {v}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {soma}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {n}")
+
+        return linhas
+
+    def como_dict(self):
+        return {",".join(r) or "total": {**{f"p{int(q * 100)}": float(v) for q, v in zip(QUANTIS, quantis)},
+                                         "soma": s, "contagem": n}
+                for r, quantis, s, n in self._quantis()}
+
+
+# Sessões vistas recentemente e sua memória medida mais recente
+class RegistroSessoes:
+
+    def __init__(self):
+        self.vistas = {}
+        self.memoria = {}
+        self._trava = threading.Lock()
+
+    def ver(self, sessao):
+        with self._trava:
+            self.vistas[sessao] = time.monotonic()
+
+    def ativas(self):
+
+        limite = time.monotonic() - SESSAO_ATIVA_S
+
+        with self._trava:
+            for sessao in [s for s, t in self.vistas.items() if t < limite]:
+                self.vistas.pop(sessao)
+                self.memoria.pop(sessao, None)
+            return len(self.vistas)
+
+    # Mede a memória da sessão no máximo uma vez por INTERVALO_MEMORIA_S
+    def medir_memoria(self, sessao, estado):
+
+        agora = time.monotonic()
+
+        with self._trava:
+            anterior = self.memoria.get(sessao)
+            if anterior is not None and agora - anterior[1] < INTERVALO_MEMORIA_S:
+                return
+
+        total = sum(bytes_sessao(estado).values())
+
+        with self._trava:
+            self.memoria[sessao] = (total, agora)
+
+    def quantis_memoria(self):
+
+        self.ativas()
+
+        with self._trava:
+            valores = np.array([total for total, _ in self.memoria.values()], dtype='float64')
+
+        if not len(valores):
+            return {}
+
+        quantis = {(str(q),): float(v) for q, v in zip(QUANTIS, np.quantile(valores, QUANTIS))}
+        quantis[("max",)] = float(valores.max())
+
+        return quantis
+
+
+################# MÉTRICAS DO PROCESSO #################
+SESSOES = RegistroSessoes()
+
+CACHE_CONSULTAS = Contador(
+    "tidesat_cache_consultas_total",
+    "Consultas ao cache de estações por resultado (acerto, falta, expirado, compartilhado, pacote).",
+    ("estacao", "resultado"))
+
+CACHE_EXPIRACOES = Contador(
+    "tidesat_cache_expiracoes_total",
+    "Séries descartadas do cache por expiração da validade e baixadas novamente.",
+    ("estacao",))
+
+ORIGEM_LATENCIA = Histograma(
+    "tidesat_origem_latencia_segundos",
+    "Latência das requisições à origem dos dados.",
+    LIMITES_LATENCIA, ("estacao",))
+
+ORIGEM_RESPOSTAS = Contador(
+    "tidesat_origem_respostas_total",
+    "Respostas da origem dos dados por código HTTP (\"erro\" para falhas de conexão).",
+    ("estacao", "status"))
+
+ORIGEM_BYTES = Contador(
+    "tidesat_origem_bytes_total",
+    "Bytes baixados da origem dos dados.",
+    ("estacao",))
+
+LEITURA_CSV = Histograma(
+    "tidesat_leitura_csv_segundos",
+    "Tempo de interpretação dos CSVs das estações.",
+    LIMITES_LATENCIA, ("estacao",))
+
+LIMPEZA_DESCARTES = Contador(
+    "tidesat_limpeza_descartes_total",
+    "Medições reordenadas ou descartadas na limpeza por motivo (fora_de_ordem, duplicada, pico).",
+    ("estacao", "motivo"))
+
+EXECUCOES = Histograma(
+    "tidesat_execucao_segundos",
+    "Duração das execuções da dashboard (script completo e fragmentos do modo ao vivo).",
+    LIMITES_EXECUCAO, ("execucao",))
+
+EXECUCOES_QUANTIS = Resumo(
+    "tidesat_execucao_quantis_segundos",
+    "Quantis da duração das execuções recentes.",
+    ("execucao",))
+
+SESSOES_ATIVAS = Medidor(
+    "tidesat_sessoes_ativas",
+    "Sessões com alguma execução nos últimos 20 minutos.",
+    funcao=lambda: {(): SESSOES.ativas()})
+
+MEMORIA_SESSAO = Medidor(
+    "tidesat_sessao_memoria_bytes",
+    "Memória guardada no estado das sessões ativas (quantis e máximo).",
+    ("quantil",), funcao=SESSOES.quantis_memoria)
+
+METRICAS = [CACHE_CONSULTAS, CACHE_EXPIRACOES, ORIGEM_LATENCIA, ORIGEM_RESPOSTAS, ORIGEM_BYTES,
+            LEITURA_CSV, LIMPEZA_DESCARTES, EXECUCOES, EXECUCOES_QUANTIS, SESSOES_ATIVAS, MEMORIA_SESSAO]
+
+
+# Registra a duração de cada execução rastreada e a sessão que a executou
+def registrar_execucao(rastreio):
+
+    segundos = rastreio.duracao_ms / 1e3
+    EXECUCOES.observar(rastreio.nome, valor=segundos)
+    EXECUCOES_QUANTIS.observar(rastreio.nome, valor=segundos)
+
+    if rastreio.sessao is not None:
+        SESSOES.ver(rastreio.sessao)
+
+
+ao_finalizar(registrar_execucao)
+
+
+# Todas as métricas no formato texto do Prometheus
+def texto_prometheus():
+    return "\n".join(linha for metrica in METRICAS for linha in metrica.texto()) + "\n"
+
+
+# Todas as métricas como dicionário serializável em JSON
+def metricas_json():
+    return {"gerado_em": time.time(), **{metrica.nome: metrica.como_dict() for metrica in METRICAS}}
+
+
+class ManipuladorMetricas(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+
+        if self.path.startswith("/metrics.json"):
+            corpo, tipo = json.dumps(metricas_json()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            corpo, tipo = texto_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+# Regrava o arquivo JSON das métricas periodicamente (gravação atômica)
+def gravar_arquivo_periodicamente(caminho, intervalo=INTERVALO_ARQUIVO_S):
+
+    while True:
+        temporario = f"{caminho}.tmp"
+
+        try:
+            with open(temporario, "w") as arquivo:
+                json.dump(metricas_json(), arquivo)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            registrar_falha("metricas", f"falha ao gravar {caminho}: {e}")
+
+        time.sleep(intervalo)
+
+
+# Inicia (uma única vez por processo) a porta auxiliar e/ou o arquivo JSON configurados no ambiente
+@st.cache_resource(show_spinner=False)
+def iniciar_exportacao():
+
+    porta = os.environ.get("TIDESAT_METRICAS_PORTA")
+    arquivo = os.environ.get("TIDESAT_METRICAS_ARQUIVO")
+    servidor = None
+
+    if porta:
+        try:
+            servidor = ThreadingHTTPServer(("0.0.0.0", int(porta)), ManipuladorMetricas)
+            servidor.daemon_threads = True
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        except OSError as e:
+            # Outro processo do mesmo host pode já estar servindo a porta
+            registrar_falha("metricas", f"porta {porta} indisponível: {e}")
+
+    if arquivo:
+        threading.Thread(target=gravar_arquivo_periodicamente, args=(arquivo,), daemon=True).start()
+
+    return servidor
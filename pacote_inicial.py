@@ -0,0 +1,169 @@
+'''
+Arquivo que contém o pacote inicial das estações, gerado na implantação (ver
+.github/workflows/main.yml) e enviado junto com a aplicação. Para cada
+estação cadastrada, o pacote guarda a série já limpa em vetores colunares
+(.npy), os agregados horários e diários (ver agregados.py), um resumo e a
+posição lida do arquivo da origem.
+
+Uma instância recém-iniciada mapeia os vetores do pacote em memória (sem
+leitura nem interpretação) e baixa da origem apenas o trecho acrescentado
+depois da geração (ver cache_estacoes.baixar_cauda_csv), de modo que a
+primeira exibição após uma implantação não espera o download de todo o
+histórico. Sem pacote (ou com TIDESAT_PACOTE=0), o cache baixa tudo como
+antes.
+
+Uso: python pacote_inicial.py [--diretorio pacote_inicial]
+
+'''
+
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from cache_estacoes import baixar_csv_estacao, ler_csv_estacao, posicao_conteudo, PosicaoOrigem, ErroDadosEstacao
+from alinhamento import vetores_estacao
+from limpeza import limpar_df
+from agregados import AgregadosEstacao, salvar_agregados, caminho_agregados
+from agendador import urls_cadastradas
+from rastreamento import registrar_falha
+
+# Diretório do pacote (relativo à raiz da aplicação, como o diretório de dados)
+DIRETORIO_PACOTE = os.environ.get("TIDESAT_PACOTE", "pacote_inicial")
+
+FORMATO = 1
+MANIFESTO = "manifesto.json"
+
+
+# Prefixo dos arquivos da estação a partir da URL
+def nome_estacao(url):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', url.rstrip('/').split('/')[-1])
+
+
+# Baixa, limpa e grava uma estação no pacote; retorna a entrada do manifesto
+def gravar_estacao(url, diretorio):
+
+    texto = baixar_csv_estacao(url)
+    df, _, _ = limpar_df(ler_csv_estacao(texto))
+    tempos, niveis = vetores_estacao(df)
+    nome = nome_estacao(url)
+
+    np.save(os.path.join(diretorio, f"{nome}.tempos.npy"), tempos)
+    np.save(os.path.join(diretorio, f"{nome}.niveis.npy"), niveis)
+    np.save(os.path.join(diretorio, f"{nome}.qualidade.npy"), df['qualidade'].to_numpy())
+
+    agregados = AgregadosEstacao()
+    agregados.atualizar(tempos, niveis, 1)
+    salvar_agregados(agregados, caminho_agregados(url, diretorio))
+
+    posicao = posicao_conteudo(texto.encode("utf-8"))
+    validos = niveis[~np.isnan(niveis)]
+    minimo, maximo = agregados.extremos()
+
+    return {
+        "arquivo": nome,
+        "medicoes": len(tempos),
+        "primeiro": int(tempos[0]),
+        "ultimo": int(tempos[-1]),
+        "nivel": float(validos[-1]) if len(validos) else None,
+        "minimo": minimo,
+        "maximo": maximo,
+        "origem": {"tamanho": posicao.tamanho, "cabecalho": posicao.cabecalho.decode("utf-8"),
+                   "ultima_linha": posicao.ultima_linha.decode("utf-8")},
+    }
+
+
+# Gera o pacote de todas as estações; o manifesto é gravado por último (pacote incompleto não é usado)
+def gerar_pacote(diretorio=DIRETORIO_PACOTE, urls=None):
+
+    os.makedirs(diretorio, exist_ok=True)
+    estacoes = {}
+
+    for url in urls or urls_cadastradas():
+        inicio = time.perf_counter()
+
+        try:
+            estacoes[url] = gravar_estacao(url, diretorio)
+        except ErroDadosEstacao as e:
+            registrar_falha("pacote", e, url=url)
+            continue
+
+        print(f"[pacote] {url}: {estacoes[url]['medicoes']} medições em {time.perf_counter() - inicio:.1f} s",
+              flush=True)
+
+    temporario = os.path.join(diretorio, MANIFESTO + ".tmp")
+
+    with open(temporario, "w") as arquivo:
+        json.dump({"formato": FORMATO, "gerado_em": time.time(), "estacoes": estacoes}, arquivo, indent=1)
+
+    os.replace(temporario, os.path.join(diretorio, MANIFESTO))
+
+    return estacoes
+
+
+# Leitura do pacote: os vetores de cada estação são mapeados do disco somente quando pedidos
+class PacoteInicial:
+
+    def __init__(self, diretorio, manifesto):
+        self.diretorio = diretorio
+        self.gerado_em = manifesto["gerado_em"]
+        self.estacoes = manifesto["estacoes"]
+
+    def __contains__(self, url):
+        return url in self.estacoes
+
+    # (tempos, níveis, qualidade) da estação, somente leitura, ou None se ela não estiver no pacote
+    def serie(self, url):
+
+        if url not in self.estacoes:
+            return None
+
+        prefixo = os.path.join(self.diretorio, self.estacoes[url]["arquivo"])
+
+        try:
+            return tuple(np.load(f"{prefixo}.{campo}.npy", mmap_mode='r')
+                         for campo in ("tempos", "niveis", "qualidade"))
+        except (OSError, ValueError) as e:
+            registrar_falha("pacote", f"erro ao ler: {e}", url=url)
+            return None
+
+    # Posição no arquivo da origem na geração do pacote
+    def posicao(self, url):
+        origem = self.estacoes[url]["origem"]
+        return PosicaoOrigem(origem["tamanho"], origem["cabecalho"].encode("utf-8"),
+                             origem["ultima_linha"].encode("utf-8"))
+
+    # Arquivo dos agregados da estação no pacote
+    def caminho_agregados(self, url):
+        return caminho_agregados(url, self.diretorio)
+
+
+# Pacote do diretório configurado (TIDESAT_PACOTE), ou None se não houver um pacote completo e compatível
+def pacote_do_ambiente(diretorio=DIRETORIO_PACOTE):
+
+    if diretorio in ("", "0"):
+        return None
+
+    try:
+        with open(os.path.join(diretorio, MANIFESTO)) as arquivo:
+            manifesto = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+    if manifesto.get("formato") != FORMATO:
+        return None
+
+    return PacoteInicial(diretorio, manifesto)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Gera o pacote inicial das estações para a implantação.")
+    parser.add_argument("--diretorio", default=DIRETORIO_PACOTE)
+    args = parser.parse_args()
+
+    estacoes = gerar_pacote(args.diretorio)
+    print(f"[pacote] {len(estacoes)} estações em {args.diretorio}", flush=True)
@@ -0,0 +1,75 @@
+'''
+Arquivo que contém os perfis de comportamento das dashboards. Cada perfil
+declara, uma única vez na inicialização, as personalizações de uma dashboard
+(ex.: Estrela limita a data inicial pela EST6, usa a faixa global da EST1 no
+eixo Y e oferece a comparação entre estações; as dashboards do Guaíba
+oferecem a comparação e a defasagem da cadeia IDP1 → SPH4 → VDS1 → ITA1). Os ganchos são respondidos a
+partir do índice de consultas das estações, sem downloads adicionais, e as
+dashboards sem personalização não pagam nada por eles.
+
+'''
+
+import pandas as pd
+
+from main_config import CADEIA_GUAIBA
+from main_estrela_config import CADEIA_TAQUARI
+from indice import obter_arquivo_indices
+
+
+class PerfilInquilino:
+
+    def __init__(self, estacao_inicio=None, estacao_faixa_y=None, teto_y_outras=None,
+                 estacoes_comparacao=None, cadeia_defasagem=None):
+        self.estacao_inicio = estacao_inicio
+        self.estacao_faixa_y = estacao_faixa_y
+        self.teto_y_outras = teto_y_outras
+        self.estacoes_comparacao = estacoes_comparacao or []
+        self.cadeia_defasagem = cadeia_defasagem or []
+
+    # Se a dashboard oferece o gráfico de comparação entre estações
+    @property
+    def comparar(self):
+        return bool(self.estacoes_comparacao)
+
+    # Data mínima permitida para o início do período (None = sem limite)
+    def inicio_minimo(self, estacoes_info, fuso):
+
+        if self.estacao_inicio is None:
+            return None
+
+        indice = obter_arquivo_indices().obter(estacoes_info[self.estacao_inicio]["url"])
+
+        if not len(indice):
+            return None
+
+        return pd.Timestamp(int(indice.tempos[0]), tz='UTC').tz_convert(fuso).date()
+
+    # Faixa do eixo Y para períodos longos (None = faixa da própria estação)
+    def faixa_y(self, estacoes_info, estacao_selecionada):
+
+        if self.estacao_faixa_y is None:
+            return None
+
+        minimo, maximo = obter_arquivo_indices().obter(estacoes_info[self.estacao_faixa_y]["url"]).extremos()
+
+        if estacao_selecionada != self.estacao_faixa_y and self.teto_y_outras is not None:
+            maximo = self.teto_y_outras
+
+        return minimo, maximo
+
+
+################# PERFIS #################
+PERFIL_PADRAO = PerfilInquilino()
+
+PERFIL_ESTRELA = PerfilInquilino(
+    estacao_inicio="EST6",
+    estacao_faixa_y="EST1",
+    teto_y_outras=21,
+    estacoes_comparacao=["EST1", "EST2", "EST3", "EST6"],
+    cadeia_defasagem=CADEIA_TAQUARI
+)
+
+PERFIL_GUAIBA = PerfilInquilino(
+    estacoes_comparacao=CADEIA_GUAIBA,
+    cadeia_defasagem=CADEIA_GUAIBA
+)
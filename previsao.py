@@ -0,0 +1,326 @@
+'''
+Arquivo que contém a previsão de curto prazo do nível de cada estação (até
+HORIZONTE_H horas à frente, com faixas de incerteza de 80% e 95%).
+
+O modelo de cada estação combina:
+    - constituintes harmônicas da maré (M2, S2, N2, K1, O1, M4), ajustadas por
+      mínimos quadrados nos últimos DIAS_AJUSTE dias e mantidas apenas quando
+      explicam ao menos LIMIAR_MARE da variância (estações com maré, como a
+      RIG1); as constituintes que o período com dados não consegue separar
+      (critério de Rayleigh) ficam de fora;
+    - uma tendência linear ou quadrática das últimas 6 h do resíduo, projetada
+      com amortecimento (a inclinação decai com constante de tempo τ).
+
+O grau da tendência e τ são escolhidos pelo menor erro médio nas previsões
+que o modelo teria feito a cada 10 min dos últimos DIAS_VALIDACAO dias, e os
+erros dessas previsões, por horizonte, dão as faixas de incerteza. Todo o
+ajuste é vetorizado sobre a grade de 10 min.
+
+Os ajustes rodam em um grupo de processos (TIDESAT_PREVISAO_PROCESSOS, 0
+desliga a previsão), disparados apenas quando a estação recebe medições novas
+(ver cache_estacoes.ao_atualizar). A projeção é calculada no ajuste e a
+dashboard apenas a lê: nenhuma execução espera um ajuste.
+
+'''
+
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import streamlit as st
+from numpy.lib.stride_tricks import sliding_window_view
+
+from cache_estacoes import ao_atualizar
+from alinhamento import vetores_estacao, reamostrar, CADENCIA_NOMINAL
+from rastreamento import registrar_falha
+
+PROCESSOS = int(os.environ.get("TIDESAT_PREVISAO_PROCESSOS", 1))
+
+# Horizonte da previsão (h) e passos de 10 min até ele
+HORIZONTE_H = 12
+PASSOS_HORA = 3600 * 10**9 // CADENCIA_NOMINAL
+PASSOS_HORIZONTE = HORIZONTE_H * PASSOS_HORA
+
+# Dados usados no ajuste das constituintes e no cálculo dos erros
+DIAS_AJUSTE = 30
+DIAS_VALIDACAO = 7
+
+# Janela (em passos de 10 min) da tendência e medições válidas necessárias nela
+JANELA_TENDENCIA = 6 * PASSOS_HORA
+MINIMO_TENDENCIA = 12
+
+# Previsões passadas com erro conhecido necessárias, em cada horizonte, para haver previsão
+MINIMO_ORIGENS = 36
+
+# Períodos (h) das constituintes, na ordem em que entram no modelo
+CONSTITUINTES = {"M2": 12.4206012, "K1": 23.93447213, "S2": 12.0, "O1": 25.81933871, "M4": 6.210300601,
+                 "N2": 12.65834751}
+
+# Dados mínimos (h) para ajustar alguma constituinte e fração mínima da variância explicada
+MINIMO_HORAS_MARE = 48
+LIMIAR_MARE = 0.2
+
+# Candidatos da tendência: (grau, τ em horas); τ = 0 mantém o nível atual, τ = inf não amortece
+CANDIDATOS = [(1, 0.0)] + [(grau, tau) for grau in (1, 2) for tau in (1.0, 3.0, 6.0, 12.0, np.inf)]
+
+FAIXAS = {80: (10, 90), 95: (2.5, 97.5)}
+
+Previsao = namedtuple("Previsao", ["t_ref", "tempos", "nivel", "inferior_80", "superior_80", "inferior_95",
+                                   "superior_95", "modelo", "erro_medio"])
+
+
+# Constituintes separáveis em `horas` de dados (critério de Rayleigh: 1/|f1 - f2| <= duração)
+def constituintes_separaveis(horas):
+
+    if horas < MINIMO_HORAS_MARE:
+        return []
+
+    escolhidas = []
+
+    for nome, periodo in CONSTITUINTES.items():
+        if all(1 / abs(1 / periodo - 1 / CONSTITUINTES[outra]) <= horas for outra in escolhidas):
+            escolhidas.append(nome)
+
+    return escolhidas
+
+
+# Matriz do modelo harmônico: constante, cosseno e seno de cada constituinte (x em horas)
+def matriz_harmonica(x, constituintes):
+
+    colunas = [np.ones_like(x)]
+
+    for nome in constituintes:
+        angulo = 2 * np.pi * x / CONSTITUINTES[nome]
+        colunas += [np.cos(angulo), np.sin(angulo)]
+
+    return np.column_stack(colunas)
+
+
+# Ajusta a maré; retorna (coeficientes, constituintes), com apenas o nível médio se não houver maré
+def ajustar_mare(x, y):
+
+    validos = ~np.isnan(y)
+    media = np.array([np.mean(y[validos])])
+    constituintes = constituintes_separaveis(x[validos][-1] - x[validos][0])
+
+    if not constituintes:
+        return media, []
+
+    matriz = matriz_harmonica(x[validos], constituintes)
+    coeficientes = np.linalg.lstsq(matriz, y[validos], rcond=None)[0]
+
+    variancia = np.var(y[validos])
+    explicada = 1 - np.var(y[validos] - matriz @ coeficientes) / variancia if variancia > 0 else 0.0
+
+    if explicada < LIMIAR_MARE:
+        return media, []
+
+    return coeficientes, constituintes
+
+
+# Deslocamento amortecido: ∫ e^(-s/τ) ds de 0 a h (h sem amortecimento, 0 com τ = 0)
+def amortecido(horas, tau):
+
+    if tau == 0:
+        return np.zeros_like(horas)
+
+    if np.isinf(tau):
+        return horas
+
+    return tau * (1 - np.exp(-horas / tau))
+
+
+# Coeficientes da tendência (mínimos quadrados ponderados pela validade) de cada janela de resíduos
+def coeficientes_tendencia(janelas, grau):
+
+    x = (np.arange(JANELA_TENDENCIA) - (JANELA_TENDENCIA - 1)) / PASSOS_HORA
+    matriz = np.vander(x, grau + 1, increasing=True)
+    pesos = ~np.isnan(janelas)
+    valores = np.where(pesos, janelas, 0.0)
+
+    normal = np.einsum('ol,li,lj->oij', pesos.astype(float), matriz, matriz) + 1e-9 * np.eye(grau + 1)
+    lado_direito = np.einsum('ol,li->oi', valores, matriz)
+
+    return np.linalg.solve(normal, lado_direito[..., None])[..., 0]
+
+
+# Projeção da tendência nos horizontes `horas` para cada linha de coeficientes
+def projetar_tendencia(coeficientes, horas, tau):
+
+    deslocamento = amortecido(horas, tau)
+    projecao = coeficientes[:, :1] + coeficientes[:, 1:2] * deslocamento
+
+    if coeficientes.shape[1] > 2:
+        projecao = projecao + coeficientes[:, 2:3] * deslocamento ** 2
+
+    return projecao
+
+
+# Ajusta o modelo da estação e calcula a projeção (executado nos processos de previsão).
+# Retorna None se não houver dados suficientes.
+def ajustar_previsao(tempos, niveis):
+
+    validos = ~np.isnan(niveis)
+
+    if not validos.any():
+        return None
+
+    t_ref = int(tempos[validos][-1])
+    n = DIAS_AJUSTE * 24 * PASSOS_HORA
+    grade = t_ref - np.arange(n - 1, -1, -1, dtype='int64') * CADENCIA_NOMINAL
+    y = reamostrar(tempos, niveis, grade, CADENCIA_NOMINAL)
+
+    # Maré na grade (x em horas, 0 na última medição) e resíduo para a tendência
+    x = (grade - t_ref) / 3.6e12
+    coeficientes_mare, constituintes = ajustar_mare(x, y)
+    residuo = y - matriz_harmonica(x, constituintes) @ coeficientes_mare
+
+    # Previsões passadas: origens dos últimos DIAS_VALIDACAO dias com o horizonte inteiro já medido
+    horas = np.arange(1, PASSOS_HORIZONTE + 1) / PASSOS_HORA
+    primeira = max(JANELA_TENDENCIA - 1, n - 1 - PASSOS_HORIZONTE - DIAS_VALIDACAO * 24 * PASSOS_HORA)
+    origens = np.arange(primeira, n - PASSOS_HORIZONTE)
+
+    janelas = sliding_window_view(residuo, JANELA_TENDENCIA)[origens - JANELA_TENDENCIA + 1]
+    suficientes = np.sum(~np.isnan(janelas), axis=1) >= MINIMO_TENDENCIA
+    origens, janelas = origens[suficientes], janelas[suficientes]
+    observados = residuo[origens[:, None] + np.arange(1, PASSOS_HORIZONTE + 1)]
+
+    if np.min(np.sum(~np.isnan(observados), axis=0)) < MINIMO_ORIGENS:
+        return None
+
+    coeficientes = {grau: coeficientes_tendencia(janelas, grau) for grau in (1, 2)}
+    erros = {candidato: observados - projetar_tendencia(coeficientes[candidato[0]], horas, candidato[1])
+             for candidato in CANDIDATOS}
+    escolhido = min(CANDIDATOS, key=lambda candidato: np.nanmean(np.abs(erros[candidato])))
+    grau, tau = escolhido
+
+    # Projeção a partir da última janela (a tendência precisa de dados recentes)
+    ultima = residuo[-JANELA_TENDENCIA:][None, :]
+
+    if np.sum(~np.isnan(ultima)) < MINIMO_TENDENCIA:
+        return None
+
+    tendencia = projetar_tendencia(coeficientes_tendencia(ultima, grau), horas, tau)[0]
+    nivel = matriz_harmonica(horas, constituintes) @ coeficientes_mare + tendencia
+
+    # Faixas: quantis dos erros passados em cada horizonte, sem estreitar com o horizonte
+    faixas = {}
+    for confianca, (baixo, alto) in FAIXAS.items():
+        quantis = np.nanquantile(erros[escolhido], [baixo / 100, alto / 100], axis=0)
+        faixas[confianca] = (nivel + np.minimum.accumulate(quantis[0]), nivel + np.maximum.accumulate(quantis[1]))
+
+    descricao = "+".join(constituintes) or "sem maré"
+    if tau == 0:
+        descricao += "; nível atual"
+    else:
+        descricao += f"; tendência grau {grau}, " + ("sem amortecimento" if np.isinf(tau) else f"τ = {tau:g} h")
+
+    return Previsao(t_ref, t_ref + np.arange(1, PASSOS_HORIZONTE + 1, dtype='int64') * CADENCIA_NOMINAL, nivel,
+                    *faixas[80], *faixas[95], descricao, float(np.nanmean(np.abs(erros[escolhido]))))
+
+
+# Modelos ajustados de todas as estações; cada estação tem no máximo um ajuste em andamento
+class Previsor:
+
+    def __init__(self, processos=PROCESSOS):
+        self.processos = processos
+        self.executor = None
+        self.modelos = {}  # url -> (marca, Previsao ou None)
+        self.pendentes = {}  # url -> (marca, tempos, níveis) mais recentes ainda não ajustados
+        self.em_andamento = set()
+        self.trava = threading.Lock()
+
+    def _novo_executor(self):
+        # "spawn": os processos não herdam as threads e travas do servidor
+        return ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context("spawn"))
+
+    # Quando os processos não conseguem iniciar (script principal sem proteção __main__), ajusta em threads
+    def _executor_threads(self, motivo):
+        registrar_falha("previsao", f"grupo de processos indisponível ({motivo}); ajustes em threads")
+        self.executor = ThreadPoolExecutor(self.processos, thread_name_prefix="previsao")
+
+    # Agenda o ajuste se a estação tem medições novas (chamado pelo cache; apenas copia o trecho usado)
+    def agendar(self, url, df):
+
+        tempos, niveis = vetores_estacao(df)
+
+        if not len(tempos):
+            return
+
+        marca = (len(tempos), int(tempos[-1]))
+        inicio = np.searchsorted(tempos, tempos[-1] - DIAS_AJUSTE * 24 * 3600 * 10**9, side='left')
+
+        with self.trava:
+            if self.modelos.get(url, (None,))[0] == marca:
+                return
+
+            self.pendentes[url] = (marca, tempos[inicio:].copy(), niveis[inicio:].copy())
+
+            if url not in self.em_andamento:
+                self._submeter(url)
+
+    # Envia o ajuste mais recente da estação aos processos (com a trava)
+    def _submeter(self, url):
+
+        marca, tempos, niveis = self.pendentes.pop(url)
+
+        if self.executor is None:
+            self.executor = self._novo_executor()
+
+        try:
+            futuro = self.executor.submit(ajustar_previsao, tempos, niveis)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._executor_threads(e)
+            futuro = self.executor.submit(ajustar_previsao, tempos, niveis)
+
+        futuro.argumentos = (tempos, niveis)
+        self.em_andamento.add(url)
+        futuro.add_done_callback(lambda f: self._concluir(url, marca, f))
+
+    def _concluir(self, url, marca, futuro):
+
+        try:
+            previsao = futuro.result()
+        except BrokenProcessPool as e:
+            # Processo encerrado durante o ajuste: refaz o mesmo trecho em threads
+            with self.trava:
+                self._executor_threads(e)
+                self.em_andamento.discard(url)
+                self.pendentes.setdefault(url, (marca,) + futuro.argumentos)
+                self._submeter(url)
+            return
+        except Exception as e:
+            registrar_falha("previsao", e, url=url)
+            previsao = None
+
+        with self.trava:
+            self.modelos[url] = (marca, previsao)
+            self.em_andamento.discard(url)
+
+            if url in self.pendentes:
+                self._submeter(url)
+
+    # Previsão mais recente da estação (None enquanto não houver); com `df`, agenda o ajuste se necessário
+    def obter(self, url, df=None):
+
+        if df is not None:
+            self.agendar(url, df)
+
+        return self.modelos.get(url, (None, None))[1]
+
+
+# Instância única do previsor, inscrita nas atualizações do cache do processo (None se desligado)
+@st.cache_resource(show_spinner=False)
+def obter_previsor():
+
+    if PROCESSOS <= 0:
+        return None
+
+    previsor = Previsor()
+    ao_atualizar(previsor.agendar)
+
+    return previsor
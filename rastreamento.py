@@ -0,0 +1,255 @@
+'''
+Arquivo que contém o rastreamento das execuções da dashboard. Cada execução
+do script (ou de um fragmento do modo ao vivo) abre um rastreio e as etapas
+relevantes (download, interpretação do CSV, conversão de fuso, filtragem,
+montagem de figuras e mapas, codificação de imagens e serialização dos
+gráficos) registram trechos com duração e quantidade de bytes.
+
+Ao final da execução o rastreio é emitido como uma linha JSON no logger
+"tidesat.rastreio" (desligado com TIDESAT_RASTREIO=0) e fica disponível para
+o painel de depuração (?debug=rastreio). As falhas dos componentes que rodam
+fora das execuções (ver registrar_falha) usam o mesmo logger. Fora de um rastreio, os trechos não
+custam nada além de uma consulta à variável da thread.
+
+'''
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Quantidade de sessões cujo último rastreio é mantido para o painel de depuração
+MAXIMO_SESSOES = 256
+
+logger = logging.getLogger("tidesat.rastreio")
+
+if os.environ.get("TIDESAT_RASTREIO", "1") != "0" and not logger.handlers:
+    _saida = logging.StreamHandler()
+    _saida.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_saida)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_local = threading.local()
+_ultimos = OrderedDict()
+_trava = threading.Lock()
+
+# Funções chamadas com cada rastreio finalizado (ex.: métricas, ver metricas.py)
+_ouvintes = []
+
+
+class Rastreio:
+
+    def __init__(self, nome, sessao=None):
+        self.nome = nome
+        self.sessao = sessao
+        self.id = uuid.uuid4().hex[:12]
+        self.inicio = time.perf_counter()
+        self.duracao_ms = None
+        self.trechos = []
+        self.profundidade = 0
+        self.detalhado = False
+        self.erro = None
+
+    # Duração até agora (ou total, se já finalizado)
+    @property
+    def decorrido_ms(self):
+        return self.duracao_ms if self.duracao_ms is not None else (time.perf_counter() - self.inicio) * 1e3
+
+    def finalizar(self, erro=None):
+        self.duracao_ms = (time.perf_counter() - self.inicio) * 1e3
+        self.erro = erro
+
+    def como_dict(self):
+        return {
+            "evento": "execucao",
+            "execucao": self.nome,
+            "id": self.id,
+            "sessao": self.sessao,
+            "duracao_ms": round(self.decorrido_ms, 3),
+            "erro": self.erro,
+            "trechos": [trecho.como_dict() for trecho in self.trechos],
+        }
+
+
+class Trecho:
+
+    __slots__ = ("rastreio", "nome", "atributos", "inicio_ms", "duracao_ms", "bytes", "profundidade", "_inicio")
+
+    def __init__(self, rastreio, nome, atributos):
+        self.rastreio = rastreio
+        self.nome = nome
+        self.atributos = atributos
+        self.bytes = None
+        self.duracao_ms = None
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        self.inicio_ms = (self._inicio - self.rastreio.inicio) * 1e3
+        self.profundidade = self.rastreio.profundidade
+        self.rastreio.profundidade += 1
+        self.rastreio.trechos.append(self)
+        return self
+
+    def __exit__(self, *excecao):
+        self.duracao_ms = (time.perf_counter() - self._inicio) * 1e3
+        self.rastreio.profundidade -= 1
+        return False
+
+    def como_dict(self):
+
+        dados = {"nome": self.nome, "inicio_ms": round(self.inicio_ms, 3),
+                 "duracao_ms": None if self.duracao_ms is None else round(self.duracao_ms, 3),
+                 "nivel": self.profundidade}
+
+        if self.bytes is not None:
+            dados["bytes"] = int(self.bytes)
+
+        if self.atributos:
+            dados.update(self.atributos)
+
+        return dados
+
+
+# Trecho usado fora de um rastreio: aceita as mesmas operações e não registra nada
+class TrechoNulo:
+
+    bytes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+
+TRECHO_NULO = TrechoNulo()
+
+
+# Rastreio ativo na thread atual (None fora de uma execução rastreada)
+def rastreio_atual():
+    return getattr(_local, "rastreio", None)
+
+
+# Se a execução atual pediu medidas que custam trabalho extra (ex.: bytes serializados)
+def rastreio_detalhado():
+    rastreio = rastreio_atual()
+    return rastreio is not None and rastreio.detalhado
+
+
+# Abre um trecho no rastreio ativo: `with trecho("filtro", linhas=n) as t: ...; t.bytes = ...`
+def trecho(nome, **atributos):
+
+    rastreio = rastreio_atual()
+
+    if rastreio is None:
+        return TRECHO_NULO
+
+    return Trecho(rastreio, nome, atributos)
+
+
+# Decorador que registra a função como um trecho
+def rastreado(nome):
+
+    def envolver(funcao):
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with trecho(nome):
+                return funcao(*args, **kwargs)
+
+        return envolvida
+
+    return envolver
+
+
+# Identificador da sessão do Streamlit que executa a thread atual
+def _sessao_atual():
+
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        contexto = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+
+    return contexto.session_id if contexto is not None else None
+
+
+# Decorador que abre um rastreio por execução; dentro de outra execução rastreada vira um trecho
+def execucao_rastreada(nome):
+
+    def envolver(funcao):
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+
+            if rastreio_atual() is not None:
+                with trecho(nome):
+                    return funcao(*args, **kwargs)
+
+            rastreio = Rastreio(nome, _sessao_atual())
+            _local.rastreio = rastreio
+            erro = None
+
+            try:
+                return funcao(*args, **kwargs)
+            except BaseException as e:
+                # st.stop() e st.rerun() também chegam aqui como exceções
+                erro = type(e).__name__
+                raise
+            finally:
+                _local.rastreio = None
+                rastreio.finalizar(erro)
+                registrar_rastreio(rastreio)
+
+        return envolvida
+
+    return envolver
+
+
+# Emite o rastreio finalizado no log estruturado e o guarda como o último da sessão
+def registrar_rastreio(rastreio):
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(rastreio.como_dict(), ensure_ascii=False, default=str))
+
+    with _trava:
+        _ultimos[(rastreio.sessao, rastreio.nome)] = rastreio
+        _ultimos.move_to_end((rastreio.sessao, rastreio.nome))
+
+        while len(_ultimos) > MAXIMO_SESSOES:
+            _ultimos.popitem(last=False)
+
+    for ouvinte in list(_ouvintes):
+        ouvinte(rastreio)
+
+
+# Emite no log estruturado a falha de um componente (cache, agendador, alertas, API...), com o
+# rastreio em andamento, se houver. Com TIDESAT_RASTREIO=0 a falha segue para o logging padrão.
+def registrar_falha(componente, mensagem, **campos):
+
+    rastreio = rastreio_atual()
+    registro = {"evento": "falha", "componente": componente, "mensagem": str(mensagem),
+                "rastreio": None if rastreio is None else rastreio.id, **campos}
+
+    logger.warning(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+# Registra uma função a ser chamada com cada rastreio finalizado
+def ao_finalizar(funcao):
+    if funcao not in _ouvintes:
+        _ouvintes.append(funcao)
+    return funcao
+
+
+# Último rastreio finalizado de uma execução da sessão
+def ultimo_rastreio(sessao, nome):
+    with _trava:
+        return _ultimos.get((sessao, nome))
@@ -6,25 +6,65 @@ para o correto funcionamento de ambos os scripts.
 '''
 
 from datetime import timedelta
-import requests
+from collections import OrderedDict
 import base64
+import threading
 import streamlit as st
-from io import StringIO
 import plotly.express as px
+import plotly.graph_objects as go
 import pydeck as pdk
 import pandas as pd
 import pytz
 import hmac 
 import numpy as np
 
-from main_config import TIMEZONE_PADRAO 
+from main_config import TIMEZONE_PADRAO, INTERVALO_AO_VIVO
+from cache_estacoes import obter_cache, ErroDadosEstacao
+from correlacao import obter_analisador
+from agregados import obter_arquivo_agregados, comparacao_anual
+from indice import obter_arquivo_indices
+from memoria import relatorio_memoria, formatar_bytes
+from estatisticas import obter_arquivo_prefixos, resumo_periodo, cota_numerica
+from perfis import PERFIL_PADRAO
+from alinhamento import vetores_estacao, alinhar_estacoes, diferenca_estacoes, limites_globais, grade_no_fuso, CADENCIA_NOMINAL
+from rastreamento import trecho, rastreado, execucao_rastreada, rastreio_atual, rastreio_detalhado, ultimo_rastreio
+from metricas import iniciar_exportacao, SESSOES
+from api_dados import iniciar_api
+from agendador import iniciar_agendador
+from previsao import obter_previsor, PASSOS_HORA
+from exportacao import exportar, periodo_ns, nome_arquivo, FORMATOS
+
+# Configuração comum dos gráficos plotly
+CONFIG_GRAFICO = {
+    "scrollZoom": True,
+    "responsive": True,
+    "displaylogo": False
+}
+
+# Acima deste número de dias o gráfico principal usa os agregados horários
+LIMITE_DIAS_BRUTOS = 31
+
+# Nos agregados horários, só interrompem a linha as lacunas maiores que duas horas
+LACUNA_MINIMA_AGREGADOS = 2 * 3600 * 10**9
+
+# Dias exibidos na completude diária da aba de informações
+DIAS_COMPLETUDE = 14
+
+# Horizonte (h) da previsão exibida junto à velocidade
+HORIZONTE_INDICADOR = 3
+
+# Intervalos (em segundos) oferecidos no modo ao vivo
+OPCOES_INTERVALO_AO_VIVO = [30, 60, 120, 300, 600, 900]
+
+# Figuras do modo ao vivo mantidas no processo (compartilhadas entre as sessões da mesma visualização)
+FIGURAS_AO_VIVO = 32
 
 # Verifica se o fuso horário está definido
 if "fuso_selecionado" not in st.session_state:
     st.session_state["fuso_selecionado"] = TIMEZONE_PADRAO  # Valor padrão   
 
 # Função para configurar a autenticação por senha (para tidesat-barroso)
-def checar_senha(lang):
+def checar_senha(lang, chave_senha="value"):
     if st.session_state.get("senha_correta", False):
         return True  # Senha já validada anteriormente
 
@@ -32,7 +72,9 @@ def checar_senha(lang):
         if "senha" not in st.session_state:
             return
 
-        if hmac.compare_digest(st.session_state["senha"], st.secrets["password"]["value"]):
+        senha_esperada = st.secrets["password"].get(chave_senha, st.secrets["password"]["value"])
+
+        if hmac.compare_digest(st.session_state["senha"], senha_esperada):
             st.session_state["senha_correta"] = True
             del st.session_state["senha"]  # Remove a senha da sessão
         else:
@@ -140,41 +182,96 @@ def mostrar_cabecalho_tidesat(logotipo):
 
             st.markdown("<br>", unsafe_allow_html=True)
 
-# Função para carregar os dados dos links
+# Função para carregar os dados dos links (via cache compartilhado entre sessões)
 def carregar_dados(url):
-        
-        # Fazendo a requisição dos dados
-        resposta = requests.get(url, verify=False, timeout=100)
 
-        # Verifica se a requisição foi bem-sucedida
-        if resposta.status_code != 200:
+        try:
+            with trecho("cache"):
+                df = obter_cache().obter(url)
+
+        except ErroDadosEstacao as e:
             st.markdown("<br>" * 2, unsafe_allow_html=True)
-            st.warning("Erro ao acessar os dados da estação selecionada.")
+            st.warning(str(e))
             st.stop()
 
-        # Carregando os dados no DataFrame
-        dados_nivel = StringIO(resposta.text)
-        df = pd.read_csv(dados_nivel, sep=',')
+        # Cópia rasa: as colunas adicionadas pela sessão não alteram o cache
+        return df.copy(deep=False)
 
-        # Verifica se o DataFrame está vazio
-        if df.empty:
-            st.markdown("<br>" * 2, unsafe_allow_html=True)
-            st.warning("Erro ao carregar os dados da estação selecionada.")
-            st.stop()
+# Função para filtrar os dados pelo período selecionado
+def filtrar_dados(df, dados_inicio, dados_fim, fuso_selecionado):
 
-        # Renomeia as colunas conforme necessário
-        df.rename(columns={
-            '% year': 'year', ' month': 'month', ' day': 'day',
-            ' hour': 'hour', ' minute': 'minute', ' second (GMT/UTC)': 'second',
-            ' water level (meters)': 'water_level(m)'}, inplace=True)
+    dados_inicio_dt = pd.to_datetime(dados_inicio).tz_localize(fuso_selecionado)
+    dados_fim_dt = pd.to_datetime(dados_fim).tz_localize(fuso_selecionado)
 
-        # Converte a data para o formato datetime
-        df['datetime'] = pd.to_datetime(df[['year', 'month', 'day', 'hour', 'minute', 'second']])
+    with trecho("filtro", linhas=len(df)):
+        filtro = (df['datetime_ajustado'] >= dados_inicio_dt) & (df['datetime_ajustado'] < dados_fim_dt + timedelta(days=1))
 
-        # Adiciona a coluna de data UTC
-        df['datetime_utc'] = df['datetime'].dt.tz_localize('UTC')
+        return df.loc[filtro]
 
-        return df
+# Função que retorna a referência leve da estação guardada na sessão (os dados ficam no cache compartilhado)
+def referencia_estacao(estacao, url, fuso_selecionado):
+
+    indice = obter_arquivo_indices().obter(url)
+
+    if not len(indice):
+        st.warning("A estação selecionada ainda não possui dados suficientes para exibição.")
+        st.stop()
+
+    return {
+        "estacao": estacao,
+        "url": url,
+        "fuso": fuso_selecionado,
+        "primeiro_utc": pd.Timestamp(int(indice.tempos[0]), tz='UTC'),
+        "ultimo_utc": pd.Timestamp(int(indice.tempos[-1]), tz='UTC'),
+    }
+
+# Função que retorna as medições do período, convertendo o fuso apenas nas linhas selecionadas
+def dados_periodo(url, dados_inicio, dados_fim, fuso_selecionado, desde=None):
+
+    df = carregar_dados(url)
+
+    inicio = pd.to_datetime(dados_inicio).tz_localize(fuso_selecionado)
+    fim = pd.to_datetime(dados_fim).tz_localize(fuso_selecionado) + timedelta(days=1)
+
+    with trecho("filtro", linhas=len(df)):
+        i0, i1 = df['datetime_utc'].searchsorted([inicio, fim])
+
+        # Modo ao vivo: apenas as medições posteriores ao último ponto plotado (ns)
+        if desde is not None:
+            i0 = max(i0, df['datetime_utc'].searchsorted(pd.Timestamp(desde, tz='UTC'), side='right'))
+
+        periodo = df.iloc[i0:i1]
+
+    with trecho("fuso", linhas=len(periodo)):
+        return periodo.assign(datetime_ajustado=periodo['datetime_utc'].dt.tz_convert(fuso_selecionado))
+
+# Função que retorna apenas as medições recentes usadas nos indicadores (últimas horas)
+def dados_recentes(url, horas=6):
+
+    df = carregar_dados(url)
+
+    referencia = min(df['datetime_utc'].iloc[-1], pd.Timestamp.utcnow())
+    inicio = df['datetime_utc'].searchsorted(referencia - pd.Timedelta(hours=horas))
+
+    return df.iloc[inicio:]
+
+# Função que monta os dados do período a partir dos agregados horários (média de cada hora)
+def dados_agregados_periodo(url, dados_inicio, dados_fim, fuso_selecionado, desde=None):
+
+    inicio = pd.to_datetime(dados_inicio).tz_localize(fuso_selecionado).value
+    fim = (pd.to_datetime(dados_fim).tz_localize(fuso_selecionado) + timedelta(days=1)).value
+
+    if desde is not None:
+        inicio = max(inicio, desde + 1)
+
+    with trecho("agregados"):
+        horario = obter_arquivo_agregados().obter(url).hora.tabela(inicio, fim)
+
+    return pd.DataFrame({
+        'datetime_utc': horario['datetime_utc'],
+        'datetime_ajustado': horario['datetime_utc'].dt.tz_convert(fuso_selecionado),
+        'water_level(m)': horario['media'],
+    })
 
 # Retorna uma cópia do DataFrame sem a última hora de dados (evitar o chicoteamento)
 def corte_ultima_1h(df):
@@ -182,6 +279,47 @@ def corte_ultima_1h(df):
     limite = df['datetime_utc'].max() - pd.Timedelta(hours=1)
     return df[df['datetime_utc'] <= limite]
 
+# Indica se o gráfico principal do período usa os agregados horários
+def usa_agregados(dados_inicio, dados_fim):
+    return dados_fim - dados_inicio > timedelta(days=LIMITE_DIAS_BRUTOS)
+
+# Função que retorna os dados do gráfico principal (normal e ao vivo): períodos longos a partir dos
+# agregados horários, com o corte de 1h aplicado apenas para fins gráficos. Com `desde` (ns), retorna só a
+# cauda posterior a esse instante; o corte é o mesmo, pois a cauda não vazia termina na última medição
+def dados_grafico(url, dados_inicio, dados_fim, fuso_selecionado, desde=None):
+
+    if usa_agregados(dados_inicio, dados_fim):
+        dados_filtrados = dados_agregados_periodo(url, dados_inicio, dados_fim, fuso_selecionado, desde)
+    else:
+        dados_filtrados = dados_periodo(url, dados_inicio, dados_fim, fuso_selecionado, desde)
+
+    return corte_ultima_1h(dados_filtrados)
+
+# Função que insere um ponto vazio logo após o início de cada lacuna (do índice de lacunas), para a linha
+# do gráfico ser interrompida em vez de ligar as medições dos dois lados. `desde` (ns) inclui a lacuna
+# entre o último ponto já plotado e o DataFrame (modo ao vivo).
+def inserir_quebras(df, lacunas, fuso, minimo=0, desde=None):
+
+    tempos = df['datetime_utc'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+    if not len(tempos):
+        return df
+
+    inicios, _ = lacunas.intervalos(tempos[0] if desde is None else desde, tempos[-1], minimo)
+
+    if not len(inicios):
+        return df
+
+    quebras = inicios + CADENCIA_NOMINAL
+    posicoes = np.searchsorted(tempos, quebras)
+    datas = pd.DatetimeIndex(np.insert(tempos, posicoes, quebras).view('M8[ns]'), tz='UTC')
+
+    return pd.DataFrame({
+        'datetime_utc': datas,
+        'datetime_ajustado': datas.tz_convert(fuso),
+        'water_level(m)': np.insert(df['water_level(m)'].to_numpy(dtype='float64'), posicoes, np.nan),
+    })
+
 # Função do seletor de fuso
 def fuso_horario(lang):
 
@@ -269,6 +407,53 @@ def calcular_velocidade(df):
 
     return f"{inclinacao:+.2f} m/h".replace('.', ',')
 
+# Função que retorna a previsão da estação (None se desligada, ainda sem ajuste ou já inteiramente no passado)
+def previsao_estacao(url):
+
+    previsor = obter_previsor()
+
+    if previsor is None:
+        return None
+
+    with trecho("previsao"):
+        previsao = previsor.obter(url, carregar_dados(url))
+
+    if previsao is None or previsao.tempos[-1] < pd.Timestamp.utcnow().value:
+        return None
+
+    return previsao
+
+# Função que indica se o período exibido termina na última medição (onde a previsão continua a linha)
+def mostra_previsao(url, dados_inicio, dados_fim):
+
+    if usa_agregados(dados_inicio, dados_fim):
+        return False
+
+    ultimo = carregar_dados(url)['datetime_utc'].iloc[-1].tz_convert(st.session_state["fuso_selecionado"])
+
+    return pd.to_datetime(dados_fim).date() >= ultimo.date()
+
+# Função que monta os traços da previsão: faixas de 95% e 80% e a linha central
+def tracos_previsao(previsao, fuso, cor, lang):
+
+    x = pd.DatetimeIndex(previsao.tempos, tz='UTC').tz_convert(fuso).to_pydatetime()
+    vermelho, verde, azul = (int(cor[i:i + 2], 16) for i in (1, 3, 5))
+    tracos = []
+
+    for confianca, opacidade in ((95, 0.12), (80, 0.25)):
+        inferior = getattr(previsao, f"inferior_{confianca}")
+        superior = getattr(previsao, f"superior_{confianca}")
+
+        tracos.append(go.Scatter(
+            x=np.concatenate([x, x[::-1]]), y=np.concatenate([superior, inferior[::-1]]),
+            fill='toself', fillcolor=f"rgba({vermelho}, {verde}, {azul}, {opacidade})", line=dict(width=0),
+            hoverinfo='skip', name=lang["forecast_band"].format(c=confianca), legendgroup="previsao"))
+
+    tracos.append(go.Scatter(x=x, y=previsao.nivel, mode='lines', line=dict(color=cor, dash='dot'),
+                             name=lang["forecast"], legendgroup="previsao"))
+
+    return tracos
+
 # Verifica o status de funcionamento da estação com base na última medição
 def verificar_status_estacao(ultimo_registro_utc):
 
@@ -307,8 +492,9 @@ def converter_base64(caminho_imagem):
 
     try:
         
-        with open(caminho_imagem, "rb") as file:
+        with trecho("imagem") as t, open(caminho_imagem, "rb") as file:
             link = base64.b64encode(file.read()).decode()
+            t.bytes = len(link)
 
         return link
         
@@ -379,10 +565,15 @@ def exibir_mapa_estacao(estacao):
 
         deck = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip)
 
-        st.pydeck_chart(deck, use_container_width=True)   
+        with trecho("mapa") as t:
+            if rastreio_detalhado():
+                t.bytes = len(deck.to_json())
+            st.pydeck_chart(deck, use_container_width=True)
 
-# Função que configura a exibição do gráfico
-def plotar_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cota_alerta, cota_inundacao, dados_inicio, dados_fim, lang):
+# Função que monta a figura do gráfico principal
+@rastreado("figura")
+def construir_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cota_alerta, cota_inundacao, dados_inicio, dados_fim, lang,
+                      perfil=PERFIL_PADRAO):
     
     cor_linha, _, _, _, _ = obter_tema()
 
@@ -390,6 +581,11 @@ def plotar_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cot
         st.write(f"Nenhum dado encontrado para o período selecionado na estação {estacao_selecionada}.")
         st.stop()
 
+    # Interrompe a linha nas lacunas da estação
+    minimo = LACUNA_MINIMA_AGREGADOS if usa_agregados(dados_inicio, dados_fim) else 0
+    dados_filtrados = inserir_quebras(dados_filtrados, obter_arquivo_indices().obter(url).lacunas,
+                                      st.session_state["fuso_selecionado"], minimo)
+
     # Criação do gráfico interativo
     fig = px.line(
         dados_filtrados,
@@ -405,34 +601,27 @@ def plotar_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cot
     # Condição para aplicar o ajuste no eixo Y apenas se o período for "Últimas 24h"
     if (dados_fim - dados_inicio) == pd.Timedelta(hours=24):
         
-        med = np.median(dados_filtrados['water_level(m)'])
+        # Centro da janela pela média do índice de consultas (sem percorrer as medições)
+        fuso = st.session_state["fuso_selecionado"]
+        inicio_janela = pd.to_datetime(dados_inicio).tz_localize(fuso).value
+        fim_janela = (pd.to_datetime(dados_fim).tz_localize(fuso) + timedelta(days=1)).value
+
+        med = obter_arquivo_indices().obter(url).consultar(inicio_janela, fim_janela).media
         tempmin = med - 0.5
         tempmax = med + 0.5
         fig.update_yaxes(autorangeoptions_clipmin=tempmin, autorangeoptions_clipmax=tempmax, fixedrange=True)
 
     elif (dados_fim - dados_inicio) >= pd.Timedelta(days=7):  # Inclui Período Inteiro
 
-        from main_estrela_config import ESTACOES_ESTRELA
+        # Faixa definida pelo perfil da dashboard (ex.: faixa global da EST1 em Estrela)
+        faixa = perfil.faixa_y(estacoes_info, estacao_selecionada)
 
-        # Verifica se está rodando no app de Estrela
-        if estacoes_info == ESTACOES_ESTRELA:
-
-            # Usa os limites globais de EST1
-            df_est1 = carregar_dados(ESTACOES_ESTRELA["EST1"]["url"])
-
-            if estacao_selecionada != "EST1":
-                
-                max_nivel = 21
-                min_nivel = df_est1['water_level(m)'].min()
-            else:
-                max_nivel = df_est1["water_level(m)"].max()
-                min_nivel = df_est1["water_level(m)"].min()
+        if faixa is not None:
+            min_nivel, max_nivel = faixa
 
         else:
             # Comportamento padrão
-            df = carregar_dados(url)
-            max_nivel = df['water_level(m)'].max()
-            min_nivel = df['water_level(m)'].min()
+            min_nivel, max_nivel = obter_arquivo_indices().obter(url).extremos()
 
         # Aplica o range do eixo Y diretamente
         fig.update_yaxes(range=[min_nivel, max_nivel], fixedrange=True)
@@ -457,6 +646,12 @@ def plotar_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cot
     # Ajuste da cor da linha principal
     fig.update_traces(line=dict(color=cor_linha))
 
+    # Previsão das próximas horas, quando o período termina na última medição
+    previsao = previsao_estacao(url) if mostra_previsao(url, dados_inicio, dados_fim) else None
+
+    if previsao is not None:
+        fig.add_traces(tracos_previsao(previsao, st.session_state["fuso_selecionado"], cor_linha, lang))
+
     # Adiciona a cota de inundação, se disponível
     if cota_inundacao not in (None, "", " "):
         fig.add_shape(
@@ -489,35 +684,258 @@ def plotar_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cot
             showlegend=True  
         )
 
-    config = {
-        "scrollZoom": True,
-        "responsive": True,
-        "displaylogo": False
-    }
+    return fig
+
+# Função que exibe uma figura plotly, registrando a serialização no rastreio
+def exibir_figura(fig):
+
+    # O tamanho serializado custa uma serialização extra: só é medido no painel de depuração
+    tamanho = len(fig.to_json()) if rastreio_detalhado() else None
+
+    with trecho("plotly_chart") as t:
+        t.bytes = tamanho
+        st.plotly_chart(fig, use_container_width=True, config=CONFIG_GRAFICO)
+
+# Função que configura a exibição do gráfico
+def plotar_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cota_alerta, cota_inundacao, dados_inicio, dados_fim, lang,
+                   perfil=PERFIL_PADRAO):
+
+    fig = construir_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cota_alerta, cota_inundacao,
+                            dados_inicio, dados_fim, lang, perfil)
 
     # Exibe o gráfico
-    st.plotly_chart(fig, use_container_width=True, config=config)
+    exibir_figura(fig)
+
+# Figuras do modo ao vivo compartilhadas entre as sessões que acompanham a mesma visualização (estação, período,
+# fuso, tema e idioma). As menos usadas saem quando o limite é atingido.
+@st.cache_resource(show_spinner=False)
+def obter_figuras_ao_vivo():
+    return {"figuras": OrderedDict(), "trava": threading.Lock()}
+
+# Função que retorna (criando, se preciso) a figura compartilhada de uma visualização do modo ao vivo
+def figura_ao_vivo(chave, construir):
+
+    registro = obter_figuras_ao_vivo()
+
+    with registro["trava"]:
+        entrada = registro["figuras"].get(chave)
+
+        if entrada is not None:
+            registro["figuras"].move_to_end(chave)
+            return entrada
+
+        entrada = {"trava": threading.Lock(), "fig": None}
+        registro["figuras"][chave] = entrada
+
+        while len(registro["figuras"]) > FIGURAS_AO_VIVO:
+            registro["figuras"].popitem(last=False)
+
+    # A montagem completa acontece uma única vez por visualização, fora da trava do registro
+    with entrada["trava"]:
+        if entrada["fig"] is None:
+            entrada.update(construir())
+
+    return entrada
+
+# Função que exibe o gráfico no modo ao vivo. A figura é montada uma única vez por visualização e, a cada
+# intervalo, apenas as medições posteriores ao último ponto plotado são acrescentadas aos traços. A sessão
+# guarda apenas o marcador (url, versão do cache, último instante plotado).
+@execucao_rastreada("grafico_ao_vivo")
+def grafico_ao_vivo(url, estacoes_info, estacao_selecionada, lang, perfil=PERFIL_PADRAO):
+
+    fuso = st.session_state["fuso_selecionado"]
+    dados_inicio = st.session_state["dados_inicio"]
+    dados_fim = st.session_state["dados_fim"]
+    cor_linha, _, _, _, _ = obter_tema()
+
+    carregar_dados(url)
+    versao = obter_cache().versao(url)
+    cota_alerta, cota_inundacao = cotas_notaveis(estacao_selecionada, estacoes_info)
+
+    def construir():
+        dados_filtrados = dados_grafico(url, dados_inicio, dados_fim, fuso)
+        fig = construir_grafico(url, estacoes_info, dados_filtrados, estacao_selecionada, cota_alerta, cota_inundacao,
+                                dados_inicio, dados_fim, lang, perfil)
+        previsao = previsao_estacao(url) if mostra_previsao(url, dados_inicio, dados_fim) else None
+
+        return {"fig": fig, "versao": versao, "ultimo_utc": int(dados_filtrados['datetime_utc'].iloc[-1].value),
+                "previsao": None if previsao is None else previsao.t_ref}
+
+    chave = (url, estacao_selecionada, cota_alerta, cota_inundacao, dados_inicio, dados_fim, fuso, cor_linha,
+             lang["lang_code"], perfil)
+    entrada = figura_ao_vivo(chave, construir)
+    anterior = st.session_state.get("ao_vivo")
+
+    with entrada["trava"]:
+
+        # Sem medições novas no cache, a figura é reenviada como está (o fragmento precisa emitir o gráfico)
+        if entrada["versao"] != versao:
+            with trecho("ao_vivo", novas=True):
+                estender_grafico_ao_vivo(entrada, url, dados_inicio, dados_fim, fuso, cor_linha, lang)
+            entrada["versao"] = versao
+
+        marcador = (url, versao, entrada["ultimo_utc"])
+
+        if anterior != marcador:
+            st.session_state["ao_vivo"] = marcador
+
+        exibir_figura(entrada["fig"])
+
+# Função que acrescenta aos traços da figura ao vivo a cauda posterior ao último ponto plotado e troca os
+# traços da previsão quando há um ajuste novo
+def estender_grafico_ao_vivo(entrada, url, dados_inicio, dados_fim, fuso, cor_linha, lang):
+
+    fig = entrada["fig"]
+    cauda = dados_grafico(url, dados_inicio, dados_fim, fuso, desde=entrada["ultimo_utc"])
+
+    if not cauda.empty:
+        minimo = LACUNA_MINIMA_AGREGADOS if usa_agregados(dados_inicio, dados_fim) else 0
+        cauda = inserir_quebras(cauda, obter_arquivo_indices().obter(url).lacunas, fuso, minimo,
+                                desde=entrada["ultimo_utc"])
+
+        traco = fig.data[0]
+        traco.x = np.concatenate([np.asarray(traco.x), pd.DatetimeIndex(cauda['datetime_ajustado']).to_pydatetime()])
+        traco.y = np.concatenate([np.asarray(traco.y), cauda['water_level(m)'].to_numpy()])
+        entrada["ultimo_utc"] = int(cauda['datetime_utc'].iloc[-1].value)
+
+    previsao = previsao_estacao(url) if mostra_previsao(url, dados_inicio, dados_fim) else None
+    t_ref = None if previsao is None else previsao.t_ref
+
+    if t_ref != entrada["previsao"]:
+        fig.data = [traco for traco in fig.data if traco.legendgroup != "previsao"]
+
+        if previsao is not None:
+            fig.add_traces(tracos_previsao(previsao, fuso, cor_linha, lang))
+
+        entrada["previsao"] = t_ref
+
+# Função que exibe os indicadores de situação, nível recente e velocidade
+@execucao_rastreada("indicadores")
+def exibir_indicadores(url_estacao, estacao_selecionada, estacoes_info, lang):
+
+    _, cor_texto, _, _, _ = obter_tema()
+
+    # Seção com Situação do nível | Nível recente + atualização | Velocidade (em breve)
+    col_situacao, col_nivel, col_velocidade = st.columns([1.2, 1.8, 1.2])
+
+    # 🔹 Situação do nível
+    cota_alerta, cota_inundacao = cotas_notaveis(estacao_selecionada, estacoes_info)
+
+    df_nivel = dados_recentes(url_estacao)
+
+    nivel_formatado, dh_ultima_formatada = nivel_recente(df_nivel, st.session_state["fuso_selecionado"], lang, modo="ajustado")
+
+    velocidade_formatada = calcular_velocidade(df_nivel)
+
+    # Nível previsto no horizonte do indicador, com a meia largura da faixa de 80%
+    previsao = previsao_estacao(url_estacao)
+    texto_previsao = ""
+
+    if previsao is not None:
+        i = HORIZONTE_INDICADOR * PASSOS_HORA - 1
+        meia_faixa = (previsao.superior_80[i] - previsao.inferior_80[i]) / 2
+        texto_previsao = (f"{lang['forecast_in'].format(h=HORIZONTE_INDICADOR)}: {previsao.nivel[i]:.2f} m "
+                          f"(± {meia_faixa:.2f})").replace('.', ',')
+
+    nivel_valor = float(nivel_formatado.replace(",", ".").replace("&nbsp;m", ""))
+
+    situacao, cor_situacao = situacao_nivel(nivel_valor, cota_alerta, cota_inundacao)
+
+    rotulo_situacao = {
+            "Normal": {"pt": "Normal", "en": "Normal level"},
+            "Alerta": {"pt": "Em alerta", "en": "Alert"},
+            "Inundação": {"pt": "Inundação", "en": "Flood"},
+            "Indisponível": {"pt": "Indisponível", "en": "Unavailable"}
+        }
+    mensagem_situacao = rotulo_situacao[situacao][lang["lang_code"]]
+
+    with col_situacao:
+            st.markdown(f"""
+                <div style='text-align: center;'>
+                    <p style='font-size: 22px; margin: 0;'>
+                        Situação do nível:
+                        <span style='font-weight: bold; color: {cor_situacao};'>{mensagem_situacao}</p>
+                </div>
+            """, unsafe_allow_html=True)
+
+    # 🔹 Nível recente
+    with col_nivel:
+
+            st.markdown(f"""
+                <div style='text-align: center;'>
+                    <p style='font-size: 22px; margin: 0;'>
+                        {lang['recent_level']}:
+                        <span style='font-weight: bold; color: {cor_texto};'>{nivel_formatado}</span>
+                    </p>
+                    <p style='font-size: 13px; margin: 0;'>{lang['update'] + ':'} {dh_ultima_formatada}</p>
+                </div>
+            """, unsafe_allow_html=True)
+
+    # 🔹 Velocidade futura (placeholder)
+    with col_velocidade:
+            st.markdown(f"""
+                <div style='text-align: center;'>
+                    <p style='font-size: 22px; margin: 0;'>
+                        Velocidade:
+                        <span style='font-weight: bold; color: {cor_texto};'>{velocidade_formatada}</span>
+                    </p>
+                    <p style='font-size: 13px; margin: 0;'>{texto_previsao}</p>
+                </div>
+            """, unsafe_allow_html=True)
+
+# Função que oferece a exportação do histórico do período selecionado (CSV ou Parquet)
+def exibir_exportacao(estacoes_info, estacao_selecionada, lang):
+
+    with st.expander(lang["export"], expanded=False):
+
+        col_estacoes, col_formato, col_botao = st.columns([2, 1, 1], vertical_alignment="bottom")
+
+        with col_estacoes:
+            codigos = st.multiselect(lang["export_stations"], list(estacoes_info.keys()), default=[estacao_selecionada],
+                                     key="exportar_estacoes")
+
+        with col_formato:
+            formato = st.selectbox(lang["export_format"], list(FORMATOS), format_func=str.upper, key="exportar_formato")
 
-# Função que configura a exibição do gráfico de sobreposição (exclusivo para tidesat-estrela)
-def plotar_sobreposicao_estrela(estacoes_info, lang):
+        with col_botao:
+            preparar = st.button(lang["export_prepare"], use_container_width=True, disabled=not codigos)
+
+        if preparar:
+
+            fuso = st.session_state["fuso_selecionado"]
+            inicio, fim = periodo_ns(st.session_state["dados_inicio"], st.session_state["dados_fim"], fuso)
+
+            # O botão de download exige o arquivo inteiro: ele é montado com os blocos já convertidos (sem DataFrame completo)
+            with trecho("exportacao", formato=formato) as t:
+                dados = b"".join(exportar({codigo: estacoes_info[codigo]["url"] for codigo in codigos}, inicio, fim, fuso, formato))
+                t.bytes = len(dados)
+
+            st.download_button(lang["export_download"], dados, mime=FORMATOS[formato]["tipo"], use_container_width=True,
+                               file_name=nome_arquivo(codigos, st.session_state["dados_inicio"], st.session_state["dados_fim"], formato))
+
+# Função que configura a exibição do gráfico de sobreposição (estações definidas no perfil da dashboard)
+def plotar_sobreposicao_estrela(estacoes_info, lang, perfil):
 
     # Pega o fuso e o período selecionado
     fuso = st.session_state["fuso_selecionado"]
     data_inicio = st.session_state["dados_inicio"]
     data_fim = st.session_state["dados_fim"]
 
-    estacoes_alvo = ["EST1", "EST2", "EST3", "EST6"]
-
-    tracos = []
-    todos_valores = []
+    estacoes_alvo = perfil.estacoes_comparacao
 
     cor_linha_padrao, _, _, _, _ = obter_tema()
 
     cores = {
         "EST2": "blue",
         "EST3": "green",
-        "EST6": "red"
+        "EST6": "red",
+        "IDP1": "purple",
+        "VDS1": "green",
+        "ITA1": "orange"
     }
+
+    series = {}
+
     for cod in estacoes_alvo:
 
         est = estacoes_info.get(cod)
@@ -528,74 +946,279 @@ def plotar_sobreposicao_estrela(estacoes_info, lang):
 
         try:
 
-            df = carregar_dados(est["url"])
-            df['datetime_ajustado'] = df['datetime_utc'].dt.tz_convert(fuso)
-            df_filtrado = filtrar_dados(df, data_inicio, data_fim, fuso)
+            series[cod] = vetores_estacao(carregar_dados(est["url"]))
+            obter_analisador().atualizar_estacao(cod, *series[cod], obter_cache().versao(est["url"]))
 
-            todos_valores.extend(df_filtrado["water_level(m)"].tolist())
+        except Exception as e:
+            st.warning(f"Erro ao carregar dados de {cod}: {e}")
 
-            cor = cores.get(cod, cor_linha_padrao)
+    # Alinha todas as estações na mesma grade do período visível
+    inicio_utc = pd.to_datetime(data_inicio).tz_localize(fuso).tz_convert("UTC")
+    fim_utc = (pd.to_datetime(data_fim).tz_localize(fuso) + timedelta(days=1)).tz_convert("UTC")
 
-            tracos.append(go.Scatter(
-                x=np.array(df_filtrado["datetime_ajustado"]),
-                y=df_filtrado["water_level(m)"],
-                mode='lines',
-                name=est["descricao"],
-                line=dict(color=cor, width=2)
-            ))
+    with trecho("alinhamento"):
+        alinhamento = alinhar_estacoes(series, inicio_utc, fim_utc)
 
-        except Exception as e:
-            st.warning(f"Erro ao carregar dados de {cod}: {e}")
+    # Limites do eixo Y a partir dos extremos de cada estação no alinhamento
+    limites = limites_globais(alinhamento)
 
-    if not tracos:
+    if limites is None:
         st.error("Nenhum dado foi carregado para as estações selecionadas.")
         return
 
-    # Eixo Y: ajuste para últimos 24h ou período total
-    y_range = None
-    delta_periodo = pd.to_datetime(data_fim) - pd.to_datetime(data_inicio)
+    with trecho("figura_comparacao"):
+
+        eixo_x = grade_no_fuso(alinhamento, fuso).to_pydatetime()
 
-    if delta_periodo == timedelta(hours=24):
+        tracos = [
+            go.Scatter(
+                x=eixo_x,
+                y=alinhamento.matriz[i],
+                mode='lines',
+                name=estacoes_info[cod]["descricao"],
+                line=dict(color=cores.get(cod, cor_linha_padrao), width=2)
+            )
+            for i, cod in enumerate(alinhamento.codigos)
+        ]
+
+        # Eixo Y: ajuste para últimos 24h ou período total
+        y_range = None
+        delta_periodo = pd.to_datetime(data_fim) - pd.to_datetime(data_inicio)
+        val_min, val_max = limites
+
+        if delta_periodo == timedelta(hours=24):
         
-       val_min = min(todos_valores)
-       val_max = max(todos_valores)
-       y_range = [max(0, val_min - 0.5), val_max + 0.5]
+           y_range = [max(0, val_min - 0.5), val_max + 0.5]
+
+        elif delta_periodo >= timedelta(days=7):
+
+            y_range = [val_min, val_max]
+
+        fig = go.Figure(data=tracos)
+
+        fig.update_layout(
+            xaxis_title="Data" if lang["lang_code"] == "pt" else "Date",
+            yaxis_title="Nível (m)" if lang["lang_code"] == "pt" else "Water level (m)",
+            font={'size': 18},
+            height=430,
+            margin=dict(l=40, r=0.1, t=40, b=40),
+            legend=dict(
+                orientation='v',
+                yanchor='bottom',
+                y=1.01,
+                xanchor='left',
+                x=0.04,
+                font=dict(size=11),
+            )
+        )
+
+        fig.update_xaxes(fixedrange=False)
+        fig.update_yaxes(fixedrange=True)
+
+        if y_range:
+            fig.update_yaxes(range=y_range, fixedrange=True)
+
+    exibir_figura(fig)
+
+    exibir_diferencas(alinhamento, lang)
 
-    elif delta_periodo >= timedelta(days=7):
+    if perfil.cadeia_defasagem:
+        exibir_defasagens(perfil.cadeia_defasagem, lang)
 
-        y_range = [min(todos_valores), max(todos_valores)]
+# Função que exibe a diferença de nível mais recente entre estações consecutivas da comparação
+def exibir_diferencas(alinhamento, lang):
 
-    fig = go.Figure(data=tracos)
+    textos = []
+
+    for a, b in zip(alinhamento.codigos[:-1], alinhamento.codigos[1:]):
+
+        diferenca = diferenca_estacoes(alinhamento, a, b)
+        validos = np.flatnonzero(~np.isnan(diferenca))
+
+        if len(validos):
+            texto = f"{diferenca[validos[-1]]:+.2f}"
+            textos.append(f"{a} − {b}: {texto.replace('.', ',') if lang['lang_code'] == 'pt' else texto} m")
+
+    if textos:
+        st.caption(f"{lang['level_difference']}: " + " · ".join(textos))
+
+# Função que exibe o tempo de propagação entre estações consecutivas de uma cadeia
+def exibir_defasagens(cadeia, lang):
+
+    textos = []
+
+    for montante, jusante, resultado in zip(cadeia[:-1], cadeia[1:], obter_analisador().defasagens_cadeia(cadeia)):
+
+        if resultado is None:
+            textos.append(lang["lag_unavailable"].format(a=montante, b=jusante))
+        else:
+            horas = f"{resultado.atraso_h:.1f}".replace('.', ',') if lang["lang_code"] == "pt" else f"{resultado.atraso_h:.1f}"
+            r = f"{resultado.correlacao:.2f}".replace('.', ',') if lang["lang_code"] == "pt" else f"{resultado.correlacao:.2f}"
+            textos.append(lang["leads_by"].format(a=montante, b=jusante, h=horas, r=r))
+
+    st.caption(f"{lang['travel_time']}: " + " · ".join(textos))
+
+# Função que exibe as estatísticas do período selecionado (servidas pelos agregados e somas de prefixo)
+def exibir_estatisticas(url, estacao_selecionada, estacoes_info, lang):
+
+    pt = lang["lang_code"] == "pt"
+    fuso = st.session_state["fuso_selecionado"]
+
+    inicio = pd.to_datetime(st.session_state["dados_inicio"]).tz_localize(fuso)
+    fim = pd.to_datetime(st.session_state["dados_fim"]).tz_localize(fuso) + timedelta(days=1)
+
+    cota_alerta, cota_inundacao = cotas_notaveis(estacao_selecionada, estacoes_info)
+    agregados = obter_arquivo_agregados().obter(url)
+    prefixos = obter_arquivo_prefixos().obter(url, agregados, cota_numerica(cota_alerta), cota_numerica(cota_inundacao))
+
+    resumo = resumo_periodo(agregados, prefixos, inicio.value, fim.value, obter_arquivo_indices().obter(url))
+
+    if resumo is None:
+        st.info("Sem dados no período selecionado." if pt else "No data in the selected period.")
+        return
+
+    def numero(valor, casas=2, unidade=" m"):
+        if valor is None or pd.isna(valor):
+            return "Indisp." if pt else "N/A"
+        texto = f"{valor:.{casas}f}"
+        return (texto.replace('.', ',') if pt else texto) + unidade
+
+    def instante(ts):
+        return ts.tz_convert(fuso).strftime('%d/%m/%Y %H:%M' if pt else '%m/%d/%Y %I:%M %p')
+
+    st.markdown("#### Estatísticas do período selecionado" if pt else "#### Statistics for the selected period")
+
+    col_min, col_max, col_media, col_amplitude = st.columns(4)
+    col_min.metric("Mínimo" if pt else "Minimum", numero(resumo["minimo"]), instante(resumo["t_minimo"]), delta_color="off")
+    col_max.metric("Máximo" if pt else "Maximum", numero(resumo["maximo"]), instante(resumo["t_maximo"]), delta_color="off")
+    col_media.metric("Média" if pt else "Mean", numero(resumo["media"]),
+                     f"{resumo['amostras']} " + ("medições" if pt else "samples"), delta_color="off")
+    col_amplitude.metric("Amplitude diária média" if pt else "Mean daily range", numero(resumo["amplitude_media"]),
+                         ("máx. " if pt else "max ") + numero(resumo["amplitude_maxima"]), delta_color="off")
+
+    col_alerta, col_inundacao, col_lacunas, col_completude = st.columns(4)
+    col_alerta.metric("Horas acima da cota de alerta" if pt else "Hours above alert level",
+                      "Indisp." if resumo["horas_acima_alerta"] is None else resumo["horas_acima_alerta"])
+    col_inundacao.metric("Horas acima da cota de inundação" if pt else "Hours above flood level",
+                         "Indisp." if resumo["horas_acima_inundacao"] is None else resumo["horas_acima_inundacao"])
+    horas_com_dados = numero(100 * resumo["horas_com_dados"] / max(resumo["horas_periodo"], 1), 0, " %")
+
+    if "disponibilidade" in resumo:
+        col_lacunas.metric("Lacunas nos dados" if pt else "Data gaps", resumo["lacunas"],
+                           ("maior: " if pt else "longest: ") + numero(resumo["maior_lacuna_h"], 1, " h")
+                           if resumo["lacunas"] else None, delta_color="off")
+        col_completude.metric("Disponibilidade" if pt else "Uptime", numero(100 * resumo["disponibilidade"], 1, " %"),
+                              ("horas com dados: " if pt else "hours with data: ") + horas_com_dados, delta_color="off")
+    else:
+        col_lacunas.metric("Lacunas nos dados" if pt else "Data gaps", resumo["lacunas"])
+        col_completude.metric("Horas com dados" if pt else "Hours with data", horas_com_dados)
+
+    st.markdown("##### Percentis (médias horárias)" if pt else "##### Percentiles (hourly means)")
+    st.dataframe(pd.DataFrame({f"P{p}": [round(v, 2)] for p, v in resumo["percentis"].items()}),
+                 hide_index=True, use_container_width=True)
+
+    # Últimas 12 horas (uma linha por hora, a partir dos agregados horários)
+    ultimas_horas = agregados.hora.tabela().tail(12).iloc[::-1]
+    st.markdown("#### Nível das últimas 12h" if pt else "#### Last 12h Water Levels")
+    st.dataframe(pd.DataFrame({
+        "Hora" if pt else "Time": ultimas_horas['datetime_utc'].dt.tz_convert(fuso),
+        "Nível médio (m)" if pt else "Mean level (m)": ultimas_horas['media'].round(3),
+        "Mínimo (m)" if pt else "Min (m)": ultimas_horas['minimo'],
+        "Máximo (m)" if pt else "Max (m)": ultimas_horas['maximo'],
+    }), hide_index=True, use_container_width=True)
+
+# Função que exibe a comparação ano a ano (médias diárias) a partir dos agregados
+def plotar_comparacao_anual(url, lang):
+
+    cor_linha, _, _, _, _ = obter_tema()
+
+    anual = comparacao_anual(obter_arquivo_agregados().obter(url), st.session_state["fuso_selecionado"])
+
+    if anual.shape[1] < 2:
+        return
+
+    st.markdown("#### Comparação anual (média diária)" if lang["lang_code"] == "pt" else "#### Year-over-year (daily mean)")
+
+    fig = go.Figure([
+        go.Scatter(x=anual.index, y=anual[ano], mode='lines', name=str(ano),
+                   line=dict(color=cor_linha if ano == anual.columns[-1] else None))
+        for ano in anual.columns
+    ])
 
     fig.update_layout(
-        xaxis_title="Data" if lang["lang_code"] == "pt" else "Date",
+        xaxis_title="Dia do ano" if lang["lang_code"] == "pt" else "Day of year",
         yaxis_title="Nível (m)" if lang["lang_code"] == "pt" else "Water level (m)",
-        font={'size': 18},
-        height=430,
+        height=350,
         margin=dict(l=40, r=0.1, t=40, b=40),
-        legend=dict(
-            orientation='v',
-            yanchor='bottom',
-            y=1.01,
-            xanchor='left',
-            x=0.04,
-            font=dict(size=11),
-        )
     )
 
-    fig.update_xaxes(fixedrange=False)
-    fig.update_yaxes(fixedrange=True)
+    exibir_figura(fig)
 
-    if y_range:
-        fig.update_yaxes(range=y_range, fixedrange=True)
+# Função que exibe a completude dos dados de cada um dos últimos dias (fração do dia com medições),
+# respondida pelo índice de lacunas
+def exibir_completude(url, lang):
 
-    config = {
-        "scrollZoom": True,
-        "responsive": True,
-        "displaylogo": False
-    }
+    pt = lang["lang_code"] == "pt"
+    cor_linha, _, _, _, _ = obter_tema()
+    fuso = st.session_state["fuso_selecionado"]
+
+    hoje = pd.Timestamp.now(tz=fuso).normalize()
+    dias = pd.date_range(hoje - pd.Timedelta(days=DIAS_COMPLETUDE - 1), periods=DIAS_COMPLETUDE + 1, freq='D')
+
+    cobertura = obter_arquivo_indices().obter(url).lacunas.cobertura(dias.asi8, pd.Timestamp.utcnow().value)
+
+    st.markdown(f"##### Completude dos dados (últimos {DIAS_COMPLETUDE} dias)" if pt
+                else f"##### Data completeness (last {DIAS_COMPLETUDE} days)")
+
+    fig = go.Figure(go.Bar(x=dias[:-1], y=100 * cobertura, marker_color=cor_linha,
+                           hovertemplate="%{x|%d/%m}: %{y:.0f} %<extra></extra>"))
+
+    fig.update_layout(
+        yaxis=dict(range=[0, 100], ticksuffix=" %", fixedrange=True),
+        xaxis=dict(fixedrange=True),
+        height=220,
+        margin=dict(l=40, r=0.1, t=10, b=30),
+    )
+
+    exibir_figura(fig)
+
+# Função que exibe o relatório de memória da sessão (bytes antes/depois da referência compartilhada)
+def exibir_relatorio_memoria(url):
+
+    relatorio = relatorio_memoria(st.session_state, obter_cache().obter(url), obter_cache())
+
+    with st.expander("🧠 Memória da sessão", expanded=True):
+
+        col_antes, col_depois, col_cache = st.columns(3)
+        col_antes.metric("Sessão (cópia por sessão)", formatar_bytes(relatorio["bytes_sessao_antes"]))
+        col_depois.metric("Sessão (referência compartilhada)", formatar_bytes(relatorio["bytes_sessao_depois"]))
+        col_cache.metric("Cache compartilhado (processo)", formatar_bytes(relatorio["bytes_cache_compartilhado"]))
+
+        st.dataframe(pd.DataFrame({
+            "Chave": list(relatorio["bytes_por_chave"].keys()),
+            "Bytes": list(relatorio["bytes_por_chave"].values()),
+        }), hide_index=True, use_container_width=True)
+
+# Função que exibe os trechos da execução atual e a duração das execuções anteriores da sessão
+def exibir_rastreio():
 
-    st.plotly_chart(fig, use_container_width=True, config=config)
+    rastreio = rastreio_atual()
+
+    with st.expander("⏱️ Rastreio da execução", expanded=True):
+
+        colunas = st.columns(3)
+        colunas[0].metric("Execução atual (até aqui)", f"{rastreio.decorrido_ms:.0f} ms")
+
+        for coluna, nome in zip(colunas[1:], ("main", "grafico_ao_vivo")):
+            anterior = ultimo_rastreio(rastreio.sessao, nome)
+            coluna.metric(f"Última execução: {nome}", f"{anterior.duracao_ms:.0f} ms" if anterior else "-")
+
+        st.dataframe(pd.DataFrame({
+            "Trecho": ["\u2003" * t.profundidade + t.nome for t in rastreio.trechos],
+            "Início (ms)": [round(t.inicio_ms, 1) for t in rastreio.trechos],
+            "Duração (ms)": [None if t.duracao_ms is None else round(t.duracao_ms, 2) for t in rastreio.trechos],
+            "Bytes": [t.bytes for t in rastreio.trechos],
+        }), hide_index=True, use_container_width=True)
 
 # Função para obter as configurações do tema
 def obter_tema():
@@ -697,11 +1320,55 @@ def modo_visualizacao(lang):
             # Botão para alternar o tema
             st.button(icone_botoes, on_click=MudarTema)
 
+# Função do seletor do modo ao vivo (intervalo limitado pelos valores mínimo e máximo da dashboard)
+def seletor_ao_vivo(lang, intervalo_ao_vivo):
+
+    intervalo_min, intervalo_max = intervalo_ao_vivo
+    opcoes = [i for i in OPCOES_INTERVALO_AO_VIVO if intervalo_min <= i <= intervalo_max] or [intervalo_min]
+
+    with st.expander(f"{lang['live_mode']}", expanded=False):
+
+        ao_vivo = st.toggle(f"{lang['live_mode_toggle']}", value=False, key="ao_vivo_ativo")
+
+        intervalo = st.select_slider(
+            f"{lang['refresh_interval']}",
+            options=opcoes,
+            value=opcoes[0],
+            format_func=lambda seg: f"{seg // 60} min" if seg >= 60 else f"{seg} s",
+            disabled=not ao_vivo,
+            key="ao_vivo_intervalo"
+        )
+
+    if not ao_vivo:
+        st.session_state.pop("ao_vivo", None)
+
+    return ao_vivo, intervalo
+
 # Função para construir o layout
-def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang): 
+@execucao_rastreada("main")
+def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang, intervalo_ao_vivo=INTERVALO_AO_VIVO,
+         exigir_senha=False, chave_senha="value", perfil=PERFIL_PADRAO): 
 
     configurar_layout()
 
+    # Porta auxiliar / arquivo de métricas e API de dados, se configurados (uma única vez por processo)
+    iniciar_exportacao()
+    iniciar_api()
+    iniciar_agendador()
+    obter_previsor()
+
+    # Defasagens da cadeia do perfil atualizadas a cada chegada de medições
+    if perfil.cadeia_defasagem:
+        obter_analisador().acompanhar(perfil.cadeia_defasagem, {cod: info["url"] for cod, info in estacoes_info.items()})
+
+    # Painéis de depuração pedidos pela URL (ex.: ?debug=memoria,rastreio)
+    depuracao = set(st.query_params.get("debug", "").split(","))
+    rastreio_atual().detalhado = "rastreio" in depuracao
+
+    # Dashboards protegidas pedem a senha logo após a configuração da página
+    if exigir_senha and not checar_senha(lang, chave_senha):
+        st.stop()
+
     # Mostra cabeçalho "Powered by TideSat" só se for uma dashboard personalizada
     mostrar_cabecalho_tidesat(logotipo)
 
@@ -759,29 +1426,21 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
 
                     url_estacao = estacao_info["url"]
 
-                    dados = carregar_dados(url_estacao)
-                    dados['datetime_ajustado'] = dados['datetime_utc'].dt.tz_convert(st.session_state["fuso_selecionado"])
-                    
-                    st.session_state["dados_estacao"] = dados
+                    # A sessão guarda apenas a referência; a série fica no cache compartilhado
+                    referencia = referencia_estacao(estacao_selecionada, url_estacao, st.session_state["fuso_selecionado"])
                     
-                    dados_inicio = dados['datetime_ajustado'].min().date()
-                    dados_fim = dados['datetime_ajustado'].max().date()
+                    st.session_state["dados_estacao"] = referencia
 
-                    # Limita o início ao primeiro dado da EST6, apenas para o app de Estrela
-                    from main_estrela_config import ESTACOES_ESTRELA
+                    ultimo_ajustado = referencia["ultimo_utc"].tz_convert(st.session_state["fuso_selecionado"])
                     
-                    if estacoes_info == ESTACOES_ESTRELA:
-                        try:
-                            df_est6 = carregar_dados(ESTACOES_ESTRELA["EST6"]["url"])
-                            df_est6["datetime_ajustado"] = df_est6["datetime_utc"].dt.tz_convert(st.session_state["fuso_selecionado"])
-                            inicio_est6 = df_est6["datetime_ajustado"].min().date()
+                    dados_inicio = referencia["primeiro_utc"].tz_convert(st.session_state["fuso_selecionado"]).date()
+                    dados_fim = ultimo_ajustado.date()
 
-                            # Só ajusta se estiver iniciando com o período total (primeira execução)
-                            if dados_inicio < inicio_est6:
-                                dados_inicio = inicio_est6
+                    # Limita o início conforme o perfil da dashboard (ex.: primeiro dado da EST6 em Estrela)
+                    inicio_minimo = perfil.inicio_minimo(estacoes_info, st.session_state["fuso_selecionado"])
 
-                        except Exception as e:
-                            st.warning(f"Não foi possível ajustar a data inicial com base na EST6: {e}")
+                    if inicio_minimo is not None and dados_inicio < inicio_minimo:
+                        dados_inicio = inicio_minimo
 
                     if pd.isna(dados_inicio) or pd.isna(dados_fim):
                         st.warning("A estação selecionada ainda não possui dados suficientes para exibição.")
@@ -792,7 +1451,7 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
                 with col_situacao:
 
                     # Obtém o último dado da estação selecionada
-                    ultimo_dado = dados["datetime_utc"].max()
+                    ultimo_dado = referencia["ultimo_utc"]
                     status_estacao = verificar_status_estacao(ultimo_dado)
 
                     # Define cor visual do status
@@ -849,35 +1508,22 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
                             st.session_state["dados_fim"] = dados_fim
                             st.session_state["ultimo_periodo"] = "inteiro"
 
-                            from main_estrela_config import ESTACOES_ESTRELA
-                    
-                            if estacoes_info == ESTACOES_ESTRELA:
-                                try:
-                                    df_est6 = carregar_dados(ESTACOES_ESTRELA["EST6"]["url"])
-                                    df_est6["datetime_ajustado"] = df_est6["datetime_utc"].dt.tz_convert(st.session_state["fuso_selecionado"])
-                                    inicio_est6 = df_est6["datetime_ajustado"].min().date()
-
-                                    # Só ajusta se estiver iniciando com o período total (primeira execução)
-                                    if dados_inicio < inicio_est6:
-                                        dados_inicio = inicio_est6
-
-                                except Exception as e:
-                                    st.warning(f"Não foi possível ajustar a data inicial com base na EST6: {e}")
-
                     with col_sete:
                         if st.button(f"{lang['last_7_days']}", use_container_width=True):
-                            st.session_state["dados_inicio"] = (dados['datetime_ajustado'].max() - timedelta(days=7)).date()
-                            st.session_state["dados_fim"] = dados['datetime_ajustado'].max().date()
+                            st.session_state["dados_inicio"] = (ultimo_ajustado - timedelta(days=7)).date()
+                            st.session_state["dados_fim"] = ultimo_ajustado.date()
                             st.session_state["ultimo_periodo"] = "7d"
 
                     _, col_24h, _ = st.columns([0.5, 1, 0.5], gap="small")
 
                     with col_24h:
                         if st.button(f"{lang['last_24_hours']}", use_container_width=True):
-                            st.session_state["dados_inicio"] = (dados['datetime_ajustado'].max() - timedelta(hours=24)).date()
-                            st.session_state["dados_fim"] = dados['datetime_ajustado'].max().date()
+                            st.session_state["dados_inicio"] = (ultimo_ajustado - timedelta(hours=24)).date()
+                            st.session_state["dados_fim"] = ultimo_ajustado.date()
                             st.session_state["ultimo_periodo"] = "24h"
 
+                ao_vivo, intervalo = seletor_ao_vivo(lang, intervalo_ao_vivo)
+
                 st.markdown("<br>", unsafe_allow_html=True)            
 
         with col_grafico:
@@ -889,30 +1535,29 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
                 # ============================ GRÁFICO ============================
                 with aba_grafico:
 
-                    # Se for o app de Estrela e o cliente desejar sobreposição
+                    # Se o perfil da dashboard oferecer sobreposição e o cliente desejar
                     usar_sobreposicao = False
 
-                    from main_estrela_config import ESTACOES_ESTRELA
-
-                    if estacoes_info == ESTACOES_ESTRELA:
+                    if perfil.comparar:
                         usar_sobreposicao = st.toggle("Comparar estações", value=False)
 
                     if usar_sobreposicao:
-                        plotar_sobreposicao_estrela(estacoes_info, lang)
+                        plotar_sobreposicao_estrela(estacoes_info, lang, perfil)
+
+                    elif ao_vivo:
+                        st.fragment(grafico_ao_vivo, run_every=intervalo)(url_estacao, estacoes_info, estacao_selecionada, lang, perfil)
 
                     else:    
 
-                        dados_filtrados = filtrar_dados(st.session_state["dados_estacao"], 
-                                                        st.session_state["dados_inicio"],
+                        dados_filtrados = dados_grafico(url_estacao, st.session_state["dados_inicio"],
                                                         st.session_state["dados_fim"], st.session_state["fuso_selecionado"])
-                        
-                        # Aplica o corte de 1h apenas para fins gráficos
-                        dados_filtrados = corte_ultima_1h(dados_filtrados)
 
                         cota_alerta, cota_inundacao = cotas_notaveis(estacao_selecionada, estacoes_info)
 
                         plotar_grafico(url_estacao, estacoes_info, dados_filtrados, estacao_selecionada, cota_alerta, cota_inundacao, 
-                                    st.session_state["dados_inicio"], st.session_state["dados_fim"], lang)
+                                    st.session_state["dados_inicio"], st.session_state["dados_fim"], lang, perfil)
+
+                    exibir_exportacao(estacoes_info, estacao_selecionada, lang)
                     
                 # ============================ INFO ============================
                 with aba_info:
@@ -925,7 +1570,7 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
                     altimetrica = estacao.get("altimetrica", "Indisponível")
                     altura_antena = estacao.get("altura_antena", "Indisponível")
                     inicio_operacao = estacao.get("inicio_operacao", "Indisponível")
-                    status_estacao = verificar_status_estacao(dados["datetime_utc"].max())
+                    status_estacao = verificar_status_estacao(referencia["ultimo_utc"])
                     cor_status = "green" if status_estacao == "Ativa" else "red"
 
                     col_img, col_dados = st.columns([1.2, 2], gap="large")
@@ -952,6 +1597,8 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
                             <p><strong>Situação:</strong> <span style='color:{cor_status}; font-weight:bold'>{status_estacao}</span></p>
                         """, unsafe_allow_html=True)
 
+                        exibir_completude(url_estacao, lang)
+
 
                 # ============================ MAPA ============================
                 with aba_mapa:
@@ -961,74 +1608,27 @@ def main(estacoes_info, estacao_padrao, logotipo, html_logo, lang):
                 # ============================ ESTATÍSTICAS ============================
                 with aba_estatisticas:
                         
-                    df_estat = st.session_state["dados_estacao"][["datetime_ajustado", "water_level(m)"]].copy()
-                    df_estat = df_estat.sort_values("datetime_ajustado", ascending=False)
-                    df_estat.rename(columns={
-                        "datetime_ajustado": "Hora" if lang["lang_code"] == "pt" else "Time",
-                        "water_level(m)": "Nível (m)" if lang["lang_code"] == "pt" else "Level (m)"
-                    }, inplace=True)
+                    exibir_estatisticas(url_estacao, estacao_selecionada, estacoes_info, lang)
 
-                    st.markdown("#### Nível das últimas 12h" if lang["lang_code"] == "pt" else "#### Last 12h Water Levels")
-                    st.dataframe(df_estat.head(12), use_container_width=True)
+                    plotar_comparacao_anual(url_estacao, lang)
 
             st.markdown("<br>", unsafe_allow_html=True)
 
-            # Seção com Situação do nível | Nível recente + atualização | Velocidade (em breve)
-            col_situacao, col_nivel, col_velocidade = st.columns([1.2, 1.8, 1.2])
-
-            # 🔹 Situação do nível
-            cota_alerta, cota_inundacao = cotas_notaveis(estacao_selecionada, estacoes_info)
-
-            df_nivel = carregar_dados(url_estacao)
-
-            nivel_formatado, dh_ultima_formatada = nivel_recente(df_nivel, st.session_state["fuso_selecionado"], lang, modo="ajustado")
-
-            velocidade_formatada = calcular_velocidade(df_nivel)
-
-            nivel_valor = float(nivel_formatado.replace(",", ".").replace("&nbsp;m", ""))
-
-            situacao, cor_situacao = situacao_nivel(nivel_valor, cota_alerta, cota_inundacao)
-
-            rotulo_situacao = {
-                    "Normal": {"pt": "Normal", "en": "Normal level"},
-                    "Alerta": {"pt": "Em alerta", "en": "Alert"},
-                    "Inundação": {"pt": "Inundação", "en": "Flood"},
-                    "Indisponível": {"pt": "Indisponível", "en": "Unavailable"}
-                }
-            mensagem_situacao = rotulo_situacao[situacao][lang["lang_code"]]
-
-            with col_situacao:
-                    st.markdown(f"""
-                        <div style='text-align: center;'>
-                            <p style='font-size: 22px; margin: 0;'>
-                                Situação do nível:
-                                <span style='font-weight: bold; color: {cor_situacao};'>{mensagem_situacao}</p>
-                        </div>
-                    """, unsafe_allow_html=True)
+            # Indicadores abaixo do gráfico (atualizados periodicamente no modo ao vivo)
+            if ao_vivo:
+                st.fragment(exibir_indicadores, run_every=intervalo)(url_estacao, estacao_selecionada, estacoes_info, lang)
+            else:
+                exibir_indicadores(url_estacao, estacao_selecionada, estacoes_info, lang)
 
-            # 🔹 Nível recente
-            with col_nivel:
+    # Memória da sessão para as métricas (medida no máximo uma vez por minuto)
+    SESSOES.medir_memoria(rastreio_atual().sessao, st.session_state)
 
-                    st.markdown(f"""
-                        <div style='text-align: center;'>
-                            <p style='font-size: 22px; margin: 0;'>
-                                {lang['recent_level']}:
-                                <span style='font-weight: bold; color: {cor_texto};'>{nivel_formatado}</span>
-                            </p>
-                            <p style='font-size: 13px; margin: 0;'>{lang['update'] + ':'} {dh_ultima_formatada}</p>
-                        </div>
-                    """, unsafe_allow_html=True)
+    # Painéis de depuração opcionais (?debug=memoria, ?debug=rastreio)
+    if "memoria" in depuracao:
+        exibir_relatorio_memoria(url_estacao)
 
-            # 🔹 Velocidade futura (placeholder)
-            with col_velocidade:
-                    st.markdown(f"""
-                        <div style='text-align: center;'>
-                            <p style='font-size: 22px; margin: 0;'>
-                                Velocidade:
-                                <span style='font-weight: bold; color: {cor_texto};'>{velocidade_formatada}</span>
-                            </p>
-                        </div>
-                    """, unsafe_allow_html=True)    
+    if "rastreio" in depuracao:
+        exibir_rastreio()
 
     _, col_modo, col_fuso, _ = st.columns([0.5, 1, 1.3, 0.5], gap="small", vertical_alignment="top")
 